@@ -3,6 +3,9 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Les vues de 'movies' sont asynchrones : servies ici (ex. uvicorn
+config.asgi:application), leurs appels SQLite et MongoDB s'exécutent en parallèle.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
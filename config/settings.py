@@ -73,13 +73,81 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Tables de Django (sessions, comptes, admin) dans leur propre fichier : chaque
+# connexion y écrit, et toute écriture dans cineexplorer.db changerait sa
+# version (sqlite_service.db_version), donc viderait les caches des workers
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'data' / 'cineexplorer.db',
+        'NAME': BASE_DIR / 'data' / 'django.db',
     }
 }
 
+# Base servie par movies/services/sqlite_service.py (pool en lecture seule)
+SQLITE_SERVING = {
+    'PATH': BASE_DIR / 'data' / 'cineexplorer.db',
+    'MAX_IDLE': 8,  # Connexions gardées ouvertes par worker
+    'THREADS': 8,   # Threads des vues asynchrones pour les appels SQLite
+    'PRAGMAS': {
+        'mmap_size': 256 * 1024 * 1024,  # 256 Mo mappés en mémoire
+        'cache_size': -64 * 1024,        # 64 Mo de cache de pages (négatif = Ko)
+        'temp_store': 'MEMORY',
+        'query_only': 1,
+    },
+    # Index bitmap des filtres du catalogue, en mémoire (quelques Mo par worker)
+    'BITMAP_INDEX': True,
+    'BITMAP_MAX_AGE': 3600,  # Secondes avant rechargement depuis SQLite
+    # Cache des résultats (top films, genres, stats), invalidé quand la base change
+    'RESULT_CACHE': {
+        'BACKEND': 'local',   # 'local' (LRU du worker), 'django' (settings.CACHES) ou None
+        'ALIAS': 'default',   # Cache Django utilisé avec 'django' (locmem, fichiers...)
+        'MAX_ENTRIES': 256,
+        'TTL': 600,
+    },
+}
+
+# Replica set servi par movies/services/mongo_service.py (un client partagé par worker)
+MONGO_SERVING = {
+    'URI': 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0',
+    'DB_NAME': 'cineexplorer',
+    'THREADS': 8,  # Threads des vues asynchrones pour les appels MongoDB
+    'CLIENT_OPTIONS': {
+        'maxPoolSize': 50,                 # Connexions max par membre du replica set
+        'minPoolSize': 0,
+        'maxIdleTimeMS': 60000,
+        'waitQueueTimeoutMS': 2000,        # Attente max d'une connexion libre
+        'serverSelectionTimeoutMS': 2000,
+        'connectTimeoutMS': 2000,
+        'socketTimeoutMS': 5000,
+    },
+    # Préférence de lecture par type de requête (secondaires = lectures réparties
+    # sur les 3 nœuds ; max_staleness en secondes, 90 minimum)
+    'READ_PREFERENCES': {
+        'detail': {'mode': 'secondaryPreferred', 'max_staleness': 90},
+        'similar': {'mode': 'secondaryPreferred', 'max_staleness': 90},
+        'stats': {'mode': 'primary'},
+    },
+    # Films similaires : 'precomputed' (build_similar.py), 'vector' (moteur TF-IDF,
+    # matrices de build_reco_matrix.py dans RECO_PATH) ou 'genres'
+    'SIMILAR_BACKEND': 'precomputed',
+    'RECO_PATH': BASE_DIR / 'data' / 'reco',
+    # Disjoncteur : ouvert après FAILURES pannes de suite (fiches servies par SQLite),
+    # sonde du replica set toutes les PROBE_INTERVAL secondes
+    'CIRCUIT_BREAKER': {
+        'FAILURES': 3,
+        'PROBE_INTERVAL': 5,
+    },
+    # Cache des fiches par worker, invalidé par le change stream de movies
+    'DETAIL_CACHE': {
+        'ENABLED': True,
+        'MAX_ENTRIES': 5000,
+        'MAX_BYTES': 64 * 1024 * 1024,  # Taille BSON cumulée des fiches
+        'TTL': 300,
+        'CHANGE_STREAM': True,
+    },
+    'STATS_TTL': 300,  # Secondes de cache de l'agrégation des stats Mongo
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import sqlite_service, mongo_service
+
+# Versions asynchrones des services, pour les vues async (servies par config/asgi.py).
+# sqlite3 et pymongo sont bloquants : chaque appel part dans un pool de threads,
+# et les appels indépendants d'une page s'exécutent en même temps (asyncio.gather).
+# Deux pools distincts : un Mongo lent (bascule du replica set) n'occupe pas
+# les threads dont SQLite a besoin.
+_sqlite_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SQLITE_SERVING', {}).get('THREADS', 8),
+    thread_name_prefix='sqlite',
+)
+_mongo_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'MONGO_SERVING', {}).get('THREADS', 8),
+    thread_name_prefix='mongo',
+)
+
+def _sqlite(func):
+    return sync_to_async(func, thread_sensitive=False, executor=_sqlite_executor)
+
+def _mongo(func):
+    return sync_to_async(func, thread_sensitive=False, executor=_mongo_executor)
+
+# --- SQLite ---
+aget_sqlite_stats = _sqlite(sqlite_service.get_sqlite_stats)
+aget_top_movies = _sqlite(sqlite_service.get_top_movies)
+aget_random_movies = _sqlite(sqlite_service.get_random_movies)
+aget_movies_list = _sqlite(sqlite_service.get_movies_list)
+aget_all_genres = _sqlite(sqlite_service.get_all_genres)
+aget_facet_counts = _sqlite(sqlite_service.get_facet_counts)
+aget_stats_for_charts = _sqlite(sqlite_service.get_stats_for_charts)
+aget_movie_genres = _sqlite(sqlite_service.get_movie_genres)
+
+# --- MongoDB ---
+aget_movie_details = _mongo(mongo_service.get_movie_details)
+aget_movie_sections = _mongo(mongo_service.get_movie_sections)
+aget_similar_movies = _mongo(mongo_service.get_similar_movies)
+aget_precomputed_similar = _mongo(mongo_service.get_precomputed_similar)
+aget_recommendations = _mongo(mongo_service.get_recommendations)
+aget_mongo_stats = _mongo(mongo_service.get_mongo_stats)
+
+async def aget_similar_for(movie_id, limit=6):
+    """
+    Films similaires sans attendre la fiche Mongo, en parallèle du détail :
+    voisins précalculés si le job hors ligne est passé, sinon moteur vectoriel
+    ou requête par genres (lus dans SQLite), selon SIMILAR_BACKEND.
+    """
+    if mongo_service.similar_backend() == 'precomputed':
+        similar = await aget_precomputed_similar(movie_id, limit)
+        if similar is not None:
+            return similar
+    genres = await aget_movie_genres(movie_id)
+    return await aget_similar_movies(genres, exclude_id=movie_id, limit=limit)
@@ -0,0 +1,178 @@
+import math
+import time
+from array import array
+from bisect import bisect_right
+
+# Python 3.10+ : int.bit_count ; sinon on compte les '1' de la représentation binaire
+if hasattr(int, 'bit_count'):
+    def popcount(bits):
+        return bits.bit_count()
+else:
+    def popcount(bits):
+        return bin(bits).count('1')
+
+_BYTE_POPCOUNT = bytes(bin(i).count('1') for i in range(256))
+_BLOCK = 512  # octets (4096 films) sautés d'un coup lors d'un OFFSET
+
+
+class BitmapIndex:
+    """
+    Index bitmap en mémoire des filtres du catalogue (un par worker).
+
+    Chaque film ('movie') reçoit une position, dans l'ordre du tri par défaut
+    du catalogue (start_year DESC, movie_id DESC). Un ensemble de films est un
+    entier Python dont le bit p vaut 1 si le film en position p en fait partie :
+    ET / OU = opérations bit à bit exécutées en C sur des mots de 64 bits.
+
+    - un bitset par genre, par décennie et par tranche de note (pas de 0.5),
+    - 'année >= Y' = préfixe des positions (elles sont triées par année),
+    - les compteurs de facettes ("Drama (12345)") = popcount(candidats & genre).
+
+    Les bitsets sont denses (~75 Ko pour 600 000 films) : sur un espace de
+    positions contigu, une compression n'apporterait rien ici.
+    """
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self.size = 0
+        self.rowids = array('q')          # position -> rowid de movies
+        self.neg_years = array('h')       # -start_year des positions à année connue
+        self.ratings = array('d')         # position -> note (NaN si pas de note)
+        self.all = 0
+        self.genres = {}
+        self.decades = {}
+        self.rating_buckets = {}          # floor(note * 2) -> bitset
+
+    @classmethod
+    def load(cls, conn):
+        index = cls()
+        rows = conn.execute("""
+            SELECT m.rowid, m.start_year, r.average_rating
+            FROM movies m
+            LEFT JOIN ratings r ON m.movie_id = r.movie_id
+            WHERE m.title_type = 'movie'
+            ORDER BY m.start_year DESC, m.movie_id DESC
+        """)
+
+        decades, buckets = {}, {}
+        for pos, (rowid, year, rating) in enumerate(rows):
+            index.rowids.append(rowid)
+            if year is not None:
+                index.neg_years.append(-year)
+                decades.setdefault((year // 10) * 10, []).append(pos)
+            if rating is None:
+                index.ratings.append(math.nan)
+            else:
+                index.ratings.append(rating)
+                buckets.setdefault(int(rating * 2), []).append(pos)
+        index.size = len(index.rowids)
+        index.all = (1 << index.size) - 1
+
+        # rowid -> position (tableau dense, bien plus léger qu'un dict), pour les genres
+        position_of = array('q', [-1]) * (max(index.rowids, default=0) + 1)
+        for pos, rowid in enumerate(index.rowids):
+            position_of[rowid] = pos
+        genres = {}
+        for rowid, genre in conn.execute("""
+            SELECT m.rowid, g.genre
+            FROM genres g
+            JOIN movies m ON m.movie_id = g.movie_id
+            WHERE m.title_type = 'movie'
+        """):
+            genres.setdefault(genre, []).append(position_of[rowid])
+        del position_of
+
+        index.genres = {g: index._bitset(p) for g, p in sorted(genres.items())}
+        index.decades = {d: index._bitset(p) for d, p in sorted(decades.items())}
+        index.rating_buckets = {b: index._bitset(p) for b, p in sorted(buckets.items())}
+        return index
+
+    def _bitset(self, positions):
+        data = bytearray((self.size + 7) // 8)
+        for pos in positions:
+            data[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(data, 'little')
+
+    def age(self):
+        return time.monotonic() - self.loaded_at
+
+    # --- Filtres ---
+    def year_at_least(self, year):
+        # Positions triées par année décroissante : c'est un préfixe
+        cut = bisect_right(self.neg_years, -year)
+        return (1 << cut) - 1
+
+    def rating_at_least(self, rating):
+        low = math.floor(rating * 2)
+        bits = 0
+        for bucket, bucket_bits in self.rating_buckets.items():
+            if bucket > low:
+                bits |= bucket_bits
+        boundary = self.rating_buckets.get(low, 0)
+        if low == rating * 2:
+            bits |= boundary
+        elif boundary:
+            # Note non multiple de 0.5 : on vérifie la tranche frontière film par film
+            for pos in self.positions(boundary):
+                if self.ratings[pos] >= rating:
+                    bits |= 1 << pos
+        return bits
+
+    def candidates(self, genre=None, year=None, rating=None):
+        """Films qui passent tous les filtres (ET des bitsets)."""
+        bits = self.all
+        if year is not None:
+            bits &= self.year_at_least(year)
+        if rating is not None:
+            bits &= self.rating_at_least(rating)
+        if genre is not None:
+            bits &= self.genres.get(genre, 0)
+        return bits
+
+    def facet_counts(self, genre=None, year=None, rating=None):
+        """
+        Compteurs par facette. Les genres sont comptés sans le filtre de genre
+        (pour pouvoir en changer), décennies et notes avec tous les filtres.
+        """
+        base = self.candidates(year=year, rating=rating)
+        selected = base & self.genres.get(genre, 0) if genre is not None else base
+        return {
+            'total': popcount(selected),
+            'genres': {g: popcount(base & bits) for g, bits in self.genres.items()},
+            'decades': {str(d): popcount(selected & bits) for d, bits in self.decades.items()},
+            'ratings': {f"{b / 2:g}": popcount(selected & bits) for b, bits in self.rating_buckets.items()},
+        }
+
+    # --- Pagination ---
+    def positions(self, bits, offset=0, limit=None):
+        """Positions des bits à 1 (dans l'ordre), en sautant les 'offset' premiers."""
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        start = 0
+        # Saut rapide par blocs entiers
+        while offset:
+            block = data[start:start + _BLOCK]
+            if not block:
+                return []
+            count = popcount(int.from_bytes(block, 'little'))
+            if count > offset:
+                break
+            offset -= count
+            start += _BLOCK
+
+        found = []
+        for i in range(start, len(data)):
+            byte = data[i]
+            if not byte:
+                continue
+            if offset >= _BYTE_POPCOUNT[byte]:
+                offset -= _BYTE_POPCOUNT[byte]
+                continue
+            for bit in range(8):
+                if byte >> bit & 1:
+                    if offset:
+                        offset -= 1
+                        continue
+                    found.append((i << 3) + bit)
+                    if limit is not None and len(found) >= limit:
+                        return found
+        return found
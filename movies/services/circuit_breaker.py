@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans attendre : le service est considéré comme indisponible."""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur autour des appels à un service distant (un par worker).
+
+    - fermé  : les appels passent ; 'failure_threshold' échecs de suite l'ouvrent,
+    - ouvert : les appels échouent tout de suite (CircuitOpenError), sans
+               attendre les timeouts du driver ; un thread en arrière-plan
+               appelle 'probe' toutes les 'probe_interval' secondes et referme
+               le disjoncteur dès que le service répond.
+
+    Seules les exceptions 'failure_exceptions' (pannes réseau) comptent comme
+    des échecs : une requête invalide ne doit pas couper le service.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, name, probe, failure_threshold=3, probe_interval=5.0,
+                 failure_exceptions=(Exception,)):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.failure_exceptions = failure_exceptions
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._prober = None
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'trips': 0, 'probes': 0}
+
+    def _check_fork(self):
+        # Le thread de sonde n'existe pas dans un process enfant : on repart fermé
+        if os.getpid() != self._pid:
+            self._reset()
+
+    # --- Transitions ---
+    def _open(self):
+        # Appelé avec le verrou
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._stats['trips'] += 1
+        print(f"⚠️  Disjoncteur '{self.name}' ouvert ({self._failures} échecs de suite)")
+        if self._prober is None or not self._prober.is_alive():
+            self._prober = threading.Thread(
+                target=self._probe_loop, name=f"probe-{self.name}", daemon=True
+            )
+            self._prober.start()
+
+    def _close(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                down = time.monotonic() - self._opened_at
+                print(f"✅ Disjoncteur '{self.name}' refermé après {down:.1f}s")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+
+    def _probe_loop(self):
+        while self.state == self.OPEN:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self._stats['probes'] += 1
+            try:
+                self.probe()
+            except Exception:
+                continue
+            self._close()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            if self.state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    # --- API ---
+    def call(self, func, *args, **kwargs):
+        self._check_fork()
+        with self._lock:
+            self._stats['calls'] += 1
+            if self.state == self.OPEN:
+                self._stats['rejected'] += 1
+                raise CircuitOpenError(f"{self.name} indisponible (disjoncteur ouvert)")
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.state
+            stats['consecutive_failures'] = self._failures
+            stats['open_for_s'] = (
+                time.monotonic() - self._opened_at if self._opened_at is not None else 0.0
+            )
+        return stats
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import bson
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+class DocumentCache:
+    """
+    Cache des fiches de films du worker : LRU borné en nombre d'entrées ET en
+    octets (taille BSON du document, mesurée à l'insertion), TTL par entrée.
+
+    Invalidation : 'invalidate(_id)' (appelé par le change stream) retire la
+    fiche. Une lecture Mongo commencée AVANT une invalidation de la même fiche
+    n'est pas mise en cache (elle a pu lire l'ancienne version).
+    """
+
+    def __init__(self, max_entries=5000, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # _id -> (expire_à, taille, document)
+        self._bytes = 0
+        self._seq = 0               # numéro de la dernière invalidation
+        self._invalidated = {}      # _id -> numéro de son invalidation (récentes)
+        self._floor = 0             # lectures plus anciennes : jamais mises en cache
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0,
+                       'invalidations': 0, 'rejected': 0}
+
+    def _drop(self, key):
+        # Appelé avec le verrou
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry is not None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[2]
+
+    def begin_load(self):
+        """Jeton à passer à set() : la position dans le flux des invalidations."""
+        with self._lock:
+            return self._seq
+
+    def set(self, key, document, token):
+        size = len(bson.encode(document))
+        with self._lock:
+            if token < self._floor or self._invalidated.get(key, -1) > token:
+                return False
+            if size > self.max_bytes:
+                self._stats['rejected'] += 1
+                return False
+            self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, size, document)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted[1]
+                self._stats['evictions'] += 1
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._seq += 1
+            self._invalidated[key] = self._seq
+            if self._drop(key):
+                self._stats['invalidations'] += 1
+            if len(self._invalidated) > 10000:
+                # On oublie le détail : toute lecture en cours sera ignorée
+                self._invalidated.clear()
+                self._floor = self._seq
+
+    def clear(self):
+        """Tout oublier (flux d'invalidations interrompu, collection remplacée...)."""
+        with self._lock:
+            self._seq += 1
+            self._floor = self._seq
+            self._invalidated.clear()
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._data)
+            stats['bytes'] = self._bytes
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class ChangeStreamInvalidator:
+    """
+    Thread qui suit le change stream d'une collection (replica set requis) et
+    invalide les fiches modifiées dans le cache, en quelques secondes au plus.
+
+    En cas de coupure, le flux reprend après le dernier événement lu (jeton de
+    reprise) ; si la reprise est impossible, le cache est vidé.
+    """
+
+    CLEAR_EVENTS = {'drop', 'rename', 'dropDatabase', 'invalidate'}
+    # Jeton de reprise trop ancien (oplog recyclé) ou inutilisable
+    LOST_HISTORY_CODES = {280, 286}
+
+    def __init__(self, get_collection, cache, retry_delay=5.0):
+        self.get_collection = get_collection
+        self.cache = cache
+        self.retry_delay = retry_delay
+        self._pid = os.getpid()
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats = {'events': 0, 'restarts': 0, 'healthy': False, 'last_event_at': None}
+
+    def start(self):
+        if os.getpid() != self._pid:
+            # Process enfant : le thread du parent n'existe pas ici
+            self._pid = os.getpid()
+            self._thread = None
+            self._stop = threading.Event()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='change-stream', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _apply(self, change):
+        operation = change.get('operationType')
+        if operation in self.CLEAR_EVENTS:
+            self.cache.clear()
+        elif 'documentKey' in change:
+            self.cache.invalidate(change['documentKey']['_id'])
+        self._stats['events'] += 1
+        self._stats['last_event_at'] = time.time()
+
+    def _run(self):
+        token = None
+        while not self._stop.is_set():
+            try:
+                with self.get_collection().watch(resume_after=token, max_await_time_ms=1000) as stream:
+                    if token is None:
+                        # Nouveau flux : on ne sait pas ce qui a changé avant
+                        self.cache.clear()
+                    self._stats['healthy'] = True
+                    while stream.alive and not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._apply(change)
+                        token = stream.resume_token
+                        if change is not None and change.get('operationType') == 'invalidate':
+                            token = None
+                            break
+            except PyMongoError as e:
+                if self._stats['healthy']:
+                    print(f"⚠️  Change stream interrompu ({e.__class__.__name__}), reprise dans {self.retry_delay:.0f}s")
+                if isinstance(e, OperationFailure) and e.code in self.LOST_HISTORY_CODES:
+                    token = None
+            self._stats['healthy'] = False
+            self._stats['restarts'] += 1
+            self._stop.wait(self.retry_delay)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
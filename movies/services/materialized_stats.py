@@ -0,0 +1,173 @@
+import json
+import time
+from datetime import datetime, timezone
+
+# Module sans dépendance à Django (comme text_utils) :
+# - les scripts d'import / refresh_stats.py ÉCRIVENT les tables de stats,
+# - sqlite_service les LIT (quelques lignes, quel que soit le volume de la base).
+#
+# stats_snapshot : un instantané par groupe (date de calcul, durée, nb de lignes sources)
+# stats_values   : les valeurs du groupe, dans l'ordre d'affichage
+
+def _summary(conn):
+    return [
+        ('count_movies', conn.execute("SELECT count(*) FROM movies WHERE title_type='movie'").fetchone()[0]),
+        ('count_actors', conn.execute("""
+            SELECT count(DISTINCT person_id)
+            FROM principals
+            WHERE category IN ('actor', 'actress')
+        """).fetchone()[0]),
+        ('count_directors', conn.execute("SELECT count(DISTINCT person_id) FROM directors").fetchone()[0]),
+    ]
+
+def _genres(conn):
+    # Top 10 des genres
+    return conn.execute("""
+        SELECT genre, COUNT(*) as count
+        FROM genres
+        GROUP BY genre
+        ORDER BY count DESC
+        LIMIT 10
+    """).fetchall()
+
+def _decades(conn):
+    rows = conn.execute("""
+        SELECT (CAST(start_year AS INTEGER) / 10) * 10 as decade, COUNT(*) as count
+        FROM movies
+        WHERE title_type='movie' AND start_year IS NOT NULL
+        GROUP BY decade
+        ORDER BY decade ASC
+    """).fetchall()
+    return [(str(decade), count) for decade, count in rows if decade]
+
+def _ratings(conn):
+    # Distribution des notes (arrondi à l'entier)
+    rows = conn.execute("""
+        SELECT CAST(average_rating AS INTEGER) as note, COUNT(*) as count
+        FROM ratings
+        GROUP BY note
+        ORDER BY note ASC
+    """).fetchall()
+    return [(str(note), count) for note, count in rows if note]
+
+def _actors(conn):
+    # Top 10 des acteurs prolifiques
+    return conn.execute("""
+        SELECT p.primary_name, COUNT(*) as count
+        FROM principals pr
+        JOIN persons p ON pr.person_id = p.person_id
+        WHERE pr.category IN ('actor', 'actress')
+        GROUP BY p.person_id
+        ORDER BY count DESC
+        LIMIT 10
+    """).fetchall()
+
+# Groupe -> (tables sources, calcul)
+STATS_GROUPS = {
+    'summary': (['movies', 'principals', 'directors'], _summary),
+    'genres': (['genres'], _genres),
+    'decades': (['movies'], _decades),
+    'ratings': (['ratings'], _ratings),
+    'actors': (['principals', 'persons'], _actors),
+}
+
+def create_stats_tables(conn):
+    # source_counts : empreinte des tables sources au moment du calcul (voir source_fingerprint)
+    conn.execute("""CREATE TABLE IF NOT EXISTS stats_snapshot (
+        group_name TEXT PRIMARY KEY,
+        built_at TEXT,
+        build_ms REAL,
+        source_counts TEXT
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS stats_values (
+        group_name TEXT,
+        position INTEGER,
+        label TEXT,
+        value INTEGER,
+        PRIMARY KEY (group_name, position)
+    )""")
+
+    # Écritures par table source, comptées par des triggers : une mise à jour à
+    # nombre de lignes constant (nouvelles notes IMDb) change aussi l'empreinte
+    conn.execute("""CREATE TABLE IF NOT EXISTS stats_changes (
+        table_name TEXT PRIMARY KEY,
+        changes INTEGER NOT NULL DEFAULT 0
+    )""")
+
+def create_change_triggers(conn, tables):
+    """Triggers INSERT / UPDATE / DELETE qui incrémentent stats_changes (posés après l'import)."""
+    for table in tables:
+        conn.execute("INSERT OR IGNORE INTO stats_changes (table_name) VALUES (?)", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS stats_changes_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE stats_changes SET changes = changes + 1 WHERE table_name = '{table}';
+                END
+            """)
+
+def source_fingerprint(conn, table):
+    """[lignes, plus grand rowid, écritures comptées par les triggers] d'une table source."""
+    count, max_rowid = conn.execute(f"SELECT count(*), max(rowid) FROM {table}").fetchone()
+    changes = conn.execute("SELECT changes FROM stats_changes WHERE table_name = ?", (table,)).fetchone()
+    return [count, max_rowid, changes[0] if changes else 0]
+
+def refresh_stats(conn, full=False):
+    """
+    Recalcule les groupes dont une table source a changé depuis le dernier calcul
+    (nombre de lignes, plus grand rowid ou écritures vues par les triggers), ou
+    tous avec full=True. Renvoie la liste des groupes recalculés.
+    """
+    create_stats_tables(conn)
+
+    tables = sorted({t for sources, _ in STATS_GROUPS.values() for t in sources})
+    create_change_triggers(conn, tables)
+    counts = {t: source_fingerprint(conn, t) for t in tables}
+    previous = {
+        name: json.loads(source_counts or '{}')
+        for name, source_counts in conn.execute("SELECT group_name, source_counts FROM stats_snapshot")
+    }
+
+    refreshed = []
+    for name, (sources, compute) in STATS_GROUPS.items():
+        source_counts = {t: counts[t] for t in sources}
+        if not full and previous.get(name) == source_counts:
+            continue
+
+        start = time.perf_counter()
+        values = compute(conn)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        conn.execute("DELETE FROM stats_values WHERE group_name = ?", (name,))
+        conn.executemany(
+            "INSERT INTO stats_values (group_name, position, label, value) VALUES (?, ?, ?, ?)",
+            [(name, i, label, value) for i, (label, value) in enumerate(values)]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO stats_snapshot VALUES (?, ?, ?, ?)",
+            (name, datetime.now(timezone.utc).isoformat(timespec='seconds'), build_ms, json.dumps(source_counts))
+        )
+        refreshed.append(name)
+
+    conn.commit()
+    return refreshed
+
+def read_stats(conn, group):
+    """
+    Lit un groupe matérialisé : ({label: valeur} dans l'ordre, infos de l'instantané),
+    ou None si le groupe n'a jamais été calculé.
+    """
+    snapshot = conn.execute(
+        "SELECT built_at, build_ms, source_counts FROM stats_snapshot WHERE group_name = ?", (group,)
+    ).fetchone()
+    if snapshot is None:
+        return None
+    rows = conn.execute(
+        "SELECT label, value FROM stats_values WHERE group_name = ? ORDER BY position", (group,)
+    ).fetchall()
+    meta = {
+        'built_at': snapshot[0],
+        'build_ms': snapshot[1],
+        'source_counts': json.loads(snapshot[2] or '{}'),
+    }
+    return {label: value for label, value in rows}, meta
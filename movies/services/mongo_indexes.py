@@ -0,0 +1,110 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import Primary
+
+# Module sans dépendance à Django (comme materialized_stats) :
+# - scripts/phase2_mongodb/bootstrap_indexes.py et les migrations CRÉENT les index,
+# - la liste ci-dessous documente quel index sert quelle requête de mongo_service.
+
+# Index de service : collection -> [(nom, clés)]
+SERVING_INDEXES = {
+    'movies': [
+        # get_similar_movies : {genres: {$in}} trié par note. Un IXSCAN par genre
+        # déjà trié, fusionnés (SORT_MERGE) : pas de tri en mémoire
+        ('genres_rating', [('genres', ASCENDING), ('rating.average', DESCENDING)]),
+    ],
+    # similar_movies : lecture par _id uniquement (index par défaut)
+}
+
+# Étapes interdites dans un plan de service
+FORBIDDEN_STAGES = {'COLLSCAN', 'SORT'}
+
+# Construction d'un index confirmée par tous les membres votants du replica set
+COMMIT_QUORUM = 'votingMembers'
+
+def _same_keys(info, keys):
+    # index_information() : 'key' = [(champ, sens)], sens parfois en float (1.0)
+    return [(field, direction) for field, direction in info['key']] == list(keys)
+
+def ensure_indexes(db, commit_quorum=COMMIT_QUORUM, names=None):
+    """
+    Crée les index de service manquants, un par un (une seule construction
+    à la fois sur le replica set). Idempotent : un index déjà présent avec les
+    mêmes clés (quel que soit son nom) n'est pas reconstruit.
+    'names' redirige une collection vers une autre, ex. {'movies': 'movies_rebuild'}
+    pour indexer une copie avant de la renommer.
+    Renvoie {'created': [...], 'existing': [...], 'conflicts': [...]}.
+    """
+    names = names or {}
+    report = {'created': [], 'existing': [], 'conflicts': []}
+    for logical_name, indexes in SERVING_INDEXES.items():
+        collection_name = names.get(logical_name, logical_name)
+        collection = db[collection_name]
+        current = collection.index_information()
+        for name, keys in indexes:
+            if any(_same_keys(info, keys) for info in current.values()):
+                report['existing'].append(f"{collection_name}.{name}")
+                continue
+            if name in current:
+                # Même nom, autres clés : on ne supprime rien automatiquement
+                report['conflicts'].append(f"{collection_name}.{name}")
+                continue
+            try:
+                collection.create_indexes([IndexModel(keys, name=name)], commitQuorum=commit_quorum)
+            except OperationFailure as e:
+                if 'commitQuorum' not in str(e):
+                    raise
+                # Serveur autonome (pas de replica set) : pas de commitQuorum
+                collection.create_indexes([IndexModel(keys, name=name)])
+            report['created'].append(f"{collection_name}.{name}")
+    return report
+
+# --- VÉRIFICATION DES PLANS ---
+
+def _stages(plan):
+    """Noms de toutes les étapes d'un plan d'exécution (arbre inputStage(s))."""
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan['stage']] if 'stage' in plan else []
+    for key in ('inputStage', 'queryPlan', 'thenStage', 'elseStage'):
+        stages += _stages(plan.get(key))
+    for child in plan.get('inputStages', []) + plan.get('shards', []):
+        stages += _stages(child.get('winningPlan', child))
+    return stages
+
+def serving_queries(db):
+    """
+    Les requêtes de mongo_service, avec des valeurs tirées de la base :
+    nom -> curseur (non exécuté) dont on lit le plan. Vide si la base est vide.
+    """
+    movies = db.get_collection('movies', read_preference=Primary())
+    sample = movies.find_one({"genres.0": {"$exists": True}}, {"genres": 1})
+    if not sample:
+        return {}
+    movie_id, genres = sample['_id'], sample['genres']
+    neighbour_ids = [doc['_id'] for doc in movies.find({}, {"_id": 1}).limit(6)]
+    short = {"title": 1, "year": 1, "rating": 1, "poster": 1}
+
+    return {
+        'get_movie_details': movies.find({"_id": movie_id}).limit(1),
+        'get_similar_movies': movies.find(
+            {"genres": {"$in": genres}, "_id": {"$ne": movie_id}}, short
+        ).sort("rating.average", -1).limit(6),
+        'get_precomputed_similar': db.get_collection('similar_movies', read_preference=Primary()).find(
+            {"_id": movie_id}, {"movies": {"$slice": 6}}
+        ).limit(1),
+        'get_vector_similar': movies.find({"_id": {"$in": neighbour_ids}}, short),
+    }
+
+def check_queries(db):
+    """
+    explain() de chaque requête de service. Renvoie [(requête, ok, étapes)] :
+    ok = False si le plan contient un COLLSCAN ou un tri en mémoire (SORT).
+    """
+    results = []
+    for name, cursor in serving_queries(db).items():
+        planner = cursor.explain().get('queryPlanner', {})
+        stages = _stages(planner.get('winningPlan', {}))
+        ok = not FORBIDDEN_STAGES.intersection(stages)
+        results.append((name, ok, stages))
+    return results
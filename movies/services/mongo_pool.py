@@ -0,0 +1,171 @@
+import atexit
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Compteurs du pool de connexions de pymongo (événements CMAP du driver).
+
+    - in_use     : connexions empruntées en ce moment (par serveur)
+    - wait_ms    : temps d'attente pour obtenir une connexion (pool plein,
+                   handshake d'une nouvelle connexion...)
+    - failures   : emprunts en échec (timeout d'attente, pool fermé...)
+    """
+
+    def __init__(self):
+        self._local = threading.local()  # début de l'emprunt en cours (pymongo < 4.7)
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'pools_created': 0,
+            'pools_cleared': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'in_use': 0,
+            'max_in_use': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+        }
+        self._in_use = {}  # "host:port" -> connexions empruntées
+
+    def _wait_ms(self, event):
+        # pymongo >= 4.7 fournit la durée (en secondes) ; sinon on la mesure
+        # nous-mêmes (l'emprunt se fait dans le thread qui l'a commencé).
+        duration = getattr(event, 'duration', None)
+        if duration is None:
+            started = getattr(self._local, 'started', None)
+            duration = time.monotonic() - started if started else 0.0
+        return duration * 1000
+
+    # --- Événements du driver ---
+    def pool_created(self, event):
+        with self._lock:
+            self._stats['pools_created'] += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats['pools_cleared'] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats['connections_created'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._stats['connections_closed'] += 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        wait_ms = self._wait_ms(event)
+        with self._lock:
+            self._stats['checkout_failures'] += 1
+            self._stats['wait_ms_total'] += wait_ms
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms(event)
+        server = f"{event.address[0]}:{event.address[1]}"
+        with self._lock:
+            stats = self._stats
+            stats['checkouts'] += 1
+            stats['in_use'] += 1
+            stats['max_in_use'] = max(stats['max_in_use'], stats['in_use'])
+            stats['wait_ms_total'] += wait_ms
+            stats['wait_ms_max'] = max(stats['wait_ms_max'], wait_ms)
+            self._in_use[server] = self._in_use.get(server, 0) + 1
+
+    def connection_checked_in(self, event):
+        server = f"{event.address[0]}:{event.address[1]}"
+        with self._lock:
+            self._stats['in_use'] -= 1
+            self._in_use[server] = self._in_use.get(server, 0) - 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_use_by_server'] = {s: n for s, n in self._in_use.items() if n}
+        attempts = stats['checkouts'] + stats['checkout_failures']
+        stats['avg_wait_ms'] = stats['wait_ms_total'] / attempts if attempts else 0.0
+        return stats
+
+
+class SharedMongoClient:
+    """
+    MongoClient unique par process, créé au premier appel.
+
+    Un MongoClient est thread-safe et porte lui-même le pool de connexions et
+    les threads de surveillance du replica set : on le crée une fois et on le
+    garde, au lieu de refaire découverte + handshakes à chaque requête.
+
+    Après un fork (gunicorn --preload), le client du parent n'est pas
+    réutilisable (ses threads n'existent pas dans l'enfant) : l'enfant en
+    recrée un au premier appel.
+    """
+
+    def __init__(self, uri, **options):
+        self.uri = uri
+        self.options = options
+        self.metrics = PoolMetrics()
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            # On ne ferme PAS le client hérité : ses sockets appartiennent au parent.
+            self._lock = threading.Lock()
+            self._client = None
+            self._pid = os.getpid()
+            self.metrics.reset()
+
+    def get(self):
+        self._check_fork()
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = MongoClient(
+                        self.uri, event_listeners=[self.metrics], **self.options
+                    )
+                client = self._client
+        return client
+
+    def close(self):
+        if os.getpid() != self._pid:
+            return
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def stats(self):
+        stats = self.metrics.stats()
+        stats['connected'] = self._client is not None
+        stats['max_pool_size'] = self.options.get('maxPoolSize', 100)
+        stats['min_pool_size'] = self.options.get('minPoolSize', 0)
+        return stats
+
+
+def create_client(uri, **options):
+    """Crée le client partagé et le ferme proprement à l'arrêt du process."""
+    shared = SharedMongoClient(uri, **options)
+    atexit.register(shared.close)
+    return shared
@@ -1,38 +1,313 @@
-from pymongo import MongoClient
+import os
+import threading
+
 from django.conf import settings
+from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+from . import sqlite_service
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .document_cache import DocumentCache, ChangeStreamInvalidator
+from .mongo_pool import create_client
+from .result_cache import LocalLRUCache, ResultCache, cached_result
 
-# Connexion au Replica Set
+# Connexion au Replica Set (valeurs par défaut si settings.MONGO_SERVING est absent)
 MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
 DB_NAME = 'cineexplorer'
 
+_client = None
+
+def get_client():
+    """Client partagé du worker (pool de connexions), créé au premier appel."""
+    global _client
+    if _client is None:
+        conf = getattr(settings, 'MONGO_SERVING', {})
+        options = {'serverSelectionTimeoutMS': 2000}
+        options.update(conf.get('CLIENT_OPTIONS', {}))
+        _client = create_client(conf.get('URI', MONGO_URI), **options)
+    return _client
+
 def get_mongo_db():
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-    return client[DB_NAME]
+    conf = getattr(settings, 'MONGO_SERVING', {})
+    return get_client().get()[conf.get('DB_NAME', DB_NAME)]
+
+# --- ROUTAGE DES LECTURES DANS LE REPLICA SET ---
+# Par type de requête : les fiches et les similaires peuvent être servies par
+# les secondaires (données importées, rarement modifiées), les stats restent
+# sur le primaire. Surchargé par settings.MONGO_SERVING['READ_PREFERENCES'].
+READ_PREFERENCES = {
+    'detail': {'mode': 'secondaryPreferred', 'max_staleness': 90},
+    'similar': {'mode': 'secondaryPreferred', 'max_staleness': 90},
+    'stats': {'mode': 'primary'},
+}
+
+_READ_MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+_read_preferences = {}
+
+def get_read_preference(query_type):
+    """Préférence de lecture pymongo d'un type de requête ('detail', 'similar', 'stats'...)."""
+    if query_type not in _read_preferences:
+        conf = dict(READ_PREFERENCES)
+        conf.update(getattr(settings, 'MONGO_SERVING', {}).get('READ_PREFERENCES', {}))
+        pref = conf.get(query_type, {'mode': 'primary'})
+        mode = _READ_MODES[pref.get('mode', 'primary')]
+        if mode is Primary:
+            _read_preferences[query_type] = Primary()
+        else:
+            # max_staleness : un secondaire trop en retard sur le primaire est
+            # écarté (-1 = pas de limite ; sinon 90 s minimum côté driver)
+            _read_preferences[query_type] = mode(max_staleness=pref.get('max_staleness', -1))
+    return _read_preferences[query_type]
+
+def get_collection(name, query_type='primary'):
+    """Collection avec la préférence de lecture du type de requête."""
+    return get_mongo_db().get_collection(name, read_preference=get_read_preference(query_type))
+
+def get_mongo_pool_stats():
+    """Statistiques du pool Mongo (connexions empruntées, temps d'attente...) et du disjoncteur."""
+    stats = get_client().stats()
+    stats['circuit'] = get_breaker().stats()
+    stats['stats_cache'] = get_stats_cache().stats()
+    cache = get_detail_cache()
+    if cache is not None:
+        stats['detail_cache'] = cache.stats()
+        stats['detail_cache']['change_stream'] = _invalidator.stats() if _invalidator else None
+    return stats
+
+# --- DISJONCTEUR ---
+# Replica set dégradé : sans disjoncteur, chaque page attend serverSelectionTimeoutMS
+# (2 s) avant d'échouer. Après quelques pannes de suite, les appels échouent
+# immédiatement (fiche reconstruite depuis SQLite) jusqu'à ce que la sonde
+# en arrière-plan obtienne une réponse.
+_breaker = None
+
+def _probe():
+    get_mongo_db().command('ping', read_preference=get_read_preference('detail'))
+
+def get_breaker():
+    global _breaker
+    if _breaker is None:
+        conf = getattr(settings, 'MONGO_SERVING', {}).get('CIRCUIT_BREAKER', {})
+        _breaker = CircuitBreaker(
+            'mongo', _probe,
+            failure_threshold=conf.get('FAILURES', 3),
+            probe_interval=conf.get('PROBE_INTERVAL', 5),
+            failure_exceptions=(ConnectionFailure,),
+        )
+    return _breaker
+
+def mongo_call(func, *args, **kwargs):
+    """Opération Mongo derrière le disjoncteur (CircuitOpenError s'il est ouvert)."""
+    return get_breaker().call(func, *args, **kwargs)
+
+# --- PROJECTION DE LA FICHE ---
+# Seuls les champs affichés par movie_detail.html, casting et titres tronqués :
+# le reste est servi à la demande par get_movie_sections (/movies/<id>/sections/).
+DETAIL_CAST = 6
+DETAIL_TITLES = 5
+DETAIL_PROJECTION = {
+    "title": 1, "year": 1, "runtime": 1, "is_adult": 1, "genres": 1, "rating": 1,
+    "directors": 1, "writers": 1,
+    "cast": {"$slice": DETAIL_CAST},
+    "titles": {"$slice": DETAIL_TITLES},
+    # Tailles complètes, pour les liens "voir tout" (expressions en projection : MongoDB >= 4.4)
+    "cast_total": {"$size": {"$ifNull": ["$cast", []]}},
+    "titles_total": {"$size": {"$ifNull": ["$titles", []]}},
+}
+SECTIONS = ('cast', 'titles', 'directors', 'writers')
+
+# --- CACHE DES FICHES ---
+# Le trafic des fiches se concentre sur quelques milliers de films populaires :
+# chaque worker garde les fiches lues (LRU borné en taille, TTL), invalidées par
+# le change stream de cineexplorer.movies dès qu'un document change.
+# Le TTL borne le reste : retard d'un secondaire, flux coupé pendant une panne.
+_detail_cache = None
+_invalidator = None
+
+def get_detail_cache():
+    """Cache des fiches du worker (None si désactivé dans MONGO_SERVING['DETAIL_CACHE'])."""
+    global _detail_cache, _invalidator
+    conf = getattr(settings, 'MONGO_SERVING', {}).get('DETAIL_CACHE', {})
+    if not conf.get('ENABLED', True):
+        return None
+    if _detail_cache is None:
+        _detail_cache = DocumentCache(
+            max_entries=conf.get('MAX_ENTRIES', 5000),
+            max_bytes=conf.get('MAX_BYTES', 64 * 1024 * 1024),
+            ttl=conf.get('TTL', 300),
+        )
+        if conf.get('CHANGE_STREAM', True):
+            _invalidator = ChangeStreamInvalidator(lambda: get_collection('movies', 'primary'), _detail_cache)
+    if _invalidator is not None:
+        # Sans effet s'il tourne déjà ; relance le thread dans un process forké
+        _invalidator.start()
+    return _detail_cache
 
 def get_movie_details(movie_id):
     """
     Récupère le document complet d'un film depuis MongoDB.
+    Replica set indisponible : même document, reconstruit depuis SQLite.
     """
-    db = get_mongo_db()
-    collection = db['movies']
+    cache = get_detail_cache()
+    if cache is not None:
+        movie = cache.get(movie_id)
+        if movie is not None:
+            # Copie : le document en cache est partagé entre les requêtes
+            return dict(movie)
+        token = cache.begin_load()
+
+    collection = get_collection('movies', 'detail')
     
     try:
-        movie = collection.find_one({"_id": movie_id})
+        movie = mongo_call(collection.find_one, {"_id": movie_id}, DETAIL_PROJECTION)
         if movie:
             # FIX DJANGO : On crée un alias 'id' sans underscore pour le template
             movie['id'] = movie['_id']
+            if cache is not None:
+                cache.set(movie_id, movie, token)
+                movie = dict(movie)
         return movie
+    except CircuitOpenError:
+        return sqlite_service.get_movie_document(movie_id)
+    except ConnectionFailure as e:
+        print(f"🚨 Erreur Mongo Détail: {e}")
+        return sqlite_service.get_movie_document(movie_id)
     except Exception as e:
         print(f"🚨 Erreur Mongo Détail: {e}")
         return None
 
+def get_movie_sections(movie_id, sections=None):
+    """
+    Sections complètes d'une fiche ({'cast': [...], 'titles': [...]}), pour le
+    chargement à la demande. None si le film est inconnu.
+    """
+    fields = [f for f in (sections or SECTIONS) if f in SECTIONS] or list(SECTIONS)
+    collection = get_collection('movies', 'detail')
+    try:
+        doc = mongo_call(collection.find_one, {"_id": movie_id}, {f: 1 for f in fields})
+    except (CircuitOpenError, ConnectionFailure):
+        # Replica set indisponible : sections complètes lues dans SQLite
+        doc = sqlite_service.get_movie_document(movie_id, cast_limit=None, titles_limit=None)
+    if not doc:
+        return None
+    return {f: doc.get(f) or [] for f in fields}
+
+# --- FILMS SIMILAIRES : BACKENDS ---
+# 'precomputed' : voisins calculés hors ligne (build_similar.py), sinon genres
+# 'vector'      : moteur TF-IDF en mémoire mappée (reco_engine.py), sinon genres
+# 'genres'      : requête par genres, triée par note
+def similar_backend():
+    return getattr(settings, 'MONGO_SERVING', {}).get('SIMILAR_BACKEND', 'precomputed')
+
+_reco_engine = None
+_reco_lock = threading.Lock()
+
+def get_reco_engine():
+    """
+    Moteur de recommandation du worker, rechargé quand build_reco_matrix.py a
+    réécrit les matrices. None si numpy/scipy ou les matrices sont absents.
+    """
+    global _reco_engine
+    try:
+        from .reco_engine import RecoEngine, matrix_version
+    except ImportError as e:
+        print(f"⚠️  Moteur de recommandation indisponible ({e})")
+        return None
+
+    path = str(getattr(settings, 'MONGO_SERVING', {}).get(
+        'RECO_PATH', os.path.join(settings.BASE_DIR, 'data', 'reco')))
+    version = matrix_version(path)
+    if version is None:
+        return None
+    if _reco_engine is None or _reco_engine.version != version:
+        with _reco_lock:
+            if _reco_engine is None or _reco_engine.version != version:
+                try:
+                    _reco_engine = RecoEngine.load(path)
+                except (OSError, ValueError) as e:
+                    print(f"🚨 Erreur chargement des matrices : {e}")
+                    return _reco_engine
+    return _reco_engine
+
+def _find_by_ids(movie_ids):
+    """Fiches courtes des films, dans l'ordre des identifiants donnés."""
+    projection = {"title": 1, "year": 1, "rating": 1, "poster": 1}
+    collection = get_collection('movies', 'similar')
+    found = {m['_id']: m for m in mongo_call(lambda: list(collection.find({"_id": {"$in": movie_ids}}, projection)))}
+    movies = [found[movie_id] for movie_id in movie_ids if movie_id in found]
+    for m in movies:
+        m['id'] = m['_id']
+    return movies
+
+def get_vector_similar(movie_id, limit=6):
+    """Plus proches voisins cosinus (moteur TF-IDF). None si le moteur ne connaît pas le film."""
+    engine = get_reco_engine()
+    if engine is None:
+        return None
+    neighbours = engine.similar(movie_id, limit)
+    if not neighbours:
+        return None
+    try:
+        return _find_by_ids([movie_id for movie_id, _ in neighbours])
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        print(f"🚨 Erreur Mongo Voisins: {e}")
+        return None
+
+def get_recommendations(movie_ids, limit=6):
+    """'Parce que vous avez vu X, Y' : films proches de l'ensemble du panier."""
+    engine = get_reco_engine()
+    if engine is None or not movie_ids:
+        return []
+    try:
+        return _find_by_ids([movie_id for movie_id, _ in engine.because_you_watched(movie_ids, limit)])
+    except CircuitOpenError:
+        return []
+    except Exception as e:
+        print(f"🚨 Erreur Mongo Recommandations: {e}")
+        return []
+
+def get_precomputed_similar(movie_id, limit=6):
+    """
+    Voisins calculés hors ligne (scripts/phase2_mongodb/build_similar.py) :
+    une seule lecture par _id. None si le film n'a pas (encore) de voisins.
+    """
+    collection = get_collection('similar_movies', 'similar')
+    try:
+        doc = mongo_call(collection.find_one, {"_id": movie_id}, {"movies": {"$slice": limit}})
+        if not doc:
+            return None
+        movies = doc.get('movies', [])
+        for m in movies:
+            m['id'] = m['_id']
+        return movies
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        print(f"🚨 Erreur Mongo Voisins: {e}")
+        return None
+
 def get_similar_movies(genres, exclude_id, limit=6):
     """
-    Trouve des films du même genre via MongoDB.
+    Trouve des films similaires : moteur vectoriel si configuré
+    (SIMILAR_BACKEND = 'vector'), sinon films du même genre via MongoDB.
     """
+    if similar_backend() == 'vector':
+        movies = get_vector_similar(exclude_id, limit)
+        if movies is not None:
+            return movies
+
     if not genres: return []
     
-    db = get_mongo_db()
+    collection = get_collection('movies', 'similar')
     try:
         query = {
             "genres": {"$in": genres},
@@ -40,23 +315,115 @@ def get_similar_movies(genres, exclude_id, limit=6):
         }
         projection = {"title": 1, "year": 1, "rating": 1, "poster": 1}
         
-        cursor = db['movies'].find(query, projection).sort("rating.average", -1).limit(limit)
+        cursor = collection.find(query, projection).sort("rating.average", -1).limit(limit)
         
         # Transformation en liste pour pouvoir modifier les dictionnaires
-        movies = list(cursor)
+        movies = mongo_call(list, cursor)
         for m in movies:
             # FIX DJANGO : On crée l'alias ici aussi
             m['id'] = m['_id']
             
         return movies
+    except CircuitOpenError:
+        return []
     except Exception as e:
         print(f"🚨 Erreur Mongo Similaires: {e}")
         return []
 
+# --- STATISTIQUES ---
+# Une seule agrégation $facet pour toute la page /stats, gardée STATS_TTL
+# secondes : le coût d'affichage ne dépend plus de la taille de la collection.
+VOTE_PERCENTILES = [0.5, 0.9, 0.99]
+
+_stats_cache = None
+
+def get_stats_cache():
+    """Cache (TTL seul : pas de version de base côté Mongo) des stats Mongo."""
+    global _stats_cache
+    if _stats_cache is None:
+        ttl = getattr(settings, 'MONGO_SERVING', {}).get('STATS_TTL', 300)
+        _stats_cache = ResultCache(LocalLRUCache(max_entries=16), lambda: 0, ttl=ttl, prefix='mongo')
+    return _stats_cache
+
+def _stats_pipeline(with_percentiles=True):
+    facets = {
+        'rating': [
+            {"$match": {"rating.average": {"$type": "number"}}},
+            {"$group": {"_id": None, "avg": {"$avg": "$rating.average"}, "rated": {"$sum": 1}}},
+        ],
+        'genres': [
+            {"$unwind": "$genres"},
+            {"$sortByCount": "$genres"},
+            {"$limit": 10},
+        ],
+        'decades': [
+            {"$match": {"year": {"$type": "number"}}},
+            {"$group": {"_id": {"$subtract": ["$year", {"$mod": ["$year", 10]}]}, "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+        ],
+    }
+    if with_percentiles:
+        # $percentile (approximatif, en mémoire bornée) : MongoDB >= 7.0
+        facets['votes'] = [
+            {"$group": {"_id": None, "p": {"$percentile": {
+                "input": "$rating.votes", "p": VOTE_PERCENTILES, "method": "approximate"
+            }}}},
+        ]
+    # On ne garde que les champs utiles avant le $facet (documents plus légers)
+    return [{"$project": {"rating": 1, "genres": 1, "year": 1}}, {"$facet": facets}]
+
+def _degraded_stats(stats, error):
+    """
+    Agrégation refusée par le serveur (version, limites mémoire...) : répartitions
+    lues dans les stats matérialisées de SQLite, marquées comme telles.
+    """
+    print(f"🚨 Erreur Mongo Stats (agrégation) : {error}")
+    charts = sqlite_service.get_stats_for_charts()
+    stats['genres'] = charts.get('genres', {})
+    stats['decades'] = charts.get('decades', {})
+    stats['degraded'] = True
+    return stats
+
+# Stats dégradées ou replica set indisponible : pas mises en cache, on réessaie au prochain appel
+@cached_result(get_stats_cache, cache_if=lambda stats: stats['count'] is not None and not stats['degraded'])
 def get_mongo_stats():
-    """Stats simples pour la page /stats"""
-    db = get_mongo_db()
-    return {
-        "count": db['movies'].count_documents({}),
-        "avg_rating": 0 # À implémenter avec un aggregate si besoin
-    }
\ No newline at end of file
+    """
+    Stats de la page /stats (valeurs à None si le replica set est indisponible,
+    'degraded' si les répartitions viennent de SQLite)
+    """
+    collection = get_collection('movies', 'stats')
+    stats = {
+        "count": None,
+        "avg_rating": None,
+        "rated": None,
+        "genres": {},
+        "decades": {},
+        "votes_percentiles": {},
+        "degraded": False,
+    }
+    try:
+        # Nombre de documents : métadonnées de la collection, sans la parcourir
+        stats['count'] = mongo_call(collection.estimated_document_count)
+        try:
+            result = mongo_call(lambda: list(collection.aggregate(_stats_pipeline(), allowDiskUse=True)))
+        except OperationFailure:
+            # Serveur sans $percentile : mêmes stats sans les percentiles de votes
+            result = mongo_call(lambda: list(collection.aggregate(_stats_pipeline(False), allowDiskUse=True)))
+        facets = result[0] if result else {}
+
+        if facets.get('rating'):
+            stats['avg_rating'] = round(facets['rating'][0]['avg'], 2)
+            stats['rated'] = facets['rating'][0]['rated']
+        stats['genres'] = {g['_id']: g['count'] for g in facets.get('genres', [])}
+        stats['decades'] = {str(int(d['_id'])): d['count'] for d in facets.get('decades', [])}
+        if facets.get('votes'):
+            stats['votes_percentiles'] = {
+                f"p{round(p * 100)}": round(v) for p, v in zip(VOTE_PERCENTILES, facets['votes'][0]['p']) if v is not None
+            }
+    except CircuitOpenError:
+        pass
+    except ConnectionFailure as e:
+        print(f"🚨 Erreur Mongo Stats: {e}")
+    except OperationFailure as e:
+        return _degraded_stats(stats, e)
+    return stats
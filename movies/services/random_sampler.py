@@ -0,0 +1,63 @@
+import random
+import threading
+import time
+from array import array
+
+
+class MovieSampler:
+    """
+    Tirage de k films au hasard sans 'ORDER BY RANDOM()'.
+
+    Pour chaque combinaison de filtres (votes minimum, genre), on garde en
+    mémoire un tableau dense des rowid éligibles (8 octets par film), chargé
+    une fois par worker puis rafraîchi toutes les 'max_age' secondes.
+    Un tirage = random.sample sur ce tableau (O(k)) + une lecture par rowid.
+    """
+
+    def __init__(self, max_age=3600, max_filters=16):
+        self.max_age = max_age
+        self.max_filters = max_filters
+        self._lock = threading.Lock()
+        self._ids = {}  # (min_votes, genre) -> (array de rowid, date de chargement)
+
+    def _load(self, conn, min_votes, genre):
+        query = """
+            SELECT m.rowid
+            FROM movies m
+            LEFT JOIN ratings r ON m.movie_id = r.movie_id
+            WHERE m.title_type = 'movie'
+        """
+        params = []
+        if min_votes:
+            query += " AND r.num_votes >= ?"
+            params.append(min_votes)
+        if genre:
+            query += " AND m.movie_id IN (SELECT movie_id FROM genres WHERE genre = ?)"
+            params.append(genre)
+        return array('q', (row[0] for row in conn.execute(query, params)))
+
+    def eligible(self, conn, min_votes=0, genre=None):
+        """Tableau des rowid éligibles pour ces filtres (chargé à la demande)."""
+        key = (min_votes or 0, genre)
+        with self._lock:
+            cached = self._ids.get(key)
+        if cached and time.monotonic() - cached[1] < self.max_age:
+            return cached[0]
+
+        ids = self._load(conn, *key)
+        with self._lock:
+            if key not in self._ids and len(self._ids) >= self.max_filters:
+                # On oublie la combinaison chargée le plus anciennement
+                oldest = min(self._ids, key=lambda k: self._ids[k][1])
+                del self._ids[oldest]
+            self._ids[key] = (ids, time.monotonic())
+        return ids
+
+    def sample(self, conn, k, min_votes=0, genre=None):
+        """k rowid distincts tirés uniformément parmi les films éligibles."""
+        ids = self.eligible(conn, min_votes, genre)
+        return random.sample(ids, min(k, len(ids)))
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
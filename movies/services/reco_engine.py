@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+import time
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy import sparse
+
+# Module sans dépendance à Django (comme materialized_stats) :
+# - scripts/phase1_sqlite/build_reco_matrix.py CONSTRUIT les matrices depuis SQLite,
+# - mongo_service les CHARGE (mémoire mappée : une seule copie pour tous les workers).
+#
+# Chaque film est un vecteur creux de caractéristiques (genres, casting,
+# réalisateurs, scénaristes), pondéré TF-IDF puis normalisé (norme L2 = 1) :
+# la similarité cosinus entre deux films est alors un simple produit scalaire.
+
+# préfixe -> (requête (movie_id, clé), poids du rôle)
+FEATURE_SOURCES = {
+    'g': ("SELECT movie_id, genre FROM genres", 1.0),
+    'c': ("""SELECT DISTINCT movie_id, person_id FROM principals
+             WHERE category IN ('actor', 'actress', 'self')""", 1.0),
+    'd': ("SELECT movie_id, person_id FROM directors", 3.0),
+    'w': ("SELECT movie_id, person_id FROM writers", 2.0),
+}
+
+# Fichiers .npy d'une version des matrices (mappables en mémoire)
+# x  : films x caractéristiques (CSR) -> vecteur d'un film
+# xt : caractéristiques x films (CSR) -> index inversé, pour les produits
+_FILES = ['movie_ids', 'x_data', 'x_indices', 'x_indptr', 'xt_data', 'xt_indices', 'xt_indptr']
+
+# Dossier des matrices :
+#   <version>/   une construction complète (fichiers .npy + meta.json)
+#   current      pointeur : nom du dossier de la version servie
+# Chaque construction écrit son propre dossier puis remplace le pointeur par un
+# seul os.replace : un worker charge l'ancienne version ou la nouvelle, jamais
+# un mélange des deux.
+CURRENT = 'current'
+KEEP_BUILDS = 2  # Versions gardées (la précédente reste lisible par les workers en retard)
+
+def build_matrix(conn):
+    """
+    Matrice films x caractéristiques, pondérée TF-IDF et normalisée.
+    Renvoie (movie_ids triés, matrice CSR float32).
+    """
+    movie_ids = [row[0] for row in conn.execute(
+        "SELECT movie_id FROM movies WHERE title_type = 'movie' ORDER BY movie_id"
+    )]
+    row_of = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+    rows, cols, vals = array('i'), array('i'), array('f')
+    features = {}
+    for prefix, (query, weight) in FEATURE_SOURCES.items():
+        for movie_id, key in conn.execute(query):
+            i = row_of.get(movie_id)
+            if i is None or key is None:
+                continue
+            rows.append(i)
+            cols.append(features.setdefault(f"{prefix}:{key}", len(features)))
+            vals.append(weight)
+    del row_of, features
+
+    n_movies = len(movie_ids)
+    matrix = sparse.csr_matrix(
+        (np.frombuffer(vals, dtype=np.float32),
+         (np.frombuffer(rows, dtype=np.int32), np.frombuffer(cols, dtype=np.int32))),
+        shape=(n_movies, max(cols, default=-1) + 1),
+    )
+
+    # Une caractéristique présente dans un seul film ne rapproche aucun film : on l'enlève
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    matrix = matrix[:, np.flatnonzero(df >= 2)].tocsr()
+    df = df[df >= 2]
+
+    # IDF : un genre partagé par 40% des films pèse peu, un réalisateur beaucoup
+    idf = (np.log(n_movies / df) + 1).astype(np.float32)
+    matrix.data *= idf[matrix.indices]
+
+    # Normalisation L2 des lignes (les films sans caractéristique restent vides)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+    matrix.sort_indices()
+    return np.array(movie_ids), matrix
+
+def _index_dtype(matrix):
+    # scipy veut le même type pour indices et indptr (sinon copie au chargement)
+    return np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+
+def save_matrix(path, movie_ids, matrix):
+    """Écrit une nouvelle version dans son dossier, puis bascule le pointeur 'current' dessus."""
+    built_at = datetime.now(timezone.utc)
+    version = built_at.strftime('%Y%m%dT%H%M%S%f')
+    build_dir = os.path.join(path, version)
+    os.makedirs(build_dir)
+
+    transposed = matrix.T.tocsr()
+    transposed.sort_indices()
+    idx = _index_dtype(matrix)
+    arrays = {
+        'movie_ids': movie_ids,
+        'x_data': matrix.data.astype(np.float32),
+        'x_indices': matrix.indices.astype(idx),
+        'x_indptr': matrix.indptr.astype(idx),
+        'xt_data': transposed.data.astype(np.float32),
+        'xt_indices': transposed.indices.astype(idx),
+        'xt_indptr': transposed.indptr.astype(idx),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(build_dir, f"{name}.npy"), values)
+
+    meta = {
+        'version': version,
+        'shape': list(matrix.shape),
+        'nnz': int(matrix.nnz),
+        'built_at': built_at.isoformat(timespec='seconds'),
+    }
+    with open(os.path.join(build_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    tmp = os.path.join(path, f"{CURRENT}.tmp")
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(path, CURRENT))
+    _remove_old_builds(path)
+    return meta
+
+def _remove_old_builds(path):
+    """Supprime les versions au-delà des KEEP_BUILDS plus récentes (un worker qui les
+    a mappées garde ses pages : le fichier n'est libéré qu'au démappage)."""
+    builds = sorted(
+        (name for name in os.listdir(path)
+         if os.path.isfile(os.path.join(path, name, 'meta.json'))),
+        reverse=True,
+    )
+    for name in builds[KEEP_BUILDS:]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+def current_build(path):
+    """(version, dossier) des matrices servies, (None, None) si jamais construites."""
+    try:
+        with open(os.path.join(path, CURRENT)) as f:
+            version = f.read().strip()
+        return version, os.path.join(path, version)
+    except OSError:
+        pass
+    # Ancien format : fichiers à plat dans 'path', versionnés par la date de meta.json
+    try:
+        return os.stat(os.path.join(path, 'meta.json')).st_mtime_ns, path
+    except OSError:
+        return None, None
+
+def matrix_version(path):
+    """Jeton de version des matrices (None si elles n'ont jamais été construites)."""
+    return current_build(path)[0]
+
+
+class RecoEngine:
+    """
+    Recommandations "plus comme celui-ci" / "parce que vous avez vu X, Y".
+
+    Les scores cosinus de tous les films s'obtiennent par un produit creux
+    requête x Xᵀ : seules les colonnes des caractéristiques de la requête sont
+    parcourues (index inversé), puis argpartition garde les k meilleurs sans
+    trier tous les candidats.
+    """
+
+    def __init__(self, movie_ids, x, xt, meta, version=None):
+        self.movie_ids = movie_ids
+        self.x = x
+        self.xt = xt
+        self.meta = meta
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls, path):
+        # Pointeur lu une seule fois : tous les fichiers viennent de la même version
+        version, build_dir = current_build(path)
+        if build_dir is None:
+            raise FileNotFoundError(f"aucune matrice dans {path}")
+        with open(os.path.join(build_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        # mmap_mode='r' : les pages viennent du cache de l'OS, partagé entre workers
+        arrays = {name: np.load(os.path.join(build_dir, f"{name}.npy"), mmap_mode='r') for name in _FILES}
+
+        n_movies, n_features = meta['shape']
+        if len(arrays['movie_ids']) != n_movies or len(arrays['x_indptr']) != n_movies + 1:
+            raise ValueError("matrices incohérentes (reconstruction en cours ?)")
+
+        x = cls._csr(arrays, 'x', (n_movies, n_features))
+        xt = cls._csr(arrays, 'xt', (n_features, n_movies))
+        return cls(arrays['movie_ids'], x, xt, meta, version)
+
+    @staticmethod
+    def _csr(arrays, prefix, shape):
+        matrix = sparse.csr_matrix(
+            (arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"], arrays[f"{prefix}_indptr"]),
+            shape=shape, copy=False,
+        )
+        # Triés à l'écriture : scipy ne doit pas tenter de les trier (fichiers en lecture seule)
+        matrix.has_sorted_indices = True
+        return matrix
+
+    def row_of(self, movie_id):
+        # movie_ids est trié : recherche dichotomique, pas de dict par worker
+        i = int(np.searchsorted(self.movie_ids, movie_id))
+        if i < len(self.movie_ids) and self.movie_ids[i] == movie_id:
+            return i
+        return None
+
+    def _top_k(self, indices, scores, k, exclude):
+        if exclude:
+            keep = ~np.isin(indices, list(exclude))
+            indices, scores = indices[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(str(self.movie_ids[indices[i]]), float(scores[i])) for i in best]
+
+    def similar_many(self, movie_ids, k=10):
+        """
+        Top-k des voisins de plusieurs films en un seul produit Q x Xᵀ.
+        Renvoie une liste (movie_id, score) par film demandé ([] si inconnu).
+        """
+        rows = [self.row_of(movie_id) for movie_id in movie_ids]
+        known = sorted({r for r in rows if r is not None})
+        results = {}
+        if known:
+            scores = (self.x[known] @ self.xt).tocsr()
+            for b, r in enumerate(known):
+                start, end = scores.indptr[b], scores.indptr[b + 1]
+                results[r] = self._top_k(scores.indices[start:end], scores.data[start:end], k, {r})
+        return [results.get(r, []) for r in rows]
+
+    def similar(self, movie_id, k=10):
+        return self.similar_many([movie_id], k)[0]
+
+    def because_you_watched(self, movie_ids, k=10):
+        """
+        Films proches d'un panier : somme des cosinus avec chaque film du panier,
+        soit un seul produit (profil = somme des vecteurs du panier).
+        """
+        rows = sorted({r for r in map(self.row_of, movie_ids) if r is not None})
+        if not rows:
+            return []
+        profile = sparse.csr_matrix(np.ones((1, len(rows)), dtype=np.float32)) @ self.x[rows]
+        scores = (profile @ self.xt).tocsr()
+        return self._top_k(scores.indices, scores.data, k, set(rows))
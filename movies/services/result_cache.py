@@ -0,0 +1,122 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """Cache du worker : LRU borné à 'max_entries', chaque entrée avec son TTL."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # clé -> (expire_à, valeur)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResultCache:
+    """
+    Cache versionné des résultats des fonctions de service.
+
+    La clé contient la version courante de la base ('version_getter') : dès
+    que la base change, les anciennes entrées ne sont plus jamais lues et
+    disparaissent d'elles-mêmes (LRU / TTL). Le stockage est soit le LRU du
+    worker, soit n'importe quel cache Django (locmem, fichiers, memcached...),
+    qui expose la même interface get / set.
+    """
+
+    def __init__(self, store, version_getter, ttl=600, prefix='sqlite'):
+        self.store = store
+        self.version_getter = version_getter
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}  # nom de fonction -> [hits, misses]
+
+    def make_key(self, name, args, kwargs):
+        raw = repr((args, sorted(kwargs.items())))
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        # Clé courte et sans caractères spéciaux (compatible memcached)
+        return f"{self.prefix}:{self.version_getter()}:{name}:{digest}"
+
+    def _count(self, name, hit):
+        with self._lock:
+            counters = self._counters.setdefault(name, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def call(self, name, func, args, kwargs, ttl=None, cache_if=None):
+        key = self.make_key(name, args, kwargs)
+        value = self.store.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count(name, hit=True)
+            return value
+
+        self._count(name, hit=False)
+        value = func(*args, **kwargs)
+        if cache_if is None or cache_if(value):
+            self.store.set(key, value, ttl or self.ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            per_function = {
+                name: {'hits': hits, 'misses': misses}
+                for name, (hits, misses) in self._counters.items()
+            }
+        hits = sum(f['hits'] for f in per_function.values())
+        misses = sum(f['misses'] for f in per_function.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'functions': per_function,
+        }
+
+
+def cached_result(get_cache, ttl=None, cache_if=None):
+    """
+    Décorateur : met en cache le résultat de la fonction (clé = fonction + arguments
+    + version de la base). 'get_cache' renvoie le ResultCache (ou None pour
+    désactiver) ; 'cache_if' permet de ne pas garder un résultat d'erreur.
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return func(*args, **kwargs)
+            return cache.call(name, func, args, kwargs, ttl=ttl, cache_if=cache_if)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
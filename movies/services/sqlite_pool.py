@@ -0,0 +1,133 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class SQLitePool:
+    """
+    Pool de connexions SQLite en lecture seule, partagé par un worker.
+
+    - Les connexions sont ouvertes en mode URI 'mode=ro' et gardées ouvertes
+      entre les requêtes (le cache de pages reste chaud). Le site n'écrit
+      jamais dans la base : le mode WAL est activé par les scripts d'import
+      (import_data.py, build_search_index.py).
+    - Les PRAGMAs de service sont appliqués UNE fois, à l'ouverture.
+    - Après un fork (gunicorn --preload), les connexions du parent sont
+      abandonnées et le pool repart à vide dans l'enfant.
+    """
+
+    def __init__(self, db_path, max_idle=8, pragmas=None, on_connect=None):
+        self.db_path = str(db_path)
+        self.max_idle = max_idle
+        self.pragmas = pragmas or {}
+        self.on_connect = on_connect
+
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            'opened': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'in_use': 0,
+            'connect_ms_total': 0.0,
+        }
+
+    # --- Ouverture ---
+    def _connect(self):
+        start = time.perf_counter()
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        # check_same_thread=False : une connexion peut être reprise par un
+        # autre thread du worker (runserver crée un thread par requête).
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+
+        try:
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            if self.on_connect:
+                self.on_connect(conn)
+        except Exception:
+            # Fichier qui n'est pas une base, illisible... : pas de connexion orpheline
+            conn.close()
+            raise
+
+        with self._lock:
+            self._stats['opened'] += 1
+            self._stats['connect_ms_total'] += (time.perf_counter() - start) * 1000
+        return conn
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            # On ne ferme PAS les connexions héritées : elles appartiennent au parent.
+            self._lock = threading.Lock()
+            self._idle = []
+            self._pid = os.getpid()
+            self._reset_stats()
+
+    # --- API ---
+    def acquire(self):
+        self._check_fork()
+        conn = None
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['reused'] += 1
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                raise
+        return conn
+
+    def release(self, conn):
+        if os.getpid() != self._pid:
+            return
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats['closed'] += 1
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats['closed'] += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['max_idle'] = self.max_idle
+        stats['avg_connect_ms'] = (
+            stats['connect_ms_total'] / stats['opened'] if stats['opened'] else 0.0
+        )
+        stats['reuse_ratio'] = (
+            stats['reused'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
+
+
+def create_pool(db_path, **kwargs):
+    """Crée un pool et le ferme proprement à l'arrêt du process."""
+    pool = SQLitePool(db_path, **kwargs)
+    atexit.register(pool.close_all)
+    return pool
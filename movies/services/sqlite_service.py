@@ -1,68 +1,265 @@
 import sqlite3
 import os
-import unicodedata
+import math
 import re
+import json
+import base64
+import hashlib
+import threading
+import time
 from django.conf import settings
 
-# --- 2. FONCTION POUR ENLEVER LES ACCENTS ---
-def strip_accents(text):
+from .sqlite_pool import create_pool
+from .text_utils import strip_accents
+from .materialized_stats import STATS_GROUPS, read_stats
+from .random_sampler import MovieSampler
+from .bitmap_index import BitmapIndex
+from .result_cache import LocalLRUCache, ResultCache, cached_result
+
+def _init_connection(conn):
+    # --- 3. ON INJECTE LA FONCTION DANS SQLITE ---
+    # Maintenant, on pourra utiliser 'strip_accents(colonne)' dans nos requêtes SQL !
+    # (Une seule fois par connexion, puisque le pool les garde ouvertes)
+    conn.create_function("strip_accents", 1, strip_accents, deterministic=True)
+
+    # ln() sert au boost de popularité de la recherche ; certaines builds de
+    # SQLite sont compilées sans les fonctions mathématiques.
+    try:
+        conn.execute("SELECT ln(1)")
+    except sqlite3.OperationalError:
+        conn.create_function("ln", 1, math.log, deterministic=True)
+
+_pool = None
+
+def get_pool():
+    """Pool du worker, créé au premier appel (après un éventuel fork)."""
+    global _pool
+    if _pool is None:
+        conf = getattr(settings, 'SQLITE_SERVING', {})
+        _pool = create_pool(
+            conf.get('PATH', os.path.join(settings.BASE_DIR, 'data', 'cineexplorer.db')),
+            max_idle=conf.get('MAX_IDLE', 8),
+            pragmas=conf.get('PRAGMAS'),
+            on_connect=_init_connection,
+        )
+    return _pool
+
+def get_db_connection():
     """
-    Nettoyage ULTIME pour le tri :
-    1. Enlève les accents (É -> e).
-    2. Enlève tout ce qui n'est pas une lettre ou un chiffre (#, $, -, espace).
-    3. Met en minuscule.
-    
-    Exemple : '#Alive' -> 'alive' (Trie à A)
-    Exemple : 'The $5.00 Movie' -> 'the500movie'
+    Emprunte une connexion en lecture seule au pool (à rendre avec release_db_connection).
+    Lève sqlite3.OperationalError si la base est absente ou illisible : à appeler
+    dans le try du service, pour qu'il renvoie sa réponse dégradée.
+    """
+    check_db_version()
+    return get_pool().acquire()
+
+def release_db_connection(conn):
+    # None : la connexion n'a pas pu être ouverte (base absente...), rien à rendre
+    if conn is not None:
+        get_pool().release(conn)
+
+def get_pool_stats():
+    """Statistiques du pool (connexions ouvertes, réutilisées, temps de connexion...)."""
+    return get_pool().stats()
+
+# --- VERSION DE LA BASE ---
+# PRAGMA data_version n'est comparable que sur une même connexion (le pool en a
+# plusieurs) : on se base sur le fichier (inode, date, taille) et sur son WAL,
+# où atterrissent les écritures tant qu'il n'y a pas de checkpoint.
+_db_version = None
+_db_version_checked = 0.0
+# Deux os.stat par requête sinon : on ne les refait qu'une fois par intervalle
+# (un import est donc vu par le worker avec au plus ce retard)
+DB_VERSION_CHECK_INTERVAL = 1.0
+
+def db_version():
+    """Jeton qui change dès qu'une écriture touche la base servie."""
+    path = get_pool().db_path
+    parts = []
+    for file_path in (path, path + '-wal'):
+        try:
+            st = os.stat(file_path)
+            parts.append(f"{st.st_ino}.{st.st_mtime_ns}.{st.st_size}")
+        except OSError:
+            parts.append('-')
+    return hashlib.md5('/'.join(parts).encode()).hexdigest()[:12]
+
+def check_db_version():
     """
-    if not text:
-        return ""
+    Si la base a changé (import, refresh, migration), on oublie tout ce que le
+    worker a déduit de l'ancienne : schéma, genres, index bitmap, tirages.
+    Les entrées du cache de résultats portent la version dans leur clé.
+    Le fichier n'est relu qu'une fois par DB_VERSION_CHECK_INTERVAL secondes.
+    """
+    global _db_version, _db_version_checked, _schema, _genre_bits, _bitmap
+    now = time.monotonic()
+    if _db_version is not None and now - _db_version_checked < DB_VERSION_CHECK_INTERVAL:
+        return _db_version
+    _db_version_checked = now
+    version = db_version()
+    if version != _db_version:
+        if _db_version is not None:
+            _schema = None
+            _genre_bits = None
+            _bitmap = None
+            _sampler.clear()
+        _db_version = version
+    return version
+
+# --- CACHE DE RÉSULTATS ---
+_result_cache = None
+
+def get_result_cache():
+    """Cache de résultats configuré par SQLITE_SERVING['RESULT_CACHE'] (None = désactivé)."""
+    global _result_cache
+    if _result_cache is None:
+        conf = getattr(settings, 'SQLITE_SERVING', {}).get('RESULT_CACHE', {})
+        backend = conf.get('BACKEND', 'local')
+        if not backend:
+            return None
+        if backend == 'django':
+            from django.core.cache import caches
+            store = caches[conf.get('ALIAS', 'default')]
+        else:
+            store = LocalLRUCache(max_entries=conf.get('MAX_ENTRIES', 256))
+        _result_cache = ResultCache(store, check_db_version, ttl=conf.get('TTL', 600))
+    return _result_cache
+
+def get_cache_stats():
+    """Compteurs hits / misses du cache de résultats, par fonction."""
+    cache = get_result_cache()
+    return cache.stats() if cache else None
+
+_schema = None
+
+def get_schema(conn):
+    """
+    Tables (et colonnes) présentes dans la base servie, lues une fois par worker.
+    Permet d'utiliser les structures optimisées (index FTS, ...) quand les
+    scripts de la phase 1 les ont construites, et de retomber sinon sur les
+    requêtes d'origine.
+    """
+    global _schema
+    if _schema is None:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        _schema = {
+            table: {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for table in tables
+        }
+    return _schema
+
+_genre_bits = None
+
+def get_genre_bits(conn):
+    """Genre -> bit du masque movies.genre_mask (table genre_bits, lue une fois par worker)."""
+    global _genre_bits
+    if _genre_bits is None:
+        _genre_bits = dict(conn.execute("SELECT genre, bit FROM genre_bits").fetchall())
+    return _genre_bits
+
+# --- INDEX BITMAP DES FILTRES (voir BitmapIndex) ---
+_bitmap = None
+_bitmap_lock = threading.Lock()
+
+def get_bitmap_index(conn):
+    """
+    Index bitmap du worker (None si désactivé dans SQLITE_SERVING).
+    Chargé au premier appel, rechargé après BITMAP_MAX_AGE secondes.
+    """
+    global _bitmap
+    conf = getattr(settings, 'SQLITE_SERVING', {})
+    if not conf.get('BITMAP_INDEX', True):
+        return None
+    max_age = conf.get('BITMAP_MAX_AGE', 3600)
+    if _bitmap is None or _bitmap.age() > max_age:
+        with _bitmap_lock:
+            # Un seul thread recharge, les autres attendent le résultat
+            if _bitmap is None or _bitmap.age() > max_age:
+                _bitmap = BitmapIndex.load(conn)
+    return _bitmap
+
+def _bitmap_criteria(filters):
+    """Filtres du catalogue (chaînes du formulaire) convertis pour l'index, ou None."""
     try:
-        # 1. On sépare les accents
-        text = unicodedata.normalize('NFD', text)
-        # 2. On garde les caractères de base
-        text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
-        # 3. On passe en minuscule
-        text = text.lower()
-        # 4. MAGIE : On vire tout ce qui n'est PAS (^) une lettre (a-z) ou un chiffre (0-9)
-        text = re.sub(r'[^a-z0-9]', '', text)
-        return text
-    except:
-        return text.lower()
+        return {
+            'genre': filters.get('genre') or None,
+            'year': float(filters['year']) if filters.get('year') else None,
+            'rating': float(filters['rating']) if filters.get('rating') else None,
+        }
+    except (TypeError, ValueError):
+        return None
 
-def get_db_connection():
-    db_path = os.path.join(settings.BASE_DIR, 'data', 'cineexplorer.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    
-    # --- 3. ON INJECTE LA FONCTION DANS SQLITE ---
-    # Maintenant, on pourra utiliser 'strip_accents(colonne)' dans nos requêtes SQL !
-    conn.create_function("strip_accents", 1, strip_accents)
-    
-    return conn
+def _bitmap_rows(conn, select, filters, offset, limit):
+    """
+    Lignes d'une page du tri par défaut via l'index bitmap : les filtres se
+    résolvent en positions, puis une seule lecture par rowid. None si l'index
+    ne peut pas servir cette requête.
+    """
+    index = get_bitmap_index(conn)
+    criteria = _bitmap_criteria(filters)
+    if index is None or criteria is None:
+        return None
+
+    positions = index.positions(index.candidates(**criteria), offset, limit)
+    rowids = [index.rowids[pos] for pos in positions]
+    if not rowids:
+        return []
+    placeholders = ','.join('?' * len(rowids))
+    query = select + f""", m.rowid as rowid
+        FROM movies m
+        LEFT JOIN ratings r ON m.movie_id = r.movie_id
+        WHERE m.rowid IN ({placeholders})
+    """
+    found = {row['rowid']: dict(row) for row in conn.execute(query, rowids).fetchall()}
+    rows = [found[rowid] for rowid in rowids if rowid in found]
+    for row in rows:
+        del row['rowid']
+    return rows
+
+# --- RECHERCHE PLEIN TEXTE (FTS5) ---
+# Poids bm25 des colonnes de movie_search : titre, titres alternatifs, casting
+# (movie_id, non indexée, n'entre pas dans le score)
+SEARCH_WEIGHTS = (10.0, 4.0, 2.0)
+# Bonus de popularité : POPULARITY_BOOST * ln(1 + nombre de votes)
+POPULARITY_BOOST = 0.5
+SEARCH_MAX_TERMS = 8
+
+def build_match_query(text):
+    """
+    Transforme la saisie utilisateur en requête MATCH FTS5 sûre :
+    chaque mot devient un préfixe entre guillemets ('star wa' -> '"star"* "wa"*').
+    Renvoie None si la saisie ne contient aucun mot.
+    """
+    terms = re.findall(r'\w+', text or '')[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def _load_stats(conn, group):
+    """
+    Groupe de stats : lu dans les tables matérialisées (refresh_stats.py) si
+    elles existent, sinon calculé à la volée comme avant.
+    Renvoie ({label: valeur}, infos de l'instantané ou None).
+    """
+    if 'stats_snapshot' in get_schema(conn):
+        found = read_stats(conn, group)
+        if found:
+            return found
+    _, compute = STATS_GROUPS[group]
+    return dict(compute(conn)), None
 
+@cached_result(get_result_cache, cache_if=lambda stats: stats['status'] == 'OK')
 def get_sqlite_stats():
     """Récupère les statistiques détaillées (Films, Acteurs, Réalisateurs)."""
-    conn = get_db_connection()
+    conn = None
     stats = {"source": "SQLite", "status": "OK"}
     try:
-        # 1. Compter les Films
-        cursor = conn.execute("SELECT count(*) FROM movies WHERE title_type='movie'")
-        stats['count_movies'] = cursor.fetchone()[0]
-        
-        # 2. Compter les Acteurs (Uniques)
-        # On regarde dans 'principals' ceux qui ont la catégorie 'actor' ou 'actress'
-        cursor = conn.execute("""
-            SELECT count(DISTINCT person_id) 
-            FROM principals 
-            WHERE category IN ('actor', 'actress')
-        """)
-        stats['count_actors'] = cursor.fetchone()[0]
-
-        # 3. Compter les Réalisateurs (Uniques)
-        # On regarde directement dans la table 'directors'
-        cursor = conn.execute("SELECT count(DISTINCT person_id) FROM directors")
-        stats['count_directors'] = cursor.fetchone()[0]
+        conn = get_db_connection()
+        # count_movies, count_actors, count_directors
+        values, snapshot = _load_stats(conn, 'summary')
+        stats.update(values)
+        # Date de l'instantané (None = calcul en direct) : rend la fraîcheur visible
+        stats['built_at'] = snapshot['built_at'] if snapshot else None
 
     except Exception as e:
         stats['status'] = f"Erreur: {e}"
@@ -70,13 +267,15 @@ def get_sqlite_stats():
         stats['count_actors'] = 0
         stats['count_directors'] = 0
     finally:
-        conn.close()
+        release_db_connection(conn)
     return stats
 
+@cached_result(get_result_cache)
 def get_top_movies(limit=12):
-    conn = get_db_connection()
+    conn = None
     movies = []
     try:
+        conn = get_db_connection()
         # On joint movies et ratings
         # On renomme les colonnes pour matcher ce que le Template attend (primaryTitle, etc.)
         query = """
@@ -96,189 +295,453 @@ def get_top_movies(limit=12):
     except Exception as e:
         print(f"🚨 Erreur Top Movies: {e}")
     finally:
-        conn.close()
+        release_db_connection(conn)
     return movies
 
-def get_movies_list(page=1, per_page=20, filters=None):
-    conn = get_db_connection()
-    offset = (page - 1) * per_page
+# --- PAGINATION PAR CURSEUR (KEYSET / SEEK) ---
+# Au lieu de LIMIT/OFFSET (qui construit puis jette toutes les lignes des pages
+# précédentes), le curseur mémorise la dernière paire (clé de tri, movie_id)
+# affichée et la page suivante repart de là grâce aux index de tri.
+
+def encode_cursor(sort, segment, key, movie_id):
+    """Jeton opaque (base64 url-safe) pour le lien 'Suivant'."""
+    raw = json.dumps([sort, segment, key, movie_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token, sort):
+    """Renvoie (segment, clé, movie_id) ou lève ValueError si le jeton est invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort, segment, key, movie_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Curseur illisible")
+    if cursor_sort != sort or segment not in ('value', 'null') or not isinstance(movie_id, str):
+        raise ValueError("Curseur d'un autre tri")
+    return segment, key, movie_id
+
+def _sort_segments(direction, nullable):
+    """
+    SQLite classe les NULL en premier en ASC et en dernier en DESC : la liste est
+    découpée en deux segments parcourus dans cet ordre, chacun servi par un index
+    (clé IS NULL / clé IS NOT NULL).
+    """
+    if not nullable:
+        return ['value']
+    return ['null', 'value'] if direction == 'ASC' else ['value', 'null']
+
+def _segment_sql(segment, key_expr, direction, id_col, after=None):
+    """Filtre + ORDER BY d'un segment, repris après 'after' = (clé, movie_id)."""
+    op = '>' if direction == 'ASC' else '<'
+    params = []
+    if segment == 'null':
+        where = f" AND {key_expr} IS NULL"
+        if after:
+            where += f" AND m.movie_id {op} ?"
+            params.append(after[1])
+        order = f" ORDER BY m.movie_id {direction}"
+    else:
+        where = f" AND {key_expr} IS NOT NULL"
+        if after:
+            where += f" AND ({key_expr}, {id_col}) {op} (?, ?)"
+            params.extend(after)
+        order = f" ORDER BY {key_expr} {direction}, {id_col} {direction}"
+    return where, order, params
+
+def get_movies_list(page=1, per_page=20, filters=None, cursor=None):
+    """
+    Page du catalogue : renvoie (films, has_next, next_cursor).
+    Avec 'cursor' (jeton renvoyé par l'appel précédent), la page coûte le même
+    prix quelle que soit sa profondeur ; sinon on pagine par numéro de page.
+    """
+    conn = None
+    # ?page=0 ou négatif : première page (comme un OFFSET négatif en SQL)
+    offset = max(0, (page - 1) * per_page)
     movies = []
     has_next = False
+    next_cursor = None
     
     # Requête de base
-    query = """
+    select = """
         SELECT 
             m.movie_id as tconst,
             m.primary_title as primaryTitle,
             m.start_year as startYear,
             r.average_rating as averageRating,
             m.title_type,
-            (SELECT GROUP_CONCAT(genre, ', ') FROM genres WHERE movie_id = m.movie_id) as genres
+            {genres} as genres
+    """
+    from_clause = """
         FROM movies m
-        LEFT JOIN ratings r ON m.movie_id = r.movie_id
-        WHERE m.title_type = 'movie'
+        {ratings_join} ratings r ON m.movie_id = r.movie_id
     """
+    where = " WHERE m.title_type = 'movie'"
     params = []
+    use_fts = False
 
-    # --- Gestion des Filtres ---
-    if filters:
-        # RECHERCHE INTELLIGENTE (Titre OU Acteur)
-        if filters.get('q'):
-            search_term = f"%{filters['q']}%"
-            query += """
-                AND (
-                    m.primary_title LIKE ? 
-                    OR m.movie_id IN (
-                        SELECT pr.movie_id 
-                        FROM principals pr 
-                        JOIN persons p ON pr.person_id = p.person_id 
-                        WHERE p.primary_name LIKE ?
-                    )
-                )
-            """
-            # On passe le terme de recherche 2 fois (une pour le titre, une pour l'acteur)
-            params.append(search_term)
-            params.append(search_term)
-        
-        if filters.get('year'):
-            query += " AND m.start_year >= ?"
-            params.append(filters['year'])
-        
-        if filters.get('rating'):
-            query += " AND r.average_rating >= ?"
-            params.append(filters['rating'])
+    try:
+        conn = get_db_connection()
+        # Genres dénormalisés (denormalize.py) : lecture directe de la colonne
+        denormalized_genres = 'genre_mask' in get_schema(conn)['movies']
+        if denormalized_genres:
+            select = select.format(genres="m.genres_text")
+        else:
+            select = select.format(genres="(SELECT GROUP_CONCAT(genre, ', ') FROM genres WHERE movie_id = m.movie_id)")
 
-        if filters.get('genre'):
-            query += " AND m.movie_id IN (SELECT movie_id FROM genres WHERE genre = ?)"
-            params.append(filters['genre'])
+        # --- Gestion des Filtres ---
+        if filters:
+            # RECHERCHE INTELLIGENTE (Titre, Titres alternatifs OU Acteur)
+            if filters.get('q'):
+                match = build_match_query(filters['q'])
+                # Ancien index sans colonne movie_id (jointure sur movies.rowid, instable) :
+                # ignoré tant que build_search_index.py n'a pas été relancé
+                if match and 'movie_id' in get_schema(conn).get('movie_search', ()):
+                    # Index FTS5 : on part des films qui matchent, rien d'autre n'est scanné
+                    use_fts = True
+                    from_clause = """
+                        FROM movie_search s
+                        JOIN movies m ON m.movie_id = s.movie_id
+                        {ratings_join} ratings r ON m.movie_id = r.movie_id
+                    """
+                    where += " AND movie_search MATCH ?"
+                    params.append(match)
+                else:
+                    # Base non indexée (build_search_index.py pas lancé) : ancien LIKE
+                    search_term = f"%{filters['q']}%"
+                    where += """
+                        AND (
+                            m.primary_title LIKE ? 
+                            OR m.movie_id IN (
+                                SELECT pr.movie_id 
+                                FROM principals pr 
+                                JOIN persons p ON pr.person_id = p.person_id 
+                                WHERE p.primary_name LIKE ?
+                            )
+                        )
+                    """
+                    # On passe le terme de recherche 2 fois (une pour le titre, une pour l'acteur)
+                    params.append(search_term)
+                    params.append(search_term)
+            
+            if filters.get('year'):
+                where += " AND m.start_year >= ?"
+                params.append(filters['year'])
+            
+            if filters.get('rating'):
+                where += " AND r.average_rating >= ?"
+                params.append(filters['rating'])
 
-    # --- Tri (Mise à jour pour ASC/DESC) ---
-    sort = filters.get('sort', 'year_desc') if filters else 'year_desc'
-    
-    if sort == 'rating_desc':
-        query += " ORDER BY r.average_rating DESC"
-    elif sort == 'rating_asc':
-        query += " ORDER BY r.average_rating ASC"
-        
-    elif sort == 'title_asc':
-        query += " ORDER BY strip_accents(m.primary_title) ASC"
-    elif sort == 'title_desc':
-        query += " ORDER BY strip_accents(m.primary_title) DESC"
+            if filters.get('genre'):
+                if denormalized_genres:
+                    # Genre inconnu => masque 0 => aucun film, comme la sous-requête
+                    bit = get_genre_bits(conn).get(filters['genre'])
+                    where += " AND (m.genre_mask & ?) != 0"
+                    params.append(1 << bit if bit is not None else 0)
+                else:
+                    where += " AND m.movie_id IN (SELECT movie_id FROM genres WHERE genre = ?)"
+                    params.append(filters['genre'])
+
+        # --- Tri (Mise à jour pour ASC/DESC) ---
+        # Chaque tri = (clé, sens, colonne de départage, clé pouvant être NULL)
+        sort = filters.get('sort', 'year_desc') if filters else 'year_desc'
         
-    elif sort == 'year_asc':
-        query += " ORDER BY m.start_year ASC"
-    else:
-        # Par défaut : Année décroissante (Plus récents d'abord)
-        query += " ORDER BY m.start_year DESC"
+        if sort == 'relevance':
+            if use_fts:
+                # bm25 est négatif (plus petit = plus pertinent) : on retranche la popularité
+                weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+                key_expr = f"bm25(movie_search, {weights}) - {POPULARITY_BOOST} * ln(1 + IFNULL(r.num_votes, 0))"
+                direction, id_col, nullable = 'ASC', 'm.movie_id', False
+            else:
+                key_expr, direction, id_col, nullable = 'r.num_votes', 'DESC', 'r.movie_id', True
 
-    # --- Pagination ---
-    query += " LIMIT ? OFFSET ?"
-    params.extend([per_page, offset])
+        # Sur le segment non NULL, la jointure devient interne (voir plus bas) :
+        # on départage par r.movie_id pour parcourir l'index idx_ratings_avg_mid
+        elif sort == 'rating_desc':
+            key_expr, direction, id_col, nullable = 'r.average_rating', 'DESC', 'r.movie_id', True
+        elif sort == 'rating_asc':
+            key_expr, direction, id_col, nullable = 'r.average_rating', 'ASC', 'r.movie_id', True
+            
+        elif sort in ('title_asc', 'title_desc'):
+            # Clé persistée et indexée (denormalize.py) ; sinon la UDF, ligne par ligne
+            if 'sort_title' in get_schema(conn)['movies']:
+                key_expr = "m.sort_title"
+            else:
+                key_expr = "strip_accents(m.primary_title)"
+            direction = 'ASC' if sort == 'title_asc' else 'DESC'
+            id_col, nullable = 'm.movie_id', True
+            
+        elif sort == 'year_asc':
+            key_expr, direction, id_col, nullable = 'm.start_year', 'ASC', 'm.movie_id', True
+        else:
+            # Par défaut : Année décroissante (Plus récents d'abord)
+            sort = 'year_desc'
+            key_expr, direction, id_col, nullable = 'm.start_year', 'DESC', 'm.movie_id', True
 
-    try:
-        cursor = conn.execute(query, params)
-        movies = [dict(row) for row in cursor.fetchall()]
-        has_next = len(movies) == per_page
+        select += f", {key_expr} as sort_key"
+        base = select + from_clause.format(ratings_join='LEFT JOIN') + where
+
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor, sort)
+            except ValueError as e:
+                print(f"⚠️  {e} : retour à la pagination par numéro de page")
+
+        # --- Pagination ---
+        # On lit une ligne de plus que la page pour savoir s'il y a une suite
+        rows = None
+        if sort == 'year_desc' and not after and not (filters and filters.get('q')):
+            # Tri par défaut sans recherche texte : l'index bitmap en mémoire
+            # donne directement les films de la page
+            rows = _bitmap_rows(conn, select, filters or {}, offset, per_page + 1)
+            if rows is not None:
+                rows = [dict(row, segment='value' if row['sort_key'] is not None else 'null') for row in rows]
+
+        if rows is not None:
+            pass
+        elif after:
+            rows = []
+            # Mode curseur : on reprend dans le segment du curseur, puis les suivants
+            segments = _sort_segments(direction, nullable)
+            cursor_segment, cursor_key, cursor_id = after
+            for segment in segments[segments.index(cursor_segment):]:
+                seek = (cursor_key, cursor_id) if segment == cursor_segment else None
+                seg_where, seg_order, seg_params = _segment_sql(segment, key_expr, direction, id_col, seek)
+                seg_base = base
+                if segment == 'value' and key_expr.startswith('r.'):
+                    # Note non NULL => la ligne ratings existe : jointure interne,
+                    # que SQLite peut piloter depuis l'index de la note
+                    seg_base = select + from_clause.format(ratings_join='JOIN') + where
+                limit = per_page + 1 - len(rows)
+                found = conn.execute(seg_base + seg_where + seg_order + " LIMIT ?",
+                                     params + seg_params + [limit]).fetchall()
+                rows.extend(dict(row, segment=segment) for row in found)
+                if len(rows) > per_page:
+                    break
+        else:
+            # Mode numéro de page (pages peu profondes, liens directs)
+            query = base + f" ORDER BY {key_expr} {direction}, m.movie_id {direction} LIMIT ? OFFSET ?"
+            found = conn.execute(query, params + [per_page + 1, offset]).fetchall()
+            rows = [dict(row, segment='value' if row['sort_key'] is not None else 'null') for row in found]
+
+        has_next = len(rows) > per_page
+        movies = rows[:per_page]
+        if has_next:
+            last = movies[-1]
+            next_cursor = encode_cursor(sort, last['segment'], last['sort_key'], last['tconst'])
+        for movie in movies:
+            del movie['sort_key'], movie['segment']
         
     except Exception as e:
         print(f"🚨 ERREUR LISTE: {e}")
     finally:
-        conn.close()
+        release_db_connection(conn)
     
-    return movies, has_next
+    return movies, has_next, next_cursor
+
+def get_movie_genres(movie_id):
+    """Genres d'un film (table genres, clé primaire) : de quoi chercher les similaires sans attendre Mongo."""
+    conn = None
+    genres = []
+    try:
+        conn = get_db_connection()
+        cursor = conn.execute("SELECT genre FROM genres WHERE movie_id = ? ORDER BY genre", (movie_id,))
+        genres = [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"🚨 Erreur Genres Film: {e}")
+    finally:
+        release_db_connection(conn)
+    return genres
 
+# Contenu des documents MongoDB (scripts/phase2_mongodb/migrate_enriched.py) :
+# casting et titres alternatifs tronqués à la migration, titres lus dans une
+# table AKAS (detect_akas_config) et non dans 'titles'
+DOCUMENT_CAST = 6
+DOCUMENT_TITLES = 5
+AKAS_TABLES = ['akas', 'title_akas', 'movie_akas']
+
+def _first_column(columns, candidates):
+    return next((c for c in candidates if c in columns), None)
+
+def _akas_query(conn):
+    """Requête (movie_id -> titre, région) de la table AKAS, comme la migration ; None sans table."""
+    schema = get_schema(conn)
+    table = next((t for t in AKAS_TABLES if t in schema), None)
+    if table is None:
+        return None
+    fk = _first_column(schema[table], ['movie_id', 'titleId', 'tconst'])
+    title = _first_column(schema[table], ['title', 'titleName', 'primary_title'])
+    region = _first_column(schema[table], ['region', 'regionName', 'area'])
+    if not fk or not title:
+        return None
+    if region:
+        return f"SELECT {title}, {region} FROM {table} WHERE {fk} = ? AND {region} IS NOT NULL ORDER BY rowid LIMIT ?"
+    return f"SELECT {title}, '' FROM {table} WHERE {fk} = ? ORDER BY rowid LIMIT ?"
+
+def get_movie_document(movie_id, cast_limit=6, titles_limit=5):
+    """
+    Fiche d'un film reconstruite depuis SQLite, avec les mêmes champs et le même
+    contenu que le document MongoDB (migrate_enriched.py) : sert de secours quand
+    le replica set est indisponible. None si le film est inconnu (ou n'est pas
+    un 'movie', absent de Mongo). Limites à None = tout ce que Mongo stocke.
+    """
+    conn = None
+    movie = None
+    try:
+        conn = get_db_connection()
+        row = conn.execute("""
+            SELECT m.movie_id, m.primary_title, m.start_year, m.runtime_minutes, m.is_adult,
+                   r.average_rating, r.num_votes
+            FROM movies m
+            LEFT JOIN ratings r ON m.movie_id = r.movie_id
+            WHERE m.movie_id = ? AND m.title_type = 'movie'
+        """, (movie_id,)).fetchone()
+        if row is None:
+            return None
+
+        def names(query, *params):
+            return [{"name": r[0]} for r in conn.execute(query, (movie_id,) + params)]
+
+        votes = row['num_votes'] or 0
+        cast, directors, writers, titles = [], [], [], []
+        # Comme la migration : ni casting ni titres pour les films sans vote
+        if votes > 0:
+            cast = names("""
+                SELECT p.primary_name FROM principals pr
+                JOIN persons p ON pr.person_id = p.person_id
+                WHERE pr.movie_id = ? AND pr.category IN ('actor', 'actress')
+                ORDER BY pr.ordering LIMIT ?
+            """, DOCUMENT_CAST)
+            directors = names("""
+                SELECT p.primary_name FROM directors d
+                JOIN persons p ON d.person_id = p.person_id
+                WHERE d.movie_id = ? ORDER BY d.person_id
+            """)
+            writers = names("""
+                SELECT p.primary_name FROM writers w
+                JOIN persons p ON w.person_id = p.person_id
+                WHERE w.movie_id = ? ORDER BY w.person_id
+            """)
+            akas = _akas_query(conn)
+            if akas:
+                titles = [{"title": r[0], "region": r[1]} for r in conn.execute(akas, (movie_id, DOCUMENT_TITLES))]
+
+        movie = {
+            "_id": row['movie_id'],
+            "title": row['primary_title'],
+            "year": row['start_year'],
+            "rating": {"average": row['average_rating'], "votes": votes},
+            "genres": [r[0] for r in conn.execute(
+                "SELECT genre FROM genres WHERE movie_id = ? ORDER BY genre", (movie_id,))],
+            # Tronqués comme la projection de la fiche Mongo ($slice)
+            "cast": cast if cast_limit is None else cast[:cast_limit],
+            "directors": directors,
+            "writers": writers,
+            "titles": titles if titles_limit is None else titles[:titles_limit],
+            # Tailles des tableaux stockés, comme cast_total / titles_total ($size)
+            "cast_total": len(cast),
+            "titles_total": len(titles),
+            "is_adult": bool(row['is_adult']),
+            "runtime": row['runtime_minutes'],
+            "source": "sqlite",
+        }
+        movie['id'] = movie['_id']
+    except Exception as e:
+        print(f"🚨 Erreur Fiche SQLite: {e}")
+    finally:
+        release_db_connection(conn)
+    return movie
+
+def get_facet_counts(filters=None):
+    """
+    Compteurs des facettes du catalogue ({'total', 'genres', 'decades', 'ratings'})
+    calculés par l'index bitmap, sans requête SQL. None avec une recherche texte
+    (l'index ne la connaît pas) ou si l'index est désactivé.
+    """
+    filters = filters or {}
+    if filters.get('q'):
+        return None
+    conn = None
+    facets = None
+    try:
+        conn = get_db_connection()
+        index = get_bitmap_index(conn)
+        criteria = _bitmap_criteria(filters)
+        if index is not None and criteria is not None:
+            facets = index.facet_counts(**criteria)
+    except Exception as e:
+        print(f"🚨 Erreur Facettes: {e}")
+    finally:
+        release_db_connection(conn)
+    return facets
+
+@cached_result(get_result_cache)
 def get_all_genres():
     """Récupère les genres distincts depuis la table genres."""
-    conn = get_db_connection()
+    conn = None
     genres = []
     try:
+        conn = get_db_connection()
         cursor = conn.execute("SELECT DISTINCT genre FROM genres ORDER BY genre")
         genres = [row[0] for row in cursor.fetchall()]
     except:
         # Fallback si la table genres est vide ou erreur
         genres = ["Action", "Drama", "Comedy", "Thriller", "Romance"]
     finally:
-        conn.close()
+        release_db_connection(conn)
     return genres
 
-# ... (Garde tes fonctions existantes get_db_connection, get_movies_list, etc.) ...
-
+@cached_result(get_result_cache, cache_if=lambda data: bool(data['genres']))
 def get_stats_for_charts():
     """Récupère les données agrégées pour les graphiques."""
-    conn = get_db_connection()
-    data = {'genres': {}, 'decades': {}, 'ratings': {}}
+    conn = None
+    data = {'genres': {}, 'decades': {}, 'ratings': {}, 'actors': {}}
     
     try:
-        # 1. Films par Genre (Top 10)
-        # Attention : comme les genres sont stockés dans une table 'genres' ou CSV, on adapte
-        cursor = conn.execute("""
-            SELECT genre, COUNT(*) as count 
-            FROM genres 
-            GROUP BY genre 
-            ORDER BY count DESC 
-            LIMIT 10
-        """)
-        data['genres'] = {row['genre']: row['count'] for row in cursor.fetchall()}
-
-        # 2. Films par Décennie
-        # On divise l'année par 10, on arrondit, puis on multiplie par 10 (ex: 1994 -> 1990)
-        cursor = conn.execute("""
-            SELECT (CAST(start_year AS INTEGER) / 10) * 10 as decade, COUNT(*) as count
-            FROM movies 
-            WHERE title_type='movie' AND start_year IS NOT NULL
-            GROUP BY decade 
-            ORDER BY decade ASC
-        """)
-        data['decades'] = {str(row['decade']): row['count'] for row in cursor.fetchall() if row['decade']}
-
-        # 3. Distribution des notes (Arrondi à l'entier)
-        cursor = conn.execute("""
-            SELECT CAST(average_rating AS INTEGER) as note, COUNT(*) as count
-            FROM ratings
-            GROUP BY note
-            ORDER BY note ASC
-        """)
-        data['ratings'] = {str(row['note']): row['count'] for row in cursor.fetchall() if row['note']}
-        
-        # --- NOUVEAU : 4. Top 10 Acteurs Prolifiques ---
-        # On joint 'principals' et 'persons' pour avoir le nom
-        cursor = conn.execute("""
-            SELECT p.primary_name, COUNT(*) as count
-            FROM principals pr
-            JOIN persons p ON pr.person_id = p.person_id
-            WHERE pr.category IN ('actor', 'actress')
-            GROUP BY p.person_id
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        data['actors'] = {row['primary_name']: row['count'] for row in cursor.fetchall()}
+        conn = get_db_connection()
+        # Films par genre (Top 10), par décennie, distribution des notes,
+        # Top 10 des acteurs prolifiques (voir materialized_stats.STATS_GROUPS)
+        for group in ('genres', 'decades', 'ratings', 'actors'):
+            data[group], snapshot = _load_stats(conn, group)
+            if snapshot:
+                data['built_at'] = snapshot['built_at']
 
     except Exception as e:
         print(f"🚨 Erreur Stats Charts: {e}")
     finally:
-        conn.close()
+        release_db_connection(conn)
     
     return data
 
-def get_random_movies(limit=5):
-    """Récupère des films au hasard (Version Robuste)."""
-    conn = get_db_connection()
+_sampler = MovieSampler()
+
+def get_random_movies(limit=5, min_votes=0, genre=None):
+    """
+    Récupère des films au hasard (tirage O(k), voir MovieSampler).
+    Filtres optionnels : nombre minimum de votes, genre.
+    """
+    conn = None
     movies = []
     try:
-        # On enlève le filtre sur les votes pour être SÛR d'avoir des résultats
-        query = """
-            SELECT 
-                m.movie_id as tconst,
-                m.primary_title as primaryTitle,
-                m.start_year as startYear,
-                r.average_rating as averageRating
-            FROM movies m
-            LEFT JOIN ratings r ON m.movie_id = r.movie_id
-            WHERE m.title_type = 'movie'
-            ORDER BY RANDOM()
-            LIMIT ?
-        """
-        movies = [dict(row) for row in conn.execute(query, (limit,)).fetchall()]
+        conn = get_db_connection()
+        rowids = _sampler.sample(conn, limit, min_votes=min_votes, genre=genre)
+        if rowids:
+            placeholders = ','.join('?' * len(rowids))
+            query = f"""
+                SELECT 
+                    m.rowid,
+                    m.movie_id as tconst,
+                    m.primary_title as primaryTitle,
+                    m.start_year as startYear,
+                    r.average_rating as averageRating
+                FROM movies m
+                LEFT JOIN ratings r ON m.movie_id = r.movie_id
+                WHERE m.rowid IN ({placeholders})
+            """
+            found = {row['rowid']: row for row in conn.execute(query, rowids).fetchall()}
+            # On garde l'ordre du tirage (IN ne garantit aucun ordre)
+            movies = [dict(found[rowid]) for rowid in rowids if rowid in found]
+            for movie in movies:
+                del movie['rowid']
         
         # Petit message dans ton terminal pour vérifier
         print(f"🎲 DEBUG: {len(movies)} films aléatoires trouvés.")
@@ -286,5 +749,5 @@ def get_random_movies(limit=5):
     except Exception as e:
         print(f"🚨 Erreur Random Movies: {e}")
     finally:
-        conn.close()
+        release_db_connection(conn)
     return movies
\ No newline at end of file
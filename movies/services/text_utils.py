@@ -0,0 +1,31 @@
+import unicodedata
+import re
+
+# Module sans dépendance à Django : utilisé par le site ET par les scripts
+# d'import (scripts/phase1_sqlite) pour calculer les clés de tri persistées.
+
+# --- FONCTION POUR ENLEVER LES ACCENTS ---
+def strip_accents(text):
+    """
+    Nettoyage ULTIME pour le tri :
+    1. Enlève les accents (É -> e).
+    2. Enlève tout ce qui n'est pas une lettre ou un chiffre (#, $, -, espace).
+    3. Met en minuscule.
+    
+    Exemple : '#Alive' -> 'alive' (Trie à A)
+    Exemple : 'The $5.00 Movie' -> 'the500movie'
+    """
+    if not text:
+        return ""
+    try:
+        # 1. On sépare les accents
+        text = unicodedata.normalize('NFD', text)
+        # 2. On garde les caractères de base
+        text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+        # 3. On passe en minuscule
+        text = text.lower()
+        # 4. MAGIE : On vire tout ce qui n'est PAS (^) une lettre (a-z) ou un chiffre (0-9)
+        text = re.sub(r'[^a-z0-9]', '', text)
+        return text
+    except:
+        return text.lower()
@@ -1,3 +1,537 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from movies.services import sqlite_service
+from movies.services.bitmap_index import BitmapIndex
+
+GENRES = ['Drama', 'Comedy', 'Action', 'Horror']
+YEARS = [None, 1950, 1990, 1990, 2000, 2010, 2010, 2024]      # Doublons et NULL voulus
+RATINGS = [None, 2.0, 6.3, 6.5, 6.5, 7.0, 9.1]                 # Idem (None = pas de ligne ratings)
+TITLES = ['Amélie', 'Amelie', 'Zorro', 'Été', 'Metro', 'Métro', 'Ghost Love']
+
+
+def build_fixture_db(path, count=150, seed=7):
+    """Petite base au schéma de la phase 1, avec beaucoup d'égalités et de NULL sur les clés de tri."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE movies (movie_id TEXT PRIMARY KEY, title_type TEXT, primary_title TEXT,
+                             original_title TEXT, is_adult INTEGER, start_year INTEGER,
+                             end_year INTEGER, runtime_minutes INTEGER);
+        CREATE TABLE persons (person_id TEXT PRIMARY KEY, primary_name TEXT,
+                              birth_year INTEGER, death_year INTEGER);
+        CREATE TABLE ratings (movie_id TEXT PRIMARY KEY, average_rating REAL, num_votes INTEGER);
+        CREATE TABLE genres (movie_id TEXT, genre TEXT, PRIMARY KEY (movie_id, genre));
+        CREATE TABLE principals (movie_id TEXT, person_id TEXT, ordering INTEGER,
+                                 category TEXT, job TEXT, PRIMARY KEY (movie_id, person_id, ordering));
+        CREATE TABLE directors (movie_id TEXT, person_id TEXT, PRIMARY KEY (movie_id, person_id));
+        CREATE TABLE writers (movie_id TEXT, person_id TEXT, PRIMARY KEY (movie_id, person_id));
+        CREATE TABLE titles (title_id INTEGER PRIMARY KEY AUTOINCREMENT, movie_id TEXT, ordering INTEGER,
+                             title TEXT, region TEXT, language TEXT, types TEXT, attributes TEXT,
+                             is_original_title INTEGER);
+    """)
+    conn.execute("INSERT INTO persons VALUES ('nm0000001', 'Léa Seydoux', 1985, NULL)")
+    conn.executemany("INSERT INTO persons VALUES (?, ?, NULL, NULL)",
+                     [(f"nm{p:07d}", f"Personne {p}") for p in range(2, 12)])
+    for i in range(1, count + 1):
+        movie_id = f"tt{i:07d}"
+        title = rng.choice(TITLES)
+        conn.execute("INSERT INTO movies VALUES (?, ?, ?, ?, 0, ?, NULL, 90)",
+                     (movie_id, 'tvSeries' if i % 11 == 0 else 'movie', title, title, rng.choice(YEARS)))
+        rating = rng.choice(RATINGS)
+        if rating is not None:
+            conn.execute("INSERT INTO ratings VALUES (?, ?, ?)", (movie_id, rating, rng.choice([10, 500, 500])))
+        for genre in rng.sample(GENRES, rng.randint(0, 2)):
+            conn.execute("INSERT INTO genres VALUES (?, ?)", (movie_id, genre))
+        if i % 9 == 0:
+            conn.execute("INSERT INTO principals VALUES (?, 'nm0000001', 1, 'actress', NULL)", (movie_id,))
+        if i % 4 == 0:
+            # Casting plus long que celui gardé dans Mongo, réalisateurs, titres régionaux
+            for ordering, p in enumerate(rng.sample(range(2, 12), 8), start=2):
+                conn.execute("INSERT INTO principals VALUES (?, ?, ?, ?, NULL)",
+                             (movie_id, f"nm{p:07d}", ordering, rng.choice(['actor', 'actress', 'director'])))
+            conn.execute("INSERT INTO directors VALUES (?, ?)", (movie_id, f"nm{rng.randint(2, 11):07d}"))
+            conn.execute("INSERT INTO writers VALUES (?, ?)", (movie_id, f"nm{rng.randint(2, 11):07d}"))
+            conn.execute("INSERT INTO titles (movie_id, ordering, title, region) VALUES (?, 1, ?, 'FR')",
+                         (movie_id, title + ' (FR)'))
+    conn.commit()
+    conn.close()
+
+
+def reset_sqlite_service():
+    """Oublie le pool et les caches du worker (la base servie change d'un test à l'autre)."""
+    if sqlite_service._pool is not None:
+        sqlite_service._pool.close_all()
+    sqlite_service._pool = None
+    sqlite_service._db_version = None
+    sqlite_service._db_version_checked = 0.0
+    sqlite_service._schema = None
+    sqlite_service._genre_bits = None
+    sqlite_service._bitmap = None
+    sqlite_service._result_cache = None
+    sqlite_service._sampler.clear()
+
+
+class FixtureDBTestCase(SimpleTestCase):
+    """Sert une base de test temporaire à la place de data/cineexplorer.db."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.tmp_dir, 'fixture.db')
+        build_fixture_db(cls.db_path)
+        serving = dict(settings.SQLITE_SERVING, PATH=cls.db_path, RESULT_CACHE={'BACKEND': None})
+        cls.serving = override_settings(SQLITE_SERVING=serving)
+        cls.serving.enable()
+        reset_sqlite_service()
+
+    @classmethod
+    def tearDownClass(cls):
+        reset_sqlite_service()
+        cls.serving.disable()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def query(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+class PaginationTests(FixtureDBTestCase):
+    """Numéro de page et curseur doivent parcourir exactement la même liste."""
+
+    SORTS = ['year_desc', 'year_asc', 'rating_desc', 'rating_asc',
+             'title_asc', 'title_desc', 'relevance']
+    FILTERS = [
+        {},
+        {'year': '1990'},
+        {'rating': '6.5'},
+        {'rating': '6.4'},        # Pas un multiple de 0.5 (tranche frontière de l'index bitmap)
+        {'genre': 'Drama'},
+        {'genre': 'Inconnu'},
+        {'q': 'Amélie'},
+        {'q': 'Seydoux'},
+        {'year': '2000', 'rating': '6', 'genre': 'Comedy'},
+    ]
+    PER_PAGE = 7
+
+    def walk_pages(self, filters):
+        ids, page = [], 1
+        while True:
+            movies, has_next, _ = sqlite_service.get_movies_list(page, self.PER_PAGE, filters)
+            ids.extend(m['tconst'] for m in movies)
+            if not has_next:
+                return ids
+            page += 1
+            self.assertLess(page, 100, "pagination sans fin")
+
+    def walk_cursor(self, filters):
+        ids, cursor = [], None
+        while True:
+            movies, has_next, cursor = sqlite_service.get_movies_list(1, self.PER_PAGE, filters, cursor)
+            ids.extend(m['tconst'] for m in movies)
+            if not has_next:
+                self.assertIsNone(cursor)
+                return ids
+            self.assertIsNotNone(cursor)
+            self.assertLess(len(ids), 1000, "curseur sans fin")
+
+    def expected_ids(self, filters):
+        """Films qui passent les filtres (ensemble), calculés sans le service."""
+        where, params = ["m.title_type = 'movie'"], []
+        if filters.get('year'):
+            where.append("m.start_year >= ?")
+            params.append(int(filters['year']))
+        if filters.get('rating'):
+            where.append("r.average_rating >= ?")
+            params.append(float(filters['rating']))
+        if filters.get('genre'):
+            where.append("m.movie_id IN (SELECT movie_id FROM genres WHERE genre = ?)")
+            params.append(filters['genre'])
+        if filters.get('q'):
+            where.append("""(m.primary_title LIKE ? OR m.movie_id IN (
+                SELECT pr.movie_id FROM principals pr JOIN persons p ON pr.person_id = p.person_id
+                WHERE p.primary_name LIKE ?))""")
+            params.extend([f"%{filters['q']}%"] * 2)
+        rows = self.query("SELECT m.movie_id FROM movies m LEFT JOIN ratings r ON m.movie_id = r.movie_id"
+                          " WHERE " + " AND ".join(where), params)
+        return {row[0] for row in rows}
+
+    def test_page_and_cursor_modes_agree(self):
+        for sort in self.SORTS:
+            for filters in self.FILTERS:
+                filters = dict(filters, sort=sort)
+                with self.subTest(**filters):
+                    by_page = self.walk_pages(filters)
+                    by_cursor = self.walk_cursor(filters)
+                    self.assertEqual(by_cursor, by_page)
+                    self.assertEqual(len(set(by_page)), len(by_page), "doublons")
+                    self.assertEqual(set(by_page), self.expected_ids(filters), "films manquants ou en trop")
+
+    def test_page_zero_or_negative_is_the_first_page(self):
+        for sort in self.SORTS:
+            for filters in ({}, {'year': '1990'}):
+                filters = dict(filters, sort=sort)
+                with self.subTest(**filters):
+                    first = sqlite_service.get_movies_list(1, self.PER_PAGE, filters)
+                    self.assertTrue(first[0])
+                    for page in (0, -1):
+                        self.assertEqual(sqlite_service.get_movies_list(page, self.PER_PAGE, filters), first)
+
+    def test_null_keys_close_the_descending_lists(self):
+        # DESC : les films sans année (ou sans note) sont en fin de liste, par movie_id décroissant
+        for sort, column in (('year_desc', 'm.start_year'), ('rating_desc', 'r.average_rating')):
+            with self.subTest(sort=sort):
+                ids = self.walk_cursor({'sort': sort})
+                nulls = [row[0] for row in self.query(
+                    f"SELECT m.movie_id FROM movies m LEFT JOIN ratings r ON m.movie_id = r.movie_id"
+                    f" WHERE m.title_type = 'movie' AND {column} IS NULL ORDER BY m.movie_id DESC")]
+                self.assertTrue(nulls)
+                self.assertEqual(ids[-len(nulls):], nulls)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first, _, _ = sqlite_service.get_movies_list(1, self.PER_PAGE, {'sort': 'title_asc'})
+        other_sort = sqlite_service.encode_cursor('year_desc', 'value', 2000, 'tt0000001')
+        for cursor in ('pas-un-curseur', other_sort):
+            with self.subTest(cursor=cursor):
+                movies, _, _ = sqlite_service.get_movies_list(1, self.PER_PAGE, {'sort': 'title_asc'}, cursor)
+                self.assertEqual(movies, first)
+
+
+class BitmapIndexTests(FixtureDBTestCase):
+    """L'index bitmap doit sélectionner exactement les films de la requête SQL équivalente."""
+
+    YEARS = [None, 1900, 1950, 1989, 1990, 2024, 2030]
+    RATINGS = [None, 0, 2.0, 6.3, 6.4, 6.5, 9.1, 10]
+    GENRES = [None, 'Drama', 'Horror', 'Inconnu']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        conn = sqlite3.connect(cls.db_path)
+        try:
+            cls.index = BitmapIndex.load(conn)
+        finally:
+            conn.close()
+
+    def sql_where(self, genre=None, year=None, rating=None):
+        where, params = ["m.title_type = 'movie'"], []
+        if year is not None:
+            where.append("m.start_year >= ?")
+            params.append(year)
+        if rating is not None:
+            where.append("r.average_rating >= ?")
+            params.append(rating)
+        if genre is not None:
+            where.append("m.movie_id IN (SELECT movie_id FROM genres WHERE genre = ?)")
+            params.append(genre)
+        return " WHERE " + " AND ".join(where), params
+
+    def sql_rowids(self, **criteria):
+        where, params = self.sql_where(**criteria)
+        return [row[0] for row in self.query(
+            "SELECT m.rowid FROM movies m LEFT JOIN ratings r ON m.movie_id = r.movie_id"
+            + where + " ORDER BY m.start_year DESC, m.movie_id DESC", params)]
+
+    def bitmap_rowids(self, bits, offset=0, limit=None):
+        return [self.index.rowids[pos] for pos in self.index.positions(bits, offset, limit)]
+
+    def test_positions_follow_default_sort(self):
+        self.assertEqual(list(self.index.rowids), self.sql_rowids())
+
+    def test_candidates_match_sql(self):
+        for genre in self.GENRES:
+            for year in self.YEARS:
+                for rating in self.RATINGS:
+                    criteria = {'genre': genre, 'year': year, 'rating': rating}
+                    with self.subTest(**criteria):
+                        bits = self.index.candidates(**criteria)
+                        self.assertEqual(self.bitmap_rowids(bits), self.sql_rowids(**criteria))
+
+    def test_positions_offset_and_limit(self):
+        bits = self.index.candidates(rating=6.4)
+        expected = self.sql_rowids(rating=6.4)
+        for offset, limit in ((0, 5), (3, 7), (len(expected) - 2, 10), (len(expected) + 5, 5)):
+            with self.subTest(offset=offset, limit=limit):
+                self.assertEqual(self.bitmap_rowids(bits, offset, limit), expected[offset:offset + limit])
+
+    def test_facet_counts_match_sql(self):
+        for criteria in ({}, {'year': 1990}, {'rating': 6.4, 'genre': 'Drama'}, {'genre': 'Inconnu'}):
+            with self.subTest(**criteria):
+                facets = self.index.facet_counts(**criteria)
+                where, params = self.sql_where(**criteria)
+                join = " FROM movies m LEFT JOIN ratings r ON m.movie_id = r.movie_id"
+                self.assertEqual(facets['total'], self.query("SELECT COUNT(*)" + join + where, params)[0][0])
+
+                # Genres comptés sans le filtre de genre
+                base_where, base_params = self.sql_where(year=criteria.get('year'), rating=criteria.get('rating'))
+                genres = dict(self.query(
+                    "SELECT g.genre, COUNT(*)" + join + " JOIN genres g ON g.movie_id = m.movie_id"
+                    + base_where + " GROUP BY g.genre", base_params))
+                self.assertEqual({g: n for g, n in facets['genres'].items() if n}, genres)
+
+                decades = dict(self.query(
+                    "SELECT CAST(m.start_year / 10 * 10 AS TEXT), COUNT(*)" + join + where
+                    + " AND m.start_year IS NOT NULL GROUP BY 1", params))
+                self.assertEqual({d: n for d, n in facets['decades'].items() if n}, decades)
+
+                buckets = {}
+                for (rating,) in self.query("SELECT r.average_rating" + join + where
+                                            + " AND r.average_rating IS NOT NULL", params):
+                    key = f"{int(rating * 2) / 2:g}"
+                    buckets[key] = buckets.get(key, 0) + 1
+                self.assertEqual({b: n for b, n in facets['ratings'].items() if n}, buckets)
+
+
+class DbVersionTests(FixtureDBTestCase):
+
+    def test_version_is_restated_at_most_once_per_interval(self):
+        sqlite_service.check_db_version()
+        with mock.patch.object(sqlite_service, 'db_version', return_value='changed') as stat:
+            for _ in range(50):
+                sqlite_service.get_movies_list(1, 5)
+            stat.assert_not_called()
+
+            # Intervalle écoulé : la nouvelle version est vue, les caches oubliés
+            sqlite_service._db_version_checked -= sqlite_service.DB_VERSION_CHECK_INTERVAL
+            self.assertEqual(sqlite_service.check_db_version(), 'changed')
+            self.assertIsNone(sqlite_service._bitmap)
+            stat.assert_called_once()
+
+
+@override_settings(DEBUG=False)
+class PoolStatsAccessTests(TestCase):
+
+    def test_anonymous_and_regular_users_are_refused(self):
+        self.assertEqual(self.client.get('/stats/pools/').status_code, 403)
+        self.client.force_login(User.objects.create_user('visiteur'))
+        self.assertEqual(self.client.get('/stats/pools/').status_code, 403)
+
+    def test_staff_sees_the_metrics(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get('/stats/pools/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('sqlite', response.json())
+
+    @override_settings(DEBUG=True)
+    def test_open_in_debug(self):
+        self.assertEqual(self.client.get('/stats/pools/').status_code, 200)
+
+
+class RecoMatrixTests(SimpleTestCase):
+
+    def test_versions_switch_atomically(self):
+        from movies.services import reco_engine
+
+        conn = sqlite3.connect(':memory:')
+        conn.executescript("""
+            CREATE TABLE movies (movie_id TEXT, title_type TEXT);
+            CREATE TABLE genres (movie_id TEXT, genre TEXT);
+            CREATE TABLE principals (movie_id TEXT, person_id TEXT, category TEXT);
+            CREATE TABLE directors (movie_id TEXT, person_id TEXT);
+            CREATE TABLE writers (movie_id TEXT, person_id TEXT);
+            INSERT INTO movies VALUES ('tt1', 'movie'), ('tt2', 'movie'), ('tt3', 'movie');
+            INSERT INTO genres VALUES ('tt1', 'Drama'), ('tt2', 'Drama'), ('tt3', 'Comedy'), ('tt1', 'Comedy');
+        """)
+        movie_ids, matrix = reco_engine.build_matrix(conn)
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+
+        versions = [reco_engine.save_matrix(path, movie_ids, matrix)['version'] for _ in range(3)]
+        self.assertEqual(reco_engine.matrix_version(path), versions[-1])
+        # Seules les KEEP_BUILDS dernières versions restent sur le disque
+        self.assertEqual(sorted(name for name in os.listdir(path) if name != reco_engine.CURRENT),
+                         versions[-reco_engine.KEEP_BUILDS:])
+
+        engine = reco_engine.RecoEngine.load(path)
+        self.assertEqual(engine.version, versions[-1])
+        self.assertEqual([movie_id for movie_id, _ in engine.similar('tt2', 2)], ['tt1'])
+
+
+class RecommendationsTests(FixtureDBTestCase):
+
+    def test_home_recommends_from_recently_viewed_movies(self):
+        self.client.cookies['recent_movies'] = 'tt0000003,<script>,tt0000001'
+        found = [{'id': 'tt0000002', 'title': 'Zorro', 'year': 1990, 'rating': {'average': 7.0}}]
+        with mock.patch('movies.views.aget_recommendations', new=mock.AsyncMock(return_value=found)) as reco:
+            response = self.client.get('/')
+        reco.assert_awaited_once_with(['tt0000003', 'tt0000001'], 5)
+        self.assertContains(response, 'Parce que vous avez vu')
+        self.assertContains(response, 'Zorro')
+
+
+class SQLiteFallbackDocumentTests(FixtureDBTestCase):
+    """Le document de secours SQLite doit être celui que migrate_enriched.py écrit dans Mongo."""
+
+    def migrated_documents(self):
+        scripts = os.path.join(settings.BASE_DIR, 'scripts', 'phase2_mongodb')
+        with mock.patch('sys.path', [str(scripts)] + sys.path):
+            from migrate_enriched import detect_config, iter_documents
+        conn = sqlite3.connect(self.db_path)
+        self.addCleanup(conn.close)
+        return list(iter_documents(conn, detect_config(conn.cursor())))
+
+    def test_same_document_as_mongo(self):
+        documents = self.migrated_documents()
+        self.assertTrue(any(doc['cast'] for doc in documents))
+        for doc in documents:
+            with self.subTest(movie_id=doc['_id']):
+                fallback = sqlite_service.get_movie_document(doc['_id'], cast_limit=None, titles_limit=None)
+                self.assertEqual(fallback.pop('cast_total'), len(doc['cast']))
+                self.assertEqual(fallback.pop('titles_total'), len(doc['titles']))
+                del fallback['id'], fallback['source'], doc['content_hash']
+                self.assertEqual(fallback, doc)
+
+    def test_detail_limits_and_unknown_movies(self):
+        # Un film noté avec plus d'acteurs que Mongo n'en garde
+        (movie_id,), = self.query("""
+            SELECT m.movie_id FROM movies m JOIN ratings r ON r.movie_id = m.movie_id
+            WHERE m.title_type = 'movie' AND (SELECT COUNT(*) FROM principals pr WHERE pr.movie_id = m.movie_id
+                                              AND pr.category IN ('actor', 'actress')) > ?
+            LIMIT 1
+        """, (sqlite_service.DOCUMENT_CAST,))
+        movie = sqlite_service.get_movie_document(movie_id, cast_limit=2)
+        self.assertEqual(len(movie['cast']), 2)
+        self.assertEqual(movie['cast_total'], sqlite_service.DOCUMENT_CAST)
+        self.assertIsNone(sqlite_service.get_movie_document('tt0000011'))   # tvSeries : absente de Mongo
+        self.assertIsNone(sqlite_service.get_movie_document('tt9999999'))
+
+
+class MongoStatsTests(SimpleTestCase):
+
+    def test_refused_aggregation_degrades_to_sqlite_stats(self):
+        from pymongo.errors import OperationFailure
+        from movies.services import mongo_service
+
+        collection = mock.MagicMock()
+        collection.estimated_document_count.return_value = 42
+        collection.aggregate.side_effect = OperationFailure("$facet refusé")
+        charts = {'genres': {'Drama': 3}, 'decades': {'1990': 2}}
+        with mock.patch.object(mongo_service, 'get_collection', return_value=collection), \
+                mock.patch.object(mongo_service, 'mongo_call', side_effect=lambda f, *a, **k: f(*a, **k)), \
+                mock.patch.object(mongo_service.sqlite_service, 'get_stats_for_charts', return_value=charts):
+            stats = mongo_service.get_mongo_stats()
+            self.assertTrue(stats['degraded'])
+            self.assertEqual((stats['count'], stats['genres'], stats['decades']), (42, charts['genres'], charts['decades']))
+
+            # Pas mis en cache : l'agrégation est retentée au prochain appel
+            calls = collection.aggregate.call_count
+            mongo_service.get_mongo_stats()
+            self.assertGreater(collection.aggregate.call_count, calls)
+
+
+class MissingDatabaseTests(SimpleTestCase):
+    """Base servie absente : les services renvoient leur réponse dégradée, pas d'exception."""
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.db_path = os.path.join(tmp_dir, 'absente.db')
+        serving = dict(settings.SQLITE_SERVING, PATH=self.db_path, RESULT_CACHE={'BACKEND': None})
+        override = override_settings(SQLITE_SERVING=serving)
+        override.enable()
+        self.addCleanup(override.disable)
+        reset_sqlite_service()
+        self.addCleanup(reset_sqlite_service)
+
+    def test_services_degrade(self):
+        self.assertTrue(sqlite_service.get_sqlite_stats()['status'].startswith('Erreur'))
+        self.assertEqual(sqlite_service.get_top_movies(), [])
+        self.assertEqual(sqlite_service.get_movies_list(), ([], False, None))
+        self.assertEqual(sqlite_service.get_movies_list(filters={'sort': 'title_asc'}), ([], False, None))
+        self.assertEqual(sqlite_service.get_movie_genres('tt0000001'), [])
+        self.assertIsNone(sqlite_service.get_movie_document('tt0000001'))
+        self.assertIsNone(sqlite_service.get_facet_counts())
+        self.assertEqual(sqlite_service.get_random_movies(), [])
+        self.assertEqual(sqlite_service.get_stats_for_charts()['genres'], {})
+        self.assertEqual(sqlite_service.get_pool_stats()['in_use'], 0)
+        # Le mode lecture seule ne crée pas le fichier
+        self.assertFalse(os.path.exists(self.db_path))
+
+    def test_pages_still_render(self):
+        self.assertEqual(self.client.get('/movies/').status_code, 200)
+
+
+class MaterializedStatsTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, 'stats.db')
+        build_fixture_db(path)
+        self.conn = sqlite3.connect(path)
+        self.addCleanup(self.conn.close)
+
+    def test_constant_volume_update_is_detected(self):
+        from movies.services.materialized_stats import STATS_GROUPS, read_stats, refresh_stats
+
+        self.assertEqual(refresh_stats(self.conn), list(STATS_GROUPS))
+        self.assertEqual(refresh_stats(self.conn), [])
+
+        # Nouvelles notes, même nombre de lignes (mise à jour IMDb habituelle)
+        self.conn.execute("UPDATE ratings SET average_rating = 9.5")
+        self.conn.commit()
+        self.assertEqual(refresh_stats(self.conn), ['ratings'])
+        self.assertEqual(read_stats(self.conn, 'ratings')[0], {'9': self.conn.execute(
+            "SELECT count(*) FROM ratings").fetchone()[0]})
+
+        # Suppression + insertion : même nombre de lignes, autres années
+        self.conn.execute("DELETE FROM movies WHERE movie_id = 'tt0000001'")
+        self.conn.execute("INSERT INTO movies VALUES ('tt0000001', 'movie', 'Nouveau', 'Nouveau', 0, 1880, NULL, 90)")
+        self.conn.commit()
+        self.assertEqual(refresh_stats(self.conn), ['summary', 'decades'])
+        self.assertIn('1880', read_stats(self.conn, 'decades')[0])
+
+
+class SortKeyTriggerTests(SimpleTestCase):
+    """Les clés de tri suivent les titres et les noms modifiés après l'import."""
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, 'denormalize.db')
+        build_fixture_db(path)
+        scripts = os.path.join(settings.BASE_DIR, 'scripts', 'phase1_sqlite')
+        with mock.patch('sys.path', [str(scripts)] + sys.path):
+            import denormalize
+        conn = denormalize.connect(path)
+        with mock.patch('builtins.print'):
+            denormalize.build_sort_keys(conn)
+        conn.close()
+        self.conn = denormalize.connect(path)
+        self.addCleanup(self.conn.close)
+
+    def sort_key(self, sql, key):
+        return self.conn.execute(sql, (key,)).fetchone()[0]
+
+    def test_inserted_and_renamed_rows(self):
+        self.conn.execute("INSERT INTO movies (movie_id, title_type, primary_title, original_title) "
+                          "VALUES ('tt9999999', 'movie', 'Éléphant', 'Éléphant')")
+        self.assertEqual(self.sort_key("SELECT sort_title FROM movies WHERE movie_id = ?", 'tt9999999'), 'elephant')
+
+        self.conn.execute("UPDATE movies SET primary_title = 'Amélie' WHERE movie_id = 'tt9999999'")
+        self.assertEqual(self.sort_key("SELECT sort_title FROM movies WHERE movie_id = ?", 'tt9999999'), 'amelie')
+
+        self.conn.execute("UPDATE persons SET primary_name = 'Émilie Dequenne' WHERE person_id = 'nm0000001'")
+        self.assertEqual(self.sort_key("SELECT sort_name FROM persons WHERE person_id = ?", 'nm0000001'),
+                         'emiliedequenne')
+
+    def test_writer_without_strip_accents_fails_loudly(self):
+        path = self.conn.execute("PRAGMA database_list").fetchone()[2]
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        with self.assertRaisesRegex(sqlite3.OperationalError, 'strip_accents'):
+            conn.execute("UPDATE movies SET primary_title = 'Nouveau' WHERE movie_id = 'tt0000001'")
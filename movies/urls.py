@@ -10,8 +10,11 @@ urlpatterns = [
     
     # Détail (capture l'ID, ex: tt0012345)
     path('movies/<str:movie_id>/', views.movie_detail, name='movie_detail'),
+    # Casting / titres complets en JSON (liens "voir tout" de la fiche)
+    path('movies/<str:movie_id>/sections/', views.movie_sections, name='movie_sections'),
     
     # Recherche & Stats
     path('search/', views.search, name='search'),
     path('stats/', views.stats_view, name='stats'),
+    path('stats/pools/', views.pool_stats, name='pool_stats'),
 ]
\ No newline at end of file
@@ -1,35 +1,59 @@
 from django.shortcuts import render
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+import asyncio
+import os
+import re
 import json # Nécessaire pour les graphiques Chart.js
 
-# Import des services SQLite
-from .services.sqlite_service import (
-    get_sqlite_stats, 
-    get_top_movies,
-    get_random_movies, 
-    get_movies_list, 
-    get_all_genres,
-    get_stats_for_charts # Nouvelle fonction pour les graphiques
-    
+# Services SQLite et MongoDB en version asynchrone : les appels indépendants
+# d'une page partent en même temps, la page dure autant que le plus lent
+from .services.async_service import (
+    aget_sqlite_stats,
+    aget_top_movies,
+    aget_random_movies,
+    aget_movies_list,
+    aget_all_genres,
+    aget_facet_counts,
+    aget_stats_for_charts, # Nouvelle fonction pour les graphiques
+    aget_movie_details,
+    aget_movie_sections,
+    aget_similar_movies,
+    aget_similar_for,
+    aget_mongo_stats,
+    aget_recommendations,
 )
+from .services.sqlite_service import get_pool_stats, get_cache_stats
+from .services.mongo_service import get_mongo_pool_stats
 
-# Import des services MongoDB (C'est cette ligne qui manquait !)
-from .services.mongo_service import (
-    get_movie_details, 
-    get_similar_movies, 
-    get_mongo_stats
-)
+# Derniers films consultés, gardés dans un cookie (pas de session en base) :
+# base des recommandations "Parce que vous avez vu..." de l'accueil
+RECENT_COOKIE = 'recent_movies'
+RECENT_MAX = 5
+RECENT_MAX_AGE = 30 * 24 * 3600
+MOVIE_ID_RE = re.compile(r'^tt\d+$')
 
-def home(request):
+def recent_movie_ids(request):
+    """Identifiants du cookie des films consultés (les valeurs invalides sont ignorées)."""
+    ids = request.COOKIES.get(RECENT_COOKIE, '').split(',')
+    return [movie_id for movie_id in ids if MOVIE_ID_RE.match(movie_id)][:RECENT_MAX]
+
+async def home(request):
     """Page d'accueil avec Top films."""
-    global_stats = get_sqlite_stats()
-    top_movies = get_top_movies(10)
-    
-    random_movies = get_random_movies(5)
+    global_stats, top_movies, random_movies, recommendations = await asyncio.gather(
+        aget_sqlite_stats(),
+        aget_top_movies(10),
+        aget_random_movies(5),
+        aget_recommendations(recent_movie_ids(request), 5),
+    )
     
     context = {
         'stats': global_stats,
         'movies': top_movies,
-        'random_movies': random_movies # <--- On l'envoie au template
+        'random_movies': random_movies, # <--- On l'envoie au template
+        'recommendations': recommendations,
     }
     
     return render(request, 'movies/home.html', context)
@@ -41,64 +65,116 @@ def clean_param(param):
         return None
     return param
 
-def movie_list(request):
+async def movie_list(request):
     """Catalogue avec filtres et pagination."""
     page = int(request.GET.get('page', 1))
     
     # On nettoie chaque paramètre pour éviter le bug du "None"
+    q = clean_param(request.GET.get('q'))
     filters = {
-        'q': clean_param(request.GET.get('q')),
+        'q': q,
         'genre': clean_param(request.GET.get('genre')),
         'year': clean_param(request.GET.get('year')),
         'rating': clean_param(request.GET.get('rating')),
-        'sort': request.GET.get('sort', 'year_desc') # Valeur par défaut ici
+        # Valeur par défaut ici : pertinence pour une recherche, sinon les plus récents
+        'sort': clean_param(request.GET.get('sort')) or ('relevance' if q else 'year_desc')
     }
 
-    # Le reste ne change pas
-    movies, has_next = get_movies_list(page=page, filters=filters)
-    genres = get_all_genres()
+    # Lien 'Suivant' = curseur (coût constant même en page 500) ; le numéro de
+    # page ne sert alors qu'à l'affichage et au lien 'Précédent'
+    cursor = clean_param(request.GET.get('cursor'))
+
+    # Compteurs par genre pour la barre latérale ("Drama (12345)")
+    (movies, has_next, next_cursor), genres, facets = await asyncio.gather(
+        aget_movies_list(page=page, filters=filters, cursor=cursor),
+        aget_all_genres(),
+        aget_facet_counts(filters),
+    )
+    genre_counts = facets['genres'] if facets else {}
     
     context = {
         'movies': movies, 
         'genres': genres, 
+        'genre_options': [(g, genre_counts.get(g)) for g in genres],
+        'total': facets['total'] if facets else None,
         'filters': filters, 
         'page': page, 
         'has_next': has_next,
+        'next_cursor': next_cursor,
         'next_page': page + 1, 
         'prev_page': page - 1
     }
     return render(request, 'movies/movie_list.html', context)
 
-def movie_detail(request, movie_id):
+async def movie_detail(request, movie_id):
     """Page Détail (Source: MongoDB)."""
-    # 1. On cherche le film dans Mongo
-    movie = get_movie_details(movie_id)
+    # 1. On cherche le film dans Mongo, et en même temps ses similaires
+    #    (genres lus dans SQLite, sans attendre la fiche)
+    movie, similar_movies = await asyncio.gather(
+        aget_movie_details(movie_id),
+        aget_similar_for(movie_id),
+    )
     
     # 2. Gestion erreur 404 si pas trouvé
     if not movie:
         return render(request, 'movies/404.html', {'message': f"Le film {movie_id} est absent de MongoDB"}, status=404)
 
-    # 3. Films similaires
+    # 3. Films similaires (film absent de SQLite : on repart des genres de la fiche)
     genres = movie.get('genres', [])
-    similar_movies = get_similar_movies(genres, exclude_id=movie_id)
+    if not similar_movies and genres:
+        similar_movies = await aget_similar_movies(genres, exclude_id=movie_id)
+
+    response = render(request, 'movies/movie_detail.html', {'movie': movie, 'similar_movies': similar_movies})
+    recent = [movie_id] + [m for m in recent_movie_ids(request) if m != movie_id]
+    response.set_cookie(RECENT_COOKIE, ','.join(recent[:RECENT_MAX]), max_age=RECENT_MAX_AGE,
+                        httponly=True, samesite='Lax')
+    return response
 
-    return render(request, 'movies/movie_detail.html', {'movie': movie, 'similar_movies': similar_movies})
+async def movie_sections(request, movie_id):
+    """Sections complètes d'une fiche en JSON (?fields=cast,titles), chargées à la demande."""
+    fields = [f for f in request.GET.get('fields', '').split(',') if f]
+    sections = await aget_movie_sections(movie_id, fields)
+    if sections is None:
+        return JsonResponse({'error': f"Le film {movie_id} est introuvable"}, status=404)
+    return JsonResponse(sections)
 
-def search(request):
-    return movie_list(request)
+async def search(request):
+    return await movie_list(request)
 
-def stats_view(request):
+async def stats_view(request):
     """Page Statistiques avec Graphiques Chart.js."""
-    # On récupère les données brutes SQL
-    chart_data = get_stats_for_charts()
+    # On récupère les données brutes SQL et les stats Mongo en parallèle
+    chart_data, sqlite_stats, mongo_stats = await asyncio.gather(
+        aget_stats_for_charts(),
+        aget_sqlite_stats(),
+        aget_mongo_stats(),
+    )
     
     # On les convertit en JSON pour que le JavaScript puisse les lire
     context = {
-        'sqlite': get_sqlite_stats(),
-        'mongo': get_mongo_stats(),
+        'sqlite': sqlite_stats,
+        'mongo': mongo_stats,
         'genres_data': json.dumps(chart_data['genres']),
         'decades_data': json.dumps(chart_data['decades']),
         'ratings_data': json.dumps(chart_data['ratings']),
         'actors_data': json.dumps(chart_data['actors'])
     }
-    return render(request, 'movies/stats.html', context)
\ No newline at end of file
+    return render(request, 'movies/stats.html', context)
+
+def _is_staff(request):
+    return request.user.is_staff
+
+async def pool_stats(request):
+    """Métriques des pools du worker (SQLite, cache de résultats, MongoDB), pour la supervision."""
+    # Détails internes du serveur : réservés à l'équipe (compte staff), sauf en développement
+    # (request.user se résout par une requête en base : hors de la boucle asyncio,
+    # request.auser() n'existant qu'à partir de Django 5.0)
+    if not settings.DEBUG and not await sync_to_async(_is_staff)(request):
+        raise PermissionDenied
+    # Simples compteurs en mémoire : pas besoin de passer par les pools de threads
+    return JsonResponse({
+        'pid': os.getpid(),
+        'sqlite': get_pool_stats(),
+        'result_cache': get_cache_stats(),
+        'mongo': get_mongo_pool_stats(),
+    })
@@ -0,0 +1,33 @@
+import sqlite3
+import os
+import sys
+import time
+
+# Base servie par Django
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
+RECO_PATH = os.path.join(BASE_DIR, 'data', 'reco')
+
+# Même code que le moteur chargé par le site (movies/services/reco_engine.py)
+sys.path.append(BASE_DIR)
+from movies.services.reco_engine import build_matrix, save_matrix
+
+def run_build(conn, path=RECO_PATH):
+    print("Construction des matrices de recommandation (TF-IDF)...", end=' ', flush=True)
+    start_t = time.time()
+    movie_ids, matrix = build_matrix(conn)
+    meta = save_matrix(path, movie_ids, matrix)
+    n_movies, n_features = meta['shape']
+    print(f"{n_movies} films x {n_features} caractéristiques, {meta['nnz']} valeurs "
+          f"({time.time() - start_t:.2f}s)")
+
+if __name__ == "__main__":
+    # Usage : python3 build_reco_matrix.py [chemin.db] [dossier de sortie]
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    out_path = sys.argv[2] if len(sys.argv) > 2 else RECO_PATH
+    if not os.path.exists(db_path):
+        print(f"❌ Base introuvable : {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(db_path)
+    run_build(conn, out_path)
+    conn.close()
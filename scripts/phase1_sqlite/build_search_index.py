@@ -0,0 +1,127 @@
+import sqlite3
+import os
+import sys
+import time
+
+# Base servie par Django
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
+
+# Index plein texte : une ligne par film
+# - title    : titre principal + titre original
+# - akas     : titres alternatifs (table titles)
+# - people   : noms du casting principal (principals -> persons)
+# - movie_id : clé du film (UNINDEXED), sur laquelle le site fait la jointure.
+#   Jamais movies.rowid : movies a une clé TEXT, son rowid implicite peut être
+#   renuméroté par un VACUUM.
+SEARCH_TABLE = 'movie_search'
+# rowid FTS de chaque film : INTEGER PRIMARY KEY explicite, stable (VACUUM
+# ne le renumérote pas). Sert aux triggers pour retrouver la ligne à supprimer.
+SEARCH_IDS = 'movie_search_ids'
+
+def _reindex_sql(movie_filter):
+    """
+    Requêtes qui reconstruisent la ligne FTS des films sélectionnés par
+    'movie_filter' (sous-requête renvoyant des movie_id).
+    Utilisées par le build complet ET par les triggers de synchronisation.
+    """
+    delete = f"""
+        DELETE FROM {SEARCH_TABLE}
+        WHERE rowid IN (SELECT id FROM {SEARCH_IDS} WHERE movie_id IN ({movie_filter}));
+    """
+    insert = f"""
+        INSERT OR IGNORE INTO {SEARCH_IDS} (movie_id)
+        SELECT movie_id FROM movies WHERE title_type = 'movie' AND movie_id IN ({movie_filter});
+        INSERT INTO {SEARCH_TABLE} (rowid, title, akas, people, movie_id)
+        SELECT
+            ids.id,
+            IFNULL(m.primary_title, '') ||
+                CASE WHEN m.original_title != m.primary_title THEN ' ' || m.original_title ELSE '' END,
+            (SELECT GROUP_CONCAT(t.title, ' ') FROM titles t WHERE t.movie_id = m.movie_id),
+            (SELECT GROUP_CONCAT(p.primary_name, ' ')
+             FROM principals pr
+             JOIN persons p ON pr.person_id = p.person_id
+             WHERE pr.movie_id = m.movie_id),
+            m.movie_id
+        FROM movies m
+        JOIN {SEARCH_IDS} ids ON ids.movie_id = m.movie_id
+        WHERE m.title_type = 'movie' AND m.movie_id IN ({movie_filter});
+    """
+    return delete, insert
+
+def _create_triggers(conn):
+    """Garde l'index synchronisé avec movies, titles, principals et persons."""
+    triggers = {
+        # Films
+        'trg_search_movies_ins': ("AFTER INSERT ON movies", "SELECT NEW.movie_id"),
+        'trg_search_movies_upd': ("AFTER UPDATE OF primary_title, original_title, title_type ON movies", "SELECT NEW.movie_id"),
+        # Titres alternatifs
+        'trg_search_titles_ins': ("AFTER INSERT ON titles", "SELECT NEW.movie_id"),
+        'trg_search_titles_upd': ("AFTER UPDATE OF title, movie_id ON titles", "SELECT NEW.movie_id UNION SELECT OLD.movie_id"),
+        'trg_search_titles_del': ("AFTER DELETE ON titles", "SELECT OLD.movie_id"),
+        # Casting
+        'trg_search_principals_ins': ("AFTER INSERT ON principals", "SELECT NEW.movie_id"),
+        'trg_search_principals_del': ("AFTER DELETE ON principals", "SELECT OLD.movie_id"),
+        # Renommage d'une personne -> tous ses films
+        'trg_search_persons_upd': ("AFTER UPDATE OF primary_name ON persons",
+                                   "SELECT movie_id FROM principals WHERE person_id = NEW.person_id"),
+    }
+    for name, (event, movie_filter) in triggers.items():
+        delete, insert = _reindex_sql(movie_filter)
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {delete} {insert} END")
+
+    # Suppression d'un film : sa ligne FTS et son identifiant
+    conn.execute("DROP TRIGGER IF EXISTS trg_search_movies_del")
+    conn.execute(f"""
+        CREATE TRIGGER trg_search_movies_del AFTER DELETE ON movies BEGIN
+            DELETE FROM {SEARCH_TABLE}
+            WHERE rowid = (SELECT id FROM {SEARCH_IDS} WHERE movie_id = OLD.movie_id);
+            DELETE FROM {SEARCH_IDS} WHERE movie_id = OLD.movie_id;
+        END
+    """)
+
+def build_search_index(conn):
+    """(Re)construit l'index FTS5 complet et installe les triggers de synchro."""
+    print("Construction de l'index de recherche (FTS5)...", end=' ', flush=True)
+    start_t = time.time()
+
+    # Les sous-requêtes par film s'appuient sur ces index (PK de principals pour le casting)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_titles_mid ON titles(movie_id)")
+
+    conn.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    conn.execute(f"DROP TABLE IF EXISTS {SEARCH_IDS}")
+    conn.execute(f"CREATE TABLE {SEARCH_IDS} (id INTEGER PRIMARY KEY, movie_id TEXT NOT NULL UNIQUE)")
+    # remove_diacritics 2 : 'amelie' trouve 'Amélie'
+    # prefix : recherche "au fil de la frappe" (requêtes 'ame*') sans scan des termes
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+            title, akas, people,
+            movie_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+    _, insert = _reindex_sql("SELECT movie_id FROM movies")
+    # Deux instructions (identifiants puis lignes FTS) : execute() n'en prend qu'une
+    for statement in insert.split(';'):
+        if statement.strip():
+            conn.execute(statement)
+    conn.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    _create_triggers(conn)
+    conn.commit()
+
+    count = conn.execute(f"SELECT count(*) FROM {SEARCH_TABLE}").fetchone()[0]
+    print(f"{count} films indexés ({time.time() - start_t:.2f}s)")
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    if not os.path.exists(db_path):
+        print(f"❌ Base introuvable : {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(db_path)
+    build_search_index(conn)
+    # Base importée avant le passage en WAL : le site (lecture seule) ne peut pas l'activer
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
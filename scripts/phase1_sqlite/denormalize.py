@@ -0,0 +1,158 @@
+import sqlite3
+import os
+import sys
+import time
+
+# Base servie par Django
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
+
+# Même normalisation que le site (movies/services/text_utils.py)
+sys.path.append(BASE_DIR)
+from movies.services.text_utils import strip_accents
+
+# Les clés de tri sont tenues à jour par des triggers qui appellent
+# strip_accents, une fonction Python : toute connexion qui écrit dans movies ou
+# persons doit l'enregistrer (register_functions / connect ci-dessous), sinon
+# l'écriture échoue avec "no such function: strip_accents".
+
+def register_functions(conn):
+    """Fonctions Python appelées par les triggers de la base."""
+    conn.create_function("strip_accents", 1, strip_accents, deterministic=True)
+
+def connect(db_path=DB_PATH):
+    """Connexion en écriture à la base servie, prête pour ses triggers."""
+    conn = sqlite3.connect(db_path)
+    register_functions(conn)
+    return conn
+
+def add_column(conn, table, column, col_type):
+    """ALTER TABLE ... ADD COLUMN si la colonne n'existe pas encore (base déjà importée)."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+
+def build_sort_keys(conn):
+    """
+    Clés de tri insensibles aux accents, calculées en bloc à l'import puis
+    tenues à jour par triggers (film ajouté ou renommé) :
+    - movies.sort_title  = strip_accents(primary_title)
+    - persons.sort_name  = strip_accents(primary_name)
+    Avec l'index, un tri par titre devient un parcours d'index qui s'arrête après une page.
+    """
+    print("Calcul des clés de tri...", end=' ', flush=True)
+    start_t = time.time()
+
+    register_functions(conn)
+
+    add_column(conn, 'movies', 'sort_title', 'TEXT')
+    conn.execute("UPDATE movies SET sort_title = strip_accents(primary_title)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_movies_sort_title ON movies(title_type, sort_title, movie_id)")
+
+    add_column(conn, 'persons', 'sort_name', 'TEXT')
+    conn.execute("UPDATE persons SET sort_name = strip_accents(primary_name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_persons_sort_name ON persons(sort_name)")
+
+    # Synchro : (table, clé, colonne source, clé primaire)
+    for table, key, source, pk in (('movies', 'sort_title', 'primary_title', 'movie_id'),
+                                   ('persons', 'sort_name', 'primary_name', 'person_id')):
+        update = f"UPDATE {table} SET {key} = strip_accents(NEW.{source}) WHERE {pk} = NEW.{pk};"
+        for name, event in ((f"trg_{table}_{key}_ins", f"AFTER INSERT ON {table}"),
+                            (f"trg_{table}_{key}_upd", f"AFTER UPDATE OF {source} ON {table}")):
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {update} END")
+
+    conn.commit()
+    print(f"({time.time() - start_t:.2f}s)")
+
+# Recalcule les colonnes de genres des films sélectionnés par 'movie_filter'
+# (sous-requête renvoyant des movie_id) ; build complet ET triggers
+GENRE_COLUMNS_SQL = """
+    UPDATE movies SET
+        genres_text = (SELECT GROUP_CONCAT(genre, ', ')
+                       FROM (SELECT genre FROM genres WHERE movie_id = movies.movie_id ORDER BY genre)),
+        genre_mask = IFNULL((SELECT SUM(1 << b.bit)
+                             FROM genres g JOIN genre_bits b ON g.genre = b.genre
+                             WHERE g.movie_id = movies.movie_id), 0)
+    WHERE movie_id IN ({movie_filter});
+"""
+
+def build_genre_columns(conn):
+    """
+    Genres dénormalisés sur movies (la table genres reste la source de vérité) :
+    - genres_text : 'Action, Drama' prêt à afficher (plus de GROUP_CONCAT par ligne)
+    - genre_mask  : un bit par genre (table genre_bits), filtre = test bit à bit
+    IMDb compte une trentaine de genres : ils tiennent dans un entier 64 bits.
+    """
+    print("Dénormalisation des genres...", end=' ', flush=True)
+    start_t = time.time()
+
+    conn.execute("""CREATE TABLE IF NOT EXISTS genre_bits (
+        genre TEXT PRIMARY KEY,
+        bit INTEGER UNIQUE
+    )""")
+    # Les genres déjà numérotés gardent leur bit ; les nouveaux prennent les suivants
+    known = {genre for (genre,) in conn.execute("SELECT genre FROM genre_bits")}
+    next_bit = conn.execute("SELECT IFNULL(MAX(bit) + 1, 0) FROM genre_bits").fetchone()[0]
+    for (genre,) in conn.execute("SELECT DISTINCT genre FROM genres ORDER BY genre").fetchall():
+        if genre not in known:
+            conn.execute("INSERT INTO genre_bits VALUES (?, ?)", (genre, next_bit))
+            next_bit += 1
+    if next_bit > 63:
+        print(f"⚠️  {next_bit} genres : le masque 64 bits déborde.")
+
+    add_column(conn, 'movies', 'genres_text', 'TEXT')
+    add_column(conn, 'movies', 'genre_mask', 'INTEGER DEFAULT 0')
+    conn.execute(GENRE_COLUMNS_SQL.format(movie_filter="SELECT movie_id FROM movies"))
+
+    # Synchro : toute modification de la table genres met à jour le film concerné
+    triggers = {
+        'trg_genres_ins': ("AFTER INSERT ON genres", "SELECT NEW.movie_id"),
+        'trg_genres_upd': ("AFTER UPDATE ON genres", "SELECT NEW.movie_id UNION SELECT OLD.movie_id"),
+        'trg_genres_del': ("AFTER DELETE ON genres", "SELECT OLD.movie_id"),
+    }
+    for name, (event, movie_filter) in triggers.items():
+        new_bit = ""
+        if not event.endswith("DELETE ON genres"):
+            new_bit = """
+                INSERT OR IGNORE INTO genre_bits (genre, bit)
+                SELECT NEW.genre, IFNULL(MAX(bit) + 1, 0) FROM genre_bits;
+            """
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"""
+            CREATE TRIGGER {name} {event} BEGIN
+                {new_bit}
+                {GENRE_COLUMNS_SQL.format(movie_filter=movie_filter)}
+            END
+        """)
+
+    conn.commit()
+    print(f"({time.time() - start_t:.2f}s)")
+
+def build_catalogue_indexes(conn):
+    """
+    Index des tris du catalogue, terminés par movie_id (départage du curseur) :
+    chaque page de la pagination par curseur est un parcours d'index borné,
+    quelle que soit sa profondeur.
+    """
+    print("Index du catalogue...", end=' ', flush=True)
+    start_t = time.time()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_movies_type_year ON movies(title_type, start_year, movie_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ratings_avg_mid ON ratings(average_rating, movie_id)")
+    conn.commit()
+    print(f"({time.time() - start_t:.2f}s)")
+
+def denormalize(conn):
+    """Toutes les colonnes dérivées, dans l'ordre (appelé en fin d'import)."""
+    build_sort_keys(conn)
+    build_genre_columns(conn)
+    build_catalogue_indexes(conn)
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    if not os.path.exists(db_path):
+        print(f"❌ Base introuvable : {db_path}")
+        sys.exit(1)
+    conn = connect(db_path)
+    denormalize(conn)
+    conn.close()
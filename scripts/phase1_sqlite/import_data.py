@@ -88,6 +88,21 @@ def import_data():
 
     conn.execute("PRAGMA foreign_keys = ON")
     conn.commit()
+
+    # Colonnes dérivées (clés de tri, ...) calculées une fois pour toutes
+    from denormalize import denormalize
+    denormalize(conn)
+
+    # Index plein texte pour la recherche du catalogue (+ triggers de synchro)
+    from build_search_index import build_search_index
+    build_search_index(conn)
+
+    # Statistiques matérialisées (/stats et page d'accueil)
+    from refresh_stats import run_refresh
+    run_refresh(conn, full=True)
+
+    # Mode WAL pour le site : les lecteurs (pool Django) ne bloquent plus les écritures
+    conn.execute("PRAGMA journal_mode = WAL")
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,30 @@
+import sqlite3
+import os
+import sys
+import time
+
+# Base servie par Django
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
+
+# Mêmes requêtes que le site (movies/services/materialized_stats.py)
+sys.path.append(BASE_DIR)
+from movies.services.materialized_stats import refresh_stats
+
+def run_refresh(conn, full=False):
+    print("Rafraîchissement des statistiques...", end=' ', flush=True)
+    start_t = time.time()
+    refreshed = refresh_stats(conn, full=full)
+    detail = ', '.join(refreshed) if refreshed else 'rien à recalculer'
+    print(f"{detail} ({time.time() - start_t:.2f}s)")
+
+if __name__ == "__main__":
+    # Usage : python3 refresh_stats.py [chemin.db] [--full]
+    args = [a for a in sys.argv[1:] if a != '--full']
+    db_path = args[0] if args else DB_PATH
+    if not os.path.exists(db_path):
+        print(f"❌ Base introuvable : {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(db_path)
+    run_refresh(conn, full='--full' in sys.argv)
+    conn.close()
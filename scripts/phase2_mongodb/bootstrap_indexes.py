@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+import pymongo
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+DB_NAME = 'cineexplorer'
+
+# Mêmes déclarations que le site (movies/services/mongo_indexes.py)
+sys.path.append(BASE_DIR)
+from movies.services.mongo_indexes import ensure_indexes, check_queries
+
+def run_bootstrap(db, check_only=False):
+    """Crée les index de service puis vérifie les plans. Renvoie False si un plan est mauvais."""
+    if not check_only:
+        print("🔨 Index de service MongoDB...", end=' ', flush=True)
+        start_t = time.time()
+        report = ensure_indexes(db)
+        print(f"{len(report['created'])} créé(s), {len(report['existing'])} déjà présent(s) "
+              f"({time.time() - start_t:.2f}s)")
+        for name in report['created']:
+            print(f"   + {name}")
+        for name in report['conflicts']:
+            print(f"   ⚠️  {name} : un index de ce nom existe avec d'autres clés")
+
+    print("🔍 Vérification des plans (explain)...")
+    results = check_queries(db)
+    if not results:
+        print("   ⚠️  Collection movies vide : rien à vérifier.")
+        return True
+    for name, ok, stages in results:
+        icon = "✅" if ok else "❌"
+        print(f"   {icon} {name:<25} {' <- '.join(stages)}")
+    return all(ok for _, ok, _ in results)
+
+if __name__ == "__main__":
+    # Usage : python3 bootstrap_indexes.py [--check]   (--check : vérifie sans rien créer)
+    try:
+        client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+        client.admin.command('ping')
+    except Exception as e:
+        print(f"❌ Erreur connexion Mongo : {e}")
+        sys.exit(1)
+
+    try:
+        ok = run_bootstrap(client[DB_NAME], check_only='--check' in sys.argv)
+    finally:
+        client.close()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,199 @@
+import heapq
+import math
+import sys
+import time
+from datetime import datetime, timezone
+
+import pymongo
+
+# --- CONFIGURATION ---
+MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+DB_NAME = 'cineexplorer'
+TARGET = 'similar_movies'   # { _id: film, movies: [voisins prêts à afficher], built_at }
+
+TOP_N = 12                  # Voisins gardés par film (la page en affiche 6)
+
+# Poids du score final (somme = 1)
+W_GENRES = 0.45             # Jaccard pondéré des genres (genre rare = poids fort)
+W_PEOPLE = 0.40             # Jaccard pondéré des personnes communes
+W_RATING = 0.15             # A priori : note bayésienne du voisin
+
+# Poids d'une personne selon son rôle dans le film
+ROLE_WEIGHTS = {'directors': 3.0, 'writers': 2.0, 'cast': 1.0}
+
+# Une personne présente dans trop de films n'apporte presque rien au score
+# et ferait exploser le nombre de candidats : on l'ignore
+MAX_PERSON_MOVIES = 300
+
+# Candidats "même genre" ajoutés même sans personne en commun
+GENRE_CANDIDATES = 40
+
+def bayesian_rating(average, votes, prior_mean, prior_votes):
+    """Note lissée : un 9/10 avec 3 votes ne passe pas devant un 8/10 avec 100 000 votes."""
+    if not average:
+        return prior_mean
+    return (votes * average + prior_votes * prior_mean) / (votes + prior_votes)
+
+def load_movies(collection):
+    """Charge genres, personnes et note de tous les films (documents enrichis)."""
+    print("📥 Lecture des documents enrichis...", end=' ', flush=True)
+    start = time.time()
+    projection = {"title": 1, "year": 1, "rating": 1, "poster": 1, "genres": 1,
+                  "cast.name": 1, "directors.name": 1, "writers.name": 1}
+    movies = []
+    for doc in collection.find({}, projection, batch_size=5000):
+        people = {}
+        for role, weight in ROLE_WEIGHTS.items():
+            for person in doc.get(role) or []:
+                name = person.get('name')
+                if name:
+                    # Même personne à plusieurs postes : on garde le rôle le plus fort
+                    people[name] = max(people.get(name, 0), weight)
+        movies.append({
+            'doc': {k: doc[k] for k in ('_id', 'title', 'year', 'rating', 'poster') if k in doc},
+            'genres': set(doc.get('genres') or []),
+            'people': people,
+        })
+    print(f"{len(movies)} films ({time.time() - start:.1f}s)")
+    return movies
+
+def prepare(movies):
+    """IDF des genres et des personnes, poids par film, note a priori."""
+    total = len(movies)
+
+    genre_df, person_df = {}, {}
+    for m in movies:
+        for g in m['genres']:
+            genre_df[g] = genre_df.get(g, 0) + 1
+        for p in m['people']:
+            person_df[p] = person_df.get(p, 0) + 1
+    genre_idf = {g: math.log(total / df) + 1 for g, df in genre_df.items()}
+    person_idf = {p: math.log(total / df) + 1 for p, df in person_df.items()}
+
+    ratings = [(m['doc'].get('rating') or {}) for m in movies]
+    rated = [(r.get('average'), r.get('votes') or 0) for r in ratings if r.get('average')]
+    prior_mean = sum(a for a, _ in rated) / len(rated) if rated else 5.0
+    votes_sorted = sorted(v for _, v in rated)
+    prior_votes = votes_sorted[len(votes_sorted) // 2] if votes_sorted else 0  # médiane
+
+    for m, r in zip(movies, ratings):
+        m['genre_w'] = {g: genre_idf[g] for g in m['genres']}
+        m['genre_sum'] = sum(m['genre_w'].values())
+        m['people_w'] = {
+            p: role_w * person_idf[p]
+            for p, role_w in m['people'].items() if person_df[p] <= MAX_PERSON_MOVIES
+        }
+        m['people_sum'] = sum(m['people_w'].values())
+        m['prior'] = bayesian_rating(r.get('average'), r.get('votes') or 0, prior_mean, prior_votes) / 10
+
+    # Index inversé personne -> films (positions dans 'movies')
+    by_person = {}
+    for i, m in enumerate(movies):
+        for p in m['people_w']:
+            by_person.setdefault(p, []).append(i)
+
+    # Meilleurs films (a priori) par genre et par combinaison exacte de genres
+    by_genre, by_combo = {}, {}
+    for i, m in enumerate(movies):
+        for g in m['genres']:
+            by_genre.setdefault(g, []).append(i)
+        if m['genres']:
+            by_combo.setdefault(frozenset(m['genres']), []).append(i)
+    best = lambda ids: heapq.nlargest(GENRE_CANDIDATES, ids, key=lambda j: movies[j]['prior'])
+    by_genre = {g: best(ids) for g, ids in by_genre.items()}
+    by_combo = {c: best(ids) for c, ids in by_combo.items()}
+
+    print(f"🧮 {len(genre_idf)} genres, {len(by_person)} personnes retenues "
+          f"(a priori : {prior_mean:.2f}/10, {prior_votes} votes)")
+    return by_person, by_genre, by_combo
+
+def weighted_jaccard(inter, sum_a, sum_b):
+    union = sum_a + sum_b - inter
+    return inter / union if union > 0 else 0.0
+
+def neighbours(i, movies, by_person, by_genre, by_combo):
+    """Les TOP_N voisins du film i : [(score, position)]."""
+    movie = movies[i]
+
+    # 1. Intersection pondérée des personnes, accumulée via l'index inversé
+    #    (somme des min : Jaccard pondéré = Σ min / Σ max)
+    shared_people = {}
+    for p, w in movie['people_w'].items():
+        for j in by_person[p]:
+            if j != i:
+                shared_people[j] = shared_people.get(j, 0.0) + min(w, movies[j]['people_w'][p])
+
+    # 2. Candidats : films avec une personne en commun + meilleurs films des mêmes genres
+    candidates = set(shared_people)
+    if movie['genres']:
+        candidates.update(by_combo.get(frozenset(movie['genres']), []))
+        for g in movie['genres']:
+            candidates.update(by_genre[g])
+    candidates.discard(i)
+
+    scored = []
+    for j in candidates:
+        other = movies[j]
+        genre_inter = sum(movie['genre_w'][g] for g in movie['genres'] & other['genres'])
+        genre_score = weighted_jaccard(genre_inter, movie['genre_sum'], other['genre_sum'])
+        people_score = weighted_jaccard(shared_people.get(j, 0.0), movie['people_sum'], other['people_sum'])
+        if genre_score == 0 and people_score == 0:
+            continue
+        score = W_GENRES * genre_score + W_PEOPLE * people_score + W_RATING * other['prior']
+        scored.append((score, j))
+    return heapq.nlargest(TOP_N, scored)
+
+def build_similar(uri=MONGO_URI):
+    print("🚀 Calcul des films similaires (hors ligne)...")
+    try:
+        client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=2000)
+        client.admin.command('ping')
+        db = client[DB_NAME]
+    except Exception as e:
+        print(f"❌ Erreur connexion Mongo : {e}")
+        return
+
+    try:
+        movies = load_movies(db['movies'])
+        if not movies:
+            print("❌ Collection movies vide : lancer d'abord la migration.")
+            return
+        by_person, by_genre, by_combo = prepare(movies)
+
+        # On construit dans une collection temporaire, puis on la renomme :
+        # le site lit l'ancienne version jusqu'au dernier moment
+        tmp = db[TARGET + '_tmp']
+        tmp.drop()
+        built_at = datetime.now(timezone.utc)
+        batch = []
+        start_time = time.time()
+        total = len(movies)
+
+        for i, movie in enumerate(movies):
+            found = neighbours(i, movies, by_person, by_genre, by_combo)
+            if found:
+                batch.append({
+                    "_id": movie['doc']['_id'],
+                    "movies": [dict(movies[j]['doc'], score=round(score, 4)) for score, j in found],
+                    "built_at": built_at,
+                })
+            if len(batch) >= 1000:
+                tmp.insert_many(batch, ordered=False)
+                batch = []
+                percent = ((i + 1) / total) * 100
+                print(f"⏳ {percent:.1f}% ({i+1}/{total})", end='\r')
+
+        if batch:
+            tmp.insert_many(batch, ordered=False)
+
+        if tmp.estimated_document_count():
+            tmp.rename(TARGET, dropTarget=True)
+        print(f"\n\n🎉 Voisins calculés pour {db[TARGET].estimated_document_count()} films "
+              f"en {time.time() - start_time:.1f}s.")
+    except Exception as e:
+        print(f"🚨 Erreur calcul des similaires : {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    build_similar(sys.argv[1] if len(sys.argv) > 1 else MONGO_URI)
@@ -0,0 +1,114 @@
+import sys
+import time
+from datetime import datetime, timezone
+
+import pymongo
+
+# Points de reprise des longues migrations, stockés dans Mongo (collection
+# 'migration_checkpoints' de la base migrée, un document par script) :
+#
+#   { _id: 'migrate_enriched', status: 'running' | 'done',
+#     total, done, batches, seconds,         <- progression cumulée
+#     last_id,                               <- dernier movie_id ÉCRIT (plage [.., last_id] faite)
+#     last_batch: {docs, seconds, at}, started_at, updated_at, runs }
+#
+# Le point de reprise n'est enregistré qu'après l'acquittement du lot : au pire
+# un lot est refait après un arrêt, sans effet puisque les écritures sont des
+# upserts par _id.
+#
+# Usage : python3 checkpoints.py   -> état et ETA des migrations en cours/terminées
+
+MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+DB_NAMES = ['cineexplorer', 'imdb_project']
+COLLECTION = 'migration_checkpoints'
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def start_job(db, job, total, restart=False):
+    """
+    Démarre ou reprend 'job'. Renvoie le point de reprise : 'last_id' est le
+    movie_id après lequel reprendre, None pour un départ à zéro (l'appelant
+    vide alors la cible) ; 'done' les documents déjà écrits.
+    """
+    checkpoints = db[COLLECTION]
+    current = checkpoints.find_one({"_id": job})
+    if current and current.get('status') == 'running' and not restart:
+        checkpoints.update_one({"_id": job}, {"$set": {"total": total, "updated_at": _now()},
+                                              "$inc": {"runs": 1}})
+        print(f"♻️  Reprise de '{job}' après {current.get('last_id')} "
+              f"({current.get('done', 0)}/{total} déjà faits)")
+        return current
+
+    checkpoint = {
+        "_id": job,
+        "status": "running",
+        "total": total,
+        "done": 0,
+        "batches": 0,
+        "seconds": 0.0,
+        "last_id": None,
+        "last_batch": None,
+        "started_at": _now(),
+        "updated_at": _now(),
+        "runs": 1,
+    }
+    checkpoints.replace_one({"_id": job}, checkpoint, upsert=True)
+    return checkpoint
+
+def record_batch(db, job, last_id, docs, seconds):
+    """Lot écrit (acquitté) : avance le point de reprise."""
+    now = _now()
+    db[COLLECTION].update_one({"_id": job}, {
+        "$set": {"last_id": last_id, "updated_at": now,
+                 "last_batch": {"docs": docs, "seconds": round(seconds, 3), "at": now}},
+        "$inc": {"done": docs, "batches": 1, "seconds": seconds},
+    })
+
+def finish_job(db, job):
+    db[COLLECTION].update_one({"_id": job}, {"$set": {"status": "done", "finished_at": _now(),
+                                                      "updated_at": _now()}})
+
+def describe(checkpoint):
+    """Ligne d'état : progression, débit moyen et temps restant estimé."""
+    total, done = checkpoint.get('total') or 0, checkpoint.get('done') or 0
+    seconds = checkpoint.get('seconds') or 0.0
+    percent = (done / total) * 100 if total else 0.0
+    rate = done / seconds if seconds else 0.0
+    line = f"{checkpoint['_id']:<20} {checkpoint.get('status', '?'):<8} {percent:5.1f}% ({done}/{total})"
+    if rate:
+        line += f"  {rate:,.0f} docs/s"
+    if checkpoint.get('status') == 'running':
+        if rate:
+            line += f"  ETA {(total - done) / rate / 60:.1f} min"
+        line += f"  dernier lot : {checkpoint.get('last_id')}"
+        updated = checkpoint.get('updated_at')
+        if updated:
+            if updated.tzinfo is None:
+                updated = updated.replace(tzinfo=timezone.utc)
+            line += f" (il y a {(_now() - updated).total_seconds():.0f}s)"
+    return line
+
+def print_status(client):
+    found = False
+    for name in DB_NAMES:
+        for checkpoint in client[name][COLLECTION].find().sort("_id", 1):
+            found = True
+            print(f"   [{name}] {describe(checkpoint)}")
+    if not found:
+        print("   Aucune migration enregistrée.")
+
+if __name__ == "__main__":
+    try:
+        client = pymongo.MongoClient(sys.argv[1] if len(sys.argv) > 1 else MONGO_URI,
+                                     serverSelectionTimeoutMS=2000)
+        client.admin.command('ping')
+    except Exception as e:
+        print(f"❌ Erreur connexion Mongo : {e}")
+        sys.exit(1)
+
+    print(f"📋 État des migrations ({time.strftime('%H:%M:%S')}) :")
+    try:
+        print_status(client)
+    finally:
+        client.close()
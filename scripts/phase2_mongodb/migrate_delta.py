@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pymongo
+from pymongo import DeleteOne, ReplaceOne
+
+# Mise à jour incrémentale de cineexplorer.movies depuis SQLite, sans vider la
+# collection : le site continue de servir les fiches pendant la mise à jour.
+#
+#   (défaut)  delta : chaque document porte l'empreinte de son contenu
+#             (content_hash, calculée par iter_documents). Les films SQLite et
+#             les (_id, content_hash) de Mongo, tous deux triés par _id, sont
+#             parcourus ensemble : seuls les films nouveaux ou modifiés sont
+#             réécrits, les films disparus supprimés (bulk_write non ordonné).
+#   --swap    reconstruction complète dans une collection à côté, indexée,
+#             puis renommée sur 'movies' (renameCollection : atomique).
+#   --dry-run compte les opérations du delta sans rien écrire.
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SQLITE_DB = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
+MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+DB_NAME = 'cineexplorer'
+TARGET = 'movies'
+REBUILD = 'movies_rebuild'  # Collection de travail du mode --swap
+
+BATCH_SIZE = 1000           # Opérations par bulk_write / documents par insert_many
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from migrate_enriched import detect_config, iter_documents, throughput
+from bootstrap_indexes import run_bootstrap
+from movies.services.mongo_indexes import ensure_indexes
+
+def stored_hashes(collection):
+    """(_id, content_hash) de tous les documents, triés par _id (index _id : pas de tri en mémoire)."""
+    cursor = collection.find({}, {"content_hash": 1}).sort("_id", 1).batch_size(10000)
+    for doc in cursor:
+        yield doc['_id'], doc.get('content_hash')
+
+def plan_delta(documents, stored, stats):
+    """
+    Opérations nécessaires pour que la collection reflète 'documents'.
+    Les deux flux sont triés par _id (même ordre binaire dans SQLite et Mongo) :
+    merge-join en mémoire bornée.
+    """
+    current = next(stored, None)
+    for doc in documents:
+        # Présents dans Mongo, absents de SQLite : supprimés
+        while current is not None and current[0] < doc['_id']:
+            stats['deleted'] += 1
+            yield DeleteOne({"_id": current[0]})
+            current = next(stored, None)
+
+        if current is not None and current[0] == doc['_id']:
+            same = current[1] == doc['content_hash']
+            current = next(stored, None)
+            if same:
+                stats['unchanged'] += 1
+                continue
+            stats['updated'] += 1
+        else:
+            stats['inserted'] += 1
+        yield ReplaceOne({"_id": doc['_id']}, doc, upsert=True)
+
+    while current is not None:
+        stats['deleted'] += 1
+        yield DeleteOne({"_id": current[0]})
+        current = next(stored, None)
+
+def run_delta(db, conn, config, dry_run=False):
+    collection = db[TARGET]
+    counters = {'rows': 0, 'docs': 0}
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    start_time = time.time()
+    ops, written = [], 0
+
+    documents = iter_documents(conn, config, counters=counters)
+    for op in plan_delta(documents, stored_hashes(collection), stats):
+        ops.append(op)
+        if len(ops) >= BATCH_SIZE:
+            if not dry_run:
+                collection.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+            print(f"⏳ {counters['docs']} films comparés, {written} écritures - "
+                  f"{throughput(counters, time.time() - start_time)}", end='\r')
+    if ops and not dry_run:
+        collection.bulk_write(ops, ordered=False)
+
+    elapsed = time.time() - start_time
+    label = "calculé (--dry-run, rien n'est écrit)" if dry_run else "appliqué"
+    print(f"\n\n📊 Delta {label} en {elapsed:.1f}s ({throughput(counters, elapsed)}) :")
+    print(f"   + {stats['inserted']} nouveaux, ~ {stats['updated']} modifiés, "
+          f"- {stats['deleted']} supprimés, = {stats['unchanged']} inchangés")
+    return stats
+
+def run_swap(db, conn, config):
+    """Reconstruit toute la collection à côté puis la substitue d'un seul coup."""
+    rebuild = db[REBUILD]
+    rebuild.drop()
+    counters = {'rows': 0, 'docs': 0}
+    start_time = time.time()
+    batch = []
+
+    for doc in iter_documents(conn, config, counters=counters):
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            rebuild.insert_many(batch, ordered=False)
+            batch = []
+            print(f"⏳ {counters['docs']} documents - {throughput(counters, time.time() - start_time)}", end='\r')
+    if batch:
+        rebuild.insert_many(batch, ordered=False)
+    print(f"\n📦 {counters['docs']} documents reconstruits en {time.time() - start_time:.1f}s.")
+
+    # Jamais de substitution par une collection incomplète
+    copied = rebuild.count_documents({})
+    if copied != counters['docs'] or not copied:
+        print(f"❌ {copied} documents dans '{REBUILD}' pour {counters['docs']} attendus : "
+              f"'{TARGET}' n'est pas remplacée.")
+        return False
+
+    # Index construits AVANT le renommage : la nouvelle collection sert tout de suite
+    report = ensure_indexes(db, names={TARGET: REBUILD})
+    print(f"🔨 Index de service sur '{REBUILD}' : {len(report['created'])} créé(s).")
+
+    rebuild.rename(TARGET, dropTarget=True)
+    print(f"🔁 '{REBUILD}' renommée en '{TARGET}' (remplacement atomique).")
+    return run_bootstrap(db, check_only=True)
+
+if __name__ == "__main__":
+    # Usage : python3 migrate_delta.py [--swap | --dry-run]
+    try:
+        client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+        client.admin.command('ping')
+        db = client[DB_NAME]
+    except Exception as e:
+        print(f"❌ Erreur connexion Mongo : {e}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(f"file:{SQLITE_DB}?mode=ro", uri=True)
+    ok = True
+    try:
+        config = detect_config(conn.cursor())
+        if '--swap' in sys.argv:
+            print(f"🚀 Reconstruction complète de '{TARGET}' (swap)...")
+            ok = run_swap(db, conn, config)
+        else:
+            print(f"🚀 Mise à jour incrémentale de '{TARGET}'...")
+            run_delta(db, conn, config, dry_run='--dry-run' in sys.argv)
+    except Exception as e:
+        print(f"🚨 Erreur migration : {e}")
+        ok = False
+    finally:
+        conn.close()
+        client.close()
+    sys.exit(0 if ok else 1)
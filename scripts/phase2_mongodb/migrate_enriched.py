@@ -1,8 +1,13 @@
 import sqlite3
+import bson
 import pymongo
+from pymongo import ReplaceOne
 import os
 import sys
 import time
+from hashlib import blake2b
+from itertools import groupby
+from operator import itemgetter
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -10,6 +15,16 @@ SQLITE_DB = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
 MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
 DB_NAME = 'cineexplorer'
 
+BATCH_SIZE = 1000
+CAST_LIMIT = 6              # Acteurs gardés par film
+AKAS_LIMIT = 5              # Titres alternatifs gardés par film
+JOB = 'migrate_enriched'    # Nom du point de reprise (scripts/phase2_mongodb/checkpoints.py)
+
+# Index de service déclarés dans movies/services/mongo_indexes.py
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bootstrap_indexes import run_bootstrap
+from checkpoints import start_job, record_batch, finish_job
+
 def get_column_name(cursor, table, possible_names):
     """Cherche quel nom de colonne est utilisé parmi une liste de possibilités."""
     try:
@@ -56,8 +71,144 @@ def detect_akas_config(cursor):
         'region': col_region
     }
 
-def migrate():
-    print(f"🚀 Démarrage de la MIGRATION ULTIME (Détection automatique)...")
+def detect_config(cursor):
+    """Noms de colonnes (movie_id, person_id, nom) et table AKAS, détectés une seule fois."""
+    return {
+        'mid': get_column_name(cursor, 'movies', ['movie_id', 'tconst']) or 'movie_id',
+        'pid': get_column_name(cursor, 'persons', ['person_id', 'nconst']) or 'person_id',
+        'name': get_column_name(cursor, 'persons', ['primary_name', 'primaryName', 'name']) or 'primary_name',
+        'akas': detect_akas_config(cursor),
+    }
+
+def _range_clause(column, start, end):
+    """Filtre 'start <= movie_id < end' (bornes optionnelles) : (sql, paramètres)."""
+    sql, params = "", []
+    if start is not None:
+        sql += f" AND {column} >= ?"
+        params.append(start)
+    if end is not None:
+        sql += f" AND {column} < ?"
+        params.append(end)
+    return sql, params
+
+def child_queries(config, start=None, end=None):
+    """
+    Une requête par table enfant, renvoyant (movie_id, valeurs...) TRIÉE par
+    movie_id : chaque table est lue une seule fois, dans l'ordre de sa clé primaire.
+    """
+    mid, pid, name = config['mid'], config['pid'], config['name']
+    queries = {
+        'genres': (f"SELECT {mid}, genre FROM genres WHERE 1=1 {{range}} ORDER BY {mid}", mid),
+        # Les premiers rôles dans l'ordre du générique
+        'cast': (f"""SELECT pr.{mid}, p.{name} FROM principals pr JOIN persons p ON pr.{pid} = p.{pid}
+                     WHERE pr.category IN ('actor', 'actress') {{range}} ORDER BY pr.{mid}, pr.ordering""", f"pr.{mid}"),
+        'directors': (f"""SELECT d.{mid}, p.{name} FROM directors d JOIN persons p ON d.{pid} = p.{pid}
+                          WHERE 1=1 {{range}} ORDER BY d.{mid}""", f"d.{mid}"),
+        'writers': (f"""SELECT w.{mid}, p.{name} FROM writers w JOIN persons p ON w.{pid} = p.{pid}
+                        WHERE 1=1 {{range}} ORDER BY w.{mid}""", f"w.{mid}"),
+    }
+    akas = config['akas']
+    if akas:
+        region = akas['region'] or "''"
+        region_clause = f"AND {akas['region']} IS NOT NULL" if akas['region'] else ""
+        queries['titles'] = (f"""SELECT {akas['fk']}, {akas['title']}, {region} FROM {akas['table']}
+                                 WHERE 1=1 {region_clause} {{range}} ORDER BY {akas['fk']}""", akas['fk'])
+
+    built = {}
+    for key, (sql, column) in queries.items():
+        clause, params = _range_clause(column, start, end)
+        built[key] = (sql.replace('{range}', clause), params)
+    return built
+
+def _grouped(cursor, counters):
+    """(movie_id, [lignes sans le movie_id]) film par film, dans l'ordre du curseur."""
+    for movie_id, rows in groupby(cursor, key=itemgetter(0)):
+        rows = [row[1:] for row in rows]
+        counters['rows'] += len(rows)
+        yield movie_id, rows
+
+def content_hash(doc):
+    """Empreinte du contenu d'un document (sans le champ content_hash) : migrate_delta.py
+    la compare à celle stockée dans Mongo pour ne réécrire que les films modifiés."""
+    content = {k: v for k, v in doc.items() if k != 'content_hash'}
+    return blake2b(bson.encode(content), digest_size=16).hexdigest()
+
+def iter_documents(conn, config, start=None, end=None, counters=None):
+    """
+    Documents enrichis des films dont start <= movie_id < end, assemblés en
+    une passe : le curseur des films et ceux des tables enfants (tous triés par
+    movie_id) avancent ensemble (merge-join). Mémoire bornée : seules les
+    lignes du film courant sont gardées.
+    'counters' ({'rows', 'docs'}) est mis à jour au fil de l'eau.
+    """
+    if counters is None:
+        counters = {'rows': 0, 'docs': 0}
+    mid = config['mid']
+    clause, params = _range_clause(f"m.{mid}", start, end)
+    movies = conn.execute(f"""
+        SELECT m.{mid}, m.primary_title, m.start_year, m.runtime_minutes, m.is_adult,
+               r.average_rating, r.num_votes
+        FROM movies m
+        LEFT JOIN ratings r ON m.{mid} = r.{mid}
+        WHERE m.title_type = 'movie' {clause}
+        ORDER BY m.{mid}
+    """, params)
+
+    # Un curseur par table enfant, ouverts en même temps sur la même connexion
+    streams, heads = {}, {}
+    for key, (sql, child_params) in child_queries(config, start, end).items():
+        streams[key] = _grouped(conn.execute(sql, child_params), counters)
+        heads[key] = next(streams[key], None)
+
+    def take(key, movie_id):
+        # Saute les titres qui ne sont pas des films (séries, épisodes...)
+        head = heads[key]
+        while head is not None and head[0] < movie_id:
+            head = next(streams[key], None)
+        if head is not None and head[0] == movie_id:
+            heads[key] = next(streams[key], None)
+            return head[1]
+        heads[key] = head
+        return []
+
+    for movie_id, title, year, runtime, is_adult, average, votes in movies:
+        counters['rows'] += 1
+        votes = votes or 0
+        children = {key: take(key, movie_id) for key in streams}
+
+        # Comme avant : pas de casting ni de titres pour les films sans vote
+        if votes > 0:
+            cast = [{"name": n} for (n,) in children['cast'][:CAST_LIMIT]]
+            directors = [{"name": n} for (n,) in children['directors']]
+            writers = [{"name": n} for (n,) in children['writers']]
+            akas = [{"title": t, "region": r} for t, r in children.get('titles', [])[:AKAS_LIMIT]]
+        else:
+            cast, directors, writers, akas = [], [], [], []
+
+        doc = {
+            "_id": movie_id,
+            "title": title,
+            "year": year,
+            "rating": {"average": average, "votes": votes},
+            "genres": [g for (g,) in children['genres']],
+            "cast": cast,
+            "directors": directors,
+            "writers": writers,
+            "titles": akas, # Stockage des AKAS
+            "is_adult": bool(is_adult),
+            "runtime": runtime
+        }
+        doc['content_hash'] = content_hash(doc)
+        counters['docs'] += 1
+        yield doc
+
+def throughput(counters, elapsed):
+    """Débit lisible : lignes SQLite lues et documents produits par seconde."""
+    elapsed = max(elapsed, 1e-9)
+    return f"{counters['docs'] / elapsed:,.0f} docs/s, {counters['rows'] / elapsed:,.0f} lignes/s"
+
+def migrate(restart=False):
+    print(f"🚀 Démarrage de la MIGRATION ULTIME (lecture en flux, merge-join)...")
     
     # Connexions
     try:
@@ -69,125 +220,59 @@ def migrate():
         return
 
     conn = sqlite3.connect(SQLITE_DB)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    try:
+        config = detect_config(conn.cursor())
+        total = conn.execute("SELECT COUNT(*) FROM movies WHERE title_type = 'movie'").fetchone()[0]
+        print(f"📥 {total} films à migrer...")
 
-    # Détection des noms de colonnes principaux
-    mid_col = get_column_name(cursor, 'movies', ['movie_id', 'tconst']) or 'movie_id'
-    pid_col = get_column_name(cursor, 'persons', ['person_id', 'nconst']) or 'person_id'
-    name_col = get_column_name(cursor, 'persons', ['primary_name', 'primaryName', 'name']) or 'primary_name'
-    
-    # Détection AKAS
-    akas_conf = detect_akas_config(cursor)
-
-    # Lecture films
-    print(f"📥 Lecture du catalogue...")
-    query_movies = f"""
-        SELECT 
-            m.{mid_col} as _id, 
-            m.primary_title as title, 
-            m.start_year as year,
-            m.runtime_minutes as runtime,
-            m.is_adult,
-            r.average_rating,
-            r.num_votes
-        FROM movies m
-        LEFT JOIN ratings r ON m.{mid_col} = r.{mid_col}
-        WHERE m.title_type = 'movie'
-    """
-    cursor.execute(query_movies)
-    movies_rows = cursor.fetchall()
-    total = len(movies_rows)
-    
-    # Nettoyage
-    collection.delete_many({}) 
-    batch = []
-    start_time = time.time()
-
-    for i, row in enumerate(movies_rows):
-        movie_data = dict(row)
-        movie_id = movie_data['_id']
-        votes = movie_data['num_votes'] if movie_data['num_votes'] else 0
-        
-        cast = []
-        directors = []
-        writers = []
-        akas = []
-
-        if votes > 0: 
-            # Casting (Simplifié pour la démo)
-            try:
-                q = f"SELECT p.{name_col} as name FROM principals pr JOIN persons p ON pr.{pid_col}=p.{pid_col} WHERE pr.{mid_col}=? AND pr.category IN ('actor','actress') LIMIT 6"
-                cast = [dict(r) for r in conn.execute(q, (movie_id,)).fetchall()]
-            except: pass
-
-            # Réalisateurs
-            try:
-                q = f"SELECT p.{name_col} as name FROM directors d JOIN persons p ON d.{pid_col}=p.{pid_col} WHERE d.{mid_col}=?"
-                directors = [dict(r) for r in conn.execute(q, (movie_id,)).fetchall()]
-            except: pass
-
-            # Scénaristes
-            try:
-                q = f"SELECT p.{name_col} as name FROM writers w JOIN persons p ON w.{pid_col}=p.{pid_col} WHERE w.{mid_col}=?"
-                writers = [dict(r) for r in conn.execute(q, (movie_id,)).fetchall()]
-            except: pass
-            
-            # Titres Alternatifs (Si config trouvée)
-            if akas_conf:
-                try:
-                    # On construit la requête dynamiquement selon les noms détectés
-                    # On filtre 'region IS NOT NULL' seulement si la colonne région existe
-                    region_clause = f"AND {akas_conf['region']} IS NOT NULL" if akas_conf['region'] else ""
-                    col_region_sel = akas_conf['region'] if akas_conf['region'] else "'' as region"
-                    
-                    q_akas = f"""
-                        SELECT {akas_conf['title']} as title, {col_region_sel} as region
-                        FROM {akas_conf['table']}
-                        WHERE {akas_conf['fk']} = ? {region_clause}
-                        LIMIT 5
-                    """
-                    akas = [dict(r) for r in conn.execute(q_akas, (movie_id,)).fetchall()]
-                except Exception as e: 
-                    # print(e) # Décommenter pour debug
-                    pass
-
-        # Genres
-        try:
-            q_genres = f"SELECT genre FROM genres WHERE {mid_col} = ?"
-            genres = [r['genre'] for r in conn.execute(q_genres, (movie_id,)).fetchall()]
-        except: genres = []
+        # Reprise après un arrêt (point de reprise dans migration_checkpoints),
+        # sinon départ à zéro
+        checkpoint = start_job(db, JOB, total, restart)
+        resume_after, already = checkpoint['last_id'], checkpoint['done']
+        if resume_after is None:
+            collection.delete_many({})
 
-        doc = {
-            "_id": movie_id,
-            "title": movie_data['title'],
-            "year": movie_data['year'],
-            "rating": {"average": movie_data['average_rating'], "votes": votes},
-            "genres": genres,
-            "cast": cast,
-            "directors": directors,
-            "writers": writers,
-            "titles": akas, # Stockage des AKAS
-            "is_adult": bool(movie_data['is_adult']),
-            "runtime": movie_data['runtime']
-        }
-        
-        batch.append(doc)
+        counters = {'rows': 0, 'docs': 0}
+        batch, last_id, written = [], None, 0
+        start_time = batch_time = time.time()
+
+        def flush():
+            # Upserts par _id : refaire un lot déjà écrit ne change rien
+            nonlocal batch, batch_time, written
+            collection.bulk_write(batch, ordered=False)
+            record_batch(db, JOB, last_id, len(batch), time.time() - batch_time)
+            written += len(batch)
+            batch, batch_time = [], time.time()
 
-        if len(batch) >= 500:
-            collection.insert_many(batch)
-            batch = []
-            elapsed = time.time() - start_time
-            percent = ((i+1) / total) * 100
-            print(f"⏳ {percent:.1f}% ({i+1}/{total})", end='\r')
+        for doc in iter_documents(conn, config, start=resume_after, counters=counters):
+            if doc['_id'] == resume_after:
+                continue
+            batch.append(ReplaceOne({"_id": doc['_id']}, doc, upsert=True))
+            last_id = doc['_id']
+            if len(batch) >= BATCH_SIZE:
+                flush()
+                done = already + written
+                percent = (done / total) * 100 if total else 100.0
+                rate = throughput(counters, time.time() - start_time)
+                print(f"⏳ {percent:.1f}% ({done}/{total}) - {rate}", end='\r')
 
-    if batch:
-        collection.insert_many(batch)
+        if batch:
+            flush()
+        finish_job(db, JOB)
 
-    print(f"\n\n🎉 MIGRATION TERMINÉE.")
-    collection.create_index("genres")
-    conn.close()
-    client.close()
+        print(f"\n\n🎉 MIGRATION TERMINÉE : {written} documents écrits, {counters['rows']} lignes lues "
+              f"en {time.time() - start_time:.1f}s ({throughput(counters, time.time() - start_time)}).")
+        # Index des requêtes du site (genres + note pour les similaires, année + note...)
+        run_bootstrap(db)
+    except Exception as e:
+        print(f"\n🚨 Erreur migration : {e}")
+        print("💡 Relancez le script : la migration reprendra au dernier lot écrit.")
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrompu : la migration reprendra au dernier lot écrit.")
+    finally:
+        conn.close()
+        client.close()
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    # Usage : python3 migrate_enriched.py [--restart]   (--restart : ignore le point de reprise)
+    migrate(restart='--restart' in sys.argv)
@@ -1,6 +1,10 @@
 import sqlite3
 import pymongo
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from bson import encode
+from bson.raw_bson import RawBSONDocument
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 import time
 import sys
@@ -13,71 +17,136 @@ MONGO_DB_NAME = 'imdb_project'
 
 # Liste exacte des tables créées en Phase 1
 TABLES_TO_MIGRATE = [
-    'movies', 'persons', 'ratings', 'genres', 
-    'principals', 'directors', 'writers', 
+    'movies', 'persons', 'ratings', 'genres',
+    'principals', 'directors', 'writers',
     'titles', 'characters', 'professions', 'known_for'
 ]
 
+# Copie concurrente : les tables (et les morceaux des grosses tables) sont
+# réparties sur un pool de threads ; chaque thread lit SQLite et insère dans
+# Mongo, les attentes réseau des uns recouvrent l'encodage des autres.
+THREADS = 6
+BATCH_SIZE = 5000
+# Au-delà, une table (principals, titles...) est découpée en plages de rowid
+# copiées en parallèle
+CHUNK_ROWS = 500000
+
+# Index des requêtes de la phase 2 : créés APRÈS le chargement (une construction
+# par index au lieu d'une mise à jour par document inséré)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from queries_mongo import ensure_indexes
+
 def get_sqlite_connection():
-    """Crée une connexion SQLite qui renvoie des dictionnaires"""
+    """Crée une connexion SQLite en lecture seule qui renvoie des tuples (pas de dict par ligne)"""
     if not os.path.exists(SQLITE_DB_PATH):
         print(f"❌ ERREUR CRITIQUE : Base SQLite introuvable ici : {SQLITE_DB_PATH}")
         sys.exit(1)
-        
-    conn = sqlite3.connect(SQLITE_DB_PATH)
-    # Row factory permet d'accéder aux colonnes par leur nom (clé -> valeur)
-    conn.row_factory = sqlite3.Row 
-    return conn
-
-def migrate_table(table_name, db_mongo, cursor_sql):
-    print(f"📦 Migration de la table '{table_name}'...", end=' ', flush=True)
-    start_t = time.time()
-    
-    # 1. Vérifier combien de lignes on a dans SQLite
+
+    # Une connexion par thread : les connexions sqlite3 ne se partagent pas
+    return sqlite3.connect(f"file:{os.path.abspath(SQLITE_DB_PATH)}?mode=ro", uri=True)
+
+def plan_table(cursor_sql, table_name):
+    """
+    Nombre de lignes et plages de rowid [début, fin] à copier pour une table
+    (une seule plage pour les petites tables). None si la table n'existe pas.
+    """
     try:
-        count_sql = cursor_sql.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        low, high, count = cursor_sql.execute(
+            f"SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM {table_name}"
+        ).fetchone()
     except sqlite3.OperationalError:
-        print(f"\n⚠️  Table '{table_name}' introuvable dans SQLite. Ignorée.")
-        return
+        return None
+    if not count:
+        return 0, []
+    chunks = max(1, -(-count // CHUNK_ROWS))
+    step = -(-(high - low + 1) // chunks)
+    return count, [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+def copy_chunk(table_name, collection, low, high):
+    """
+    Copie les lignes low <= rowid <= high. Les lignes restent des tuples ; les
+    noms de colonnes (clés des documents) sont lus une fois par curseur, et
+    chaque document est encodé en BSON ici (RawBSONDocument : le driver envoie
+    les octets tels quels, _id attribué par le serveur).
+    Renvoie (documents insérés, heure de début).
+    """
+    start_t = time.time()
+    conn = get_sqlite_connection()
+    inserted = 0
+    try:
+        cursor = conn.execute(f"SELECT * FROM {table_name} WHERE rowid BETWEEN ? AND ?", (low, high))
+        keys = tuple(column[0] for column in cursor.description)
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            batch = [RawBSONDocument(encode(dict(zip(keys, row)))) for row in rows]
+            try:
+                collection.insert_many(batch, ordered=False)
+                inserted += len(batch)
+            except BulkWriteError as e:
+                # Non ordonné : le reste du lot est inséré malgré les erreurs
+                inserted += e.details.get('nInserted', 0)
+    finally:
+        conn.close()
+    return inserted, start_t
 
-    # 2. Préparer la collection Mongo (On vide avant pour éviter les doublons si on relance)
-    collection = db_mongo[table_name]
-    collection.drop() # Reset complet
-    
-    # 3. Lire et insérer par batch (Performant et économe en RAM)
-    cursor_sql.execute(f"SELECT * FROM {table_name}")
-    
-    batch_size = 5000
-    total_inserted = 0
-    
-    while True:
-        rows = cursor_sql.fetchmany(batch_size)
-        if not rows:
-            break
-            
-        # Conversion row SQLite -> Dict Python
-        documents = [dict(row) for row in rows]
-        
-        # Insertion massive dans MongoDB
-        if documents:
-            collection.insert_many(documents)
-            total_inserted += len(documents)
-            
-    duration = time.time() - start_t
-    
-    # 4. Vérification d'intégrité simple
-    if total_inserted == count_sql:
-        print(f"✅ OK ({total_inserted} docs en {duration:.2f}s)")
-    else:
-        print(f"⚠️  ATTENTION : {total_inserted} insérés vs {count_sql} source")
+def migrate_tables(db_mongo, cursor_sql, tables, threads=THREADS):
+    """Copie les tables en parallèle et affiche le résultat de chacune dès qu'elle est finie."""
+    plans = {}
+    for table_name in tables:
+        plan = plan_table(cursor_sql, table_name)
+        if plan is None:
+            print(f"⚠️  Table '{table_name}' introuvable dans SQLite. Ignorée.")
+            continue
+        plans[table_name] = plan
+        # On vide avant pour éviter les doublons si on relance
+        db_mongo[table_name].drop()
+
+    # Les plus gros morceaux d'abord : le pool finit plus tôt
+    tasks = sorted(
+        ((table_name, low, high) for table_name, (_, ranges) in plans.items() for low, high in ranges),
+        key=lambda task: task[2] - task[1], reverse=True,
+    )
+    progress = {t: {'left': len(plans[t][1]), 'inserted': 0, 'start': None} for t in plans}
+    for table_name, (count_sql, ranges) in plans.items():
+        if not ranges:
+            print(f"📦 {table_name:<12} ✅ OK (0 docs, table vide)")
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = {
+            pool.submit(copy_chunk, table_name, db_mongo[table_name], low, high): table_name
+            for table_name, low, high in tasks
+        }
+        for future in as_completed(futures):
+            table_name = futures[future]
+            state = progress[table_name]
+            try:
+                inserted, start_t = future.result()
+                state['inserted'] += inserted
+                state['start'] = min(start_t, state['start'] or start_t)
+            except Exception as e:
+                print(f"🚨 Erreur copie '{table_name}' : {e}")
+            state['left'] -= 1
+            if state['left']:
+                continue
+
+            # Vérification d'intégrité simple
+            count_sql = plans[table_name][0]
+            duration = time.time() - (state['start'] or time.time())
+            if state['inserted'] == count_sql:
+                print(f"📦 {table_name:<12} ✅ OK ({state['inserted']} docs en {duration:.2f}s, "
+                      f"{state['inserted'] / max(duration, 1e-9):,.0f} docs/s)")
+            else:
+                print(f"📦 {table_name:<12} ⚠️  ATTENTION : {state['inserted']} insérés vs {count_sql} source")
 
 def run_migration():
-    print(f"--- DÉBUT MIGRATION SQLITE -> MONGO (Base: {MONGO_DB_NAME}) ---")
+    print(f"--- DÉBUT MIGRATION SQLITE -> MONGO (Base: {MONGO_DB_NAME}, {THREADS} threads) ---")
     start_global = time.time()
-    
+
     # Connexions
     try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000, maxPoolSize=THREADS + 2)
         client.server_info() # Déclenche une erreur si pas connecté
         db_mongo = client[MONGO_DB_NAME]
     except Exception as e:
@@ -87,16 +156,19 @@ def run_migration():
 
     conn_sql = get_sqlite_connection()
     cursor_sql = conn_sql.cursor()
-    
-    # Boucle sur les tables
-    for table in TABLES_TO_MIGRATE:
-        migrate_table(table, db_mongo, cursor_sql)
-        
-    conn_sql.close()
-    client.close()
-    
+
+    try:
+        migrate_tables(db_mongo, cursor_sql, TABLES_TO_MIGRATE)
+        print(f"⏱️ Copie terminée en {time.time() - start_global:.2f}s")
+        ensure_indexes(db_mongo)
+    except Exception as e:
+        print(f"🚨 Erreur migration : {e}")
+    finally:
+        conn_sql.close()
+        client.close()
+
     print(f"\n🎉 MIGRATION TERMINÉE en {time.time() - start_global:.2f}s")
     print(f"👉 Vérifiez vos données avec MongoDB Compass ou le shell.")
 
 if __name__ == "__main__":
-    run_migration()
\ No newline at end of file
+    run_migration()
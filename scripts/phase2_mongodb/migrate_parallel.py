@@ -0,0 +1,302 @@
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import bson
+import pymongo
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+# Migration parallèle SQLite -> MongoDB (mêmes documents que migrate_enriched.py)
+#
+#   process 1..P : une plage de movie_id chacun -> iter_documents (merge-join)
+#                  -> lots encodés en BSON une fois pour toutes
+#        |  file bornée (QUEUE_BATCHES lots) : si Mongo ralentit, les
+#        v  process attendent au lieu de remplir la RAM
+#   threads 1..W : insert_many(ordered=False) des lots, w=1 sans journal,
+#                  nouveaux essais espacés si une écriture est refusée
+#
+# Chaque plage se termine par un message 'done' (avec son erreur éventuelle) :
+# la migration n'est réussie que si toutes les plages l'ont envoyé sans erreur.
+# À la fin : une écriture w='majority' (barrière : toutes les écritures
+# précédentes sont alors répliquées), puis les index de service.
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SQLITE_DB = os.path.join(BASE_DIR, 'data', 'cineexplorer.db')
+MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+DB_NAME = 'cineexplorer'
+TARGET = 'movies'
+RUNS = 'migrations'         # Historique des migrations (une ligne par exécution)
+
+PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+SHARDS_PER_PROCESS = 4      # Plages plus petites que les process : équilibrage
+WRITERS = 4                 # Threads d'insertion
+BATCH_SIZE = 1000
+QUEUE_BATCHES = 16          # Lots en attente d'insertion, au plus
+DRAIN_TIMEOUT = 600         # Secondes d'attente des derniers 'done' une fois les process finis
+WRITE_RETRIES = 5           # Nouveaux essais d'un lot refusé (bascule du replica set...)
+RETRY_DELAY = 0.5           # Secondes avant le 1er nouvel essai, doublées ensuite
+
+# Pendant le chargement : acquittement du primaire seul, sans attendre le journal
+BULK_WRITE_CONCERN = WriteConcern(w=1, j=False)
+# Ensuite : retour à la majorité
+FINAL_WRITE_CONCERN = WriteConcern(w='majority', wtimeout=120000)
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from migrate_enriched import detect_config, iter_documents, throughput
+from bootstrap_indexes import run_bootstrap
+
+def shard_bounds(conn, shards):
+    """
+    Découpe les movie_id des films en 'shards' plages [début, fin) de tailles
+    égales. Les ids sont parcourus dans l'ordre de la clé primaire ; seules
+    les bornes sont gardées en mémoire.
+    """
+    total = conn.execute("SELECT COUNT(*) FROM movies WHERE title_type = 'movie'").fetchone()[0]
+    step = max(1, -(-total // shards))
+    bounds = [None]
+    cursor = conn.execute("SELECT movie_id FROM movies WHERE title_type = 'movie' ORDER BY movie_id")
+    for i, (movie_id,) in enumerate(cursor):
+        if i and i % step == 0:
+            bounds.append(movie_id)
+    bounds.append(None)
+    return total, list(zip(bounds, bounds[1:]))
+
+# --- CÔTÉ PROCESS (construction des documents) ---
+
+_queue = None
+
+def _init_worker(queue):
+    global _queue
+    _queue = queue
+
+def build_shard(task):
+    """
+    Construit les documents d'une plage et pousse des lots BSON dans la file,
+    puis toujours un message ('done', plage, compteurs, durée, erreur ou None).
+    """
+    shard, start, end, config = task
+    counters = {'rows': 0, 'docs': 0}
+    start_t = time.time()
+    error = None
+    try:
+        conn = sqlite3.connect(f"file:{SQLITE_DB}?mode=ro", uri=True)
+        try:
+            batch, rows_sent = [], 0
+            for doc in iter_documents(conn, config, start, end, counters):
+                batch.append(bson.encode(doc))
+                if len(batch) >= BATCH_SIZE:
+                    _queue.put(('batch', shard, batch, counters['rows'] - rows_sent))
+                    batch, rows_sent = [], counters['rows']
+            if batch:
+                _queue.put(('batch', shard, batch, counters['rows'] - rows_sent))
+        finally:
+            conn.close()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    _queue.put(('done', shard, counters, time.time() - start_t, error))
+    return shard
+
+# --- CÔTÉ PROCESS PRINCIPAL (écriture) ---
+
+def insert_batch(collection, batch):
+    """
+    Insère un lot déjà encodé, avec nouveaux essais espacés si l'écriture échoue
+    (élection d'un primaire, coupure réseau). Renvoie (insérés, erreurs) ;
+    relance la PyMongoError si tous les essais échouent.
+    """
+    docs = [RawBSONDocument(raw) for raw in batch]
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            collection.insert_many(docs, ordered=False)
+            return len(docs), 0
+        except BulkWriteError as e:
+            # ordered=False : le reste du lot est quand même inséré. Après une
+            # coupure, une partie du lot a pu être écrite : ses doublons d'_id
+            # sont des documents déjà là, pas des erreurs
+            errors = e.details.get('writeErrors', [])
+            duplicates = sum(1 for err in errors if err.get('code') == 11000) if attempt else 0
+            return e.details.get('nInserted', 0) + duplicates, len(errors) - duplicates
+        except PyMongoError as e:
+            if attempt == WRITE_RETRIES:
+                raise
+            delay = RETRY_DELAY * 2 ** attempt
+            print(f"\n⚠️  Écriture refusée ({e}), nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+
+def writer(collection, queue, stats, lock):
+    """Vide la file jusqu'à la sentinelle None. Ne s'arrête jamais sur une erreur :
+    une file non vidée bloquerait les process de construction.
+    'lock' est une Condition : chaque 'done' reçu réveille le thread principal."""
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        kind, shard = item[0], item[1]
+        if kind == 'done':
+            with lock:
+                s = stats[shard]
+                s['build_s'] = item[3]
+                s['docs_built'] = item[2]['docs']
+                s['build_error'] = item[4]
+                s['done'] = True
+                lock.notify_all()
+            continue
+
+        batch, rows = item[2], item[3]
+        start_t = time.time()
+        lost = 0
+        try:
+            inserted, errors = insert_batch(collection, batch)
+        except PyMongoError as e:
+            inserted, errors, lost = 0, len(batch), 1
+            print(f"\n🚨 Lot perdu (plage {shard}) après {WRITE_RETRIES} nouveaux essais : {e}")
+        with lock:
+            s = stats[shard]
+            s['docs'] += inserted
+            s['rows'] += rows
+            s['errors'] += errors
+            s['lost'] += lost
+            s['write_s'] += time.time() - start_t
+
+def print_report(stats, elapsed):
+    print(f"\n📊 Débit par plage :")
+    print(f"   {'#':>3}  {'plage':<25} {'docs':>8} {'construction':>14} {'écriture':>10} {'erreurs':>8}")
+    for shard, s in sorted(stats.items()):
+        start, end = s['range']
+        label = f"{start or '…'} → {end or '…'}"
+        build = f"{s['docs_built'] / s['build_s']:,.0f} docs/s" if s.get('build_s') else "-"
+        print(f"   {shard:>3}  {label:<25} {s['docs']:>8} {build:>14} {s['write_s']:>9.1f}s {s['errors']:>8}")
+    totals = {'docs': sum(s['docs'] for s in stats.values()), 'rows': sum(s['rows'] for s in stats.values())}
+    print(f"   Total : {totals['docs']} documents en {elapsed:.1f}s ({throughput(totals, elapsed)})")
+    return totals
+
+def migrate_parallel(uri=MONGO_URI, processes=PROCESSES):
+    print(f"🚀 Migration parallèle : {processes} process, {WRITERS} threads d'écriture...")
+    try:
+        client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=2000, maxPoolSize=WRITERS + 2)
+        client.admin.command('ping')
+        db = client[DB_NAME]
+    except Exception as e:
+        print(f"❌ Erreur connexion Mongo : {e}")
+        return False
+
+    conn = sqlite3.connect(f"file:{SQLITE_DB}?mode=ro", uri=True)
+    try:
+        config = detect_config(conn.cursor())
+        total, ranges = shard_bounds(conn, processes * SHARDS_PER_PROCESS)
+    finally:
+        conn.close()
+    print(f"📋 {total} films, {len(ranges)} plages de movie_id.")
+
+    # Chargement dans une collection vide, index construits APRÈS (plus rapide)
+    db[TARGET].drop()
+    collection = db.get_collection(TARGET, write_concern=BULK_WRITE_CONCERN)
+
+    stats = {i: {'range': r, 'docs': 0, 'rows': 0, 'errors': 0, 'lost': 0, 'write_s': 0.0, 'done': False}
+             for i, r in enumerate(ranges)}
+    lock = threading.Condition()
+    queue = multiprocessing.Queue(maxsize=QUEUE_BATCHES)
+    writers = [threading.Thread(target=writer, args=(collection, queue, stats, lock), daemon=True)
+               for _ in range(WRITERS)]
+    for t in writers:
+        t.start()
+
+    start_time = time.time()
+    tasks = [(i, start, end, config) for i, (start, end) in enumerate(ranges)]
+    built = False
+    try:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(queue,)) as pool:
+            result = pool.map_async(build_shard, tasks, chunksize=1)
+            while not result.ready():
+                result.wait(1)
+                with lock:
+                    done = {'docs': sum(s['docs'] for s in stats.values()),
+                            'rows': sum(s['rows'] for s in stats.values())}
+                percent = (done['docs'] / total) * 100 if total else 100.0
+                print(f"⏳ {percent:.1f}% ({done['docs']}/{total}) - "
+                      f"{throughput(done, time.time() - start_time)}", end='\r')
+            result.get()  # Relance l'exception d'un process
+            # Sortie du 'with' = terminate() : on laisse d'abord chaque process
+            # finir et vider sa file (thread d'envoi de multiprocessing.Queue)
+            pool.close()
+            pool.join()
+        built = True
+
+        # Tous les lots sont dans la file : on attend que les writers aient
+        # reçu le 'done' de chaque plage, donc tout ce qui le précédait
+        with lock:
+            lock.wait_for(lambda: all(s['done'] for s in stats.values()), timeout=DRAIN_TIMEOUT)
+    except Exception as e:
+        print(f"\n🚨 Erreur migration : {e}")
+    finally:
+        for _ in writers:
+            queue.put(None)
+        for t in writers:
+            t.join()
+
+    elapsed = time.time() - start_time
+    failures = []
+    for shard, s in sorted(stats.items()):
+        if s.get('build_error'):
+            failures.append(f"plage {shard} : {s['build_error']}")
+        elif not s['done']:
+            failures.append(f"plage {shard} : pas de fin reçue (process interrompu ?)")
+        if s['lost']:
+            failures.append(f"plage {shard} : {s['lost']} lot(s) non écrit(s)")
+        elif s['errors']:
+            failures.append(f"plage {shard} : {s['errors']} document(s) refusé(s)")
+    if not built:
+        failures.append("construction interrompue")
+
+    ok = False
+    try:
+        totals = print_report(stats, elapsed)
+
+        # Barrière : un acquittement majoritaire garantit aussi la réplication
+        # de toutes les écritures w=1 qui l'ont précédée (oplog ordonné)
+        print("⏳ Attente de la réplication (w=majority)...", end=' ', flush=True)
+        barrier_t = time.time()
+        db.get_collection(RUNS, write_concern=FINAL_WRITE_CONCERN).insert_one({
+            "script": "migrate_parallel",
+            "finished_at": datetime.now(timezone.utc),
+            "docs": totals['docs'],
+            "rows": totals['rows'],
+            "errors": sum(s['errors'] for s in stats.values()),
+            "seconds": round(elapsed, 1),
+            "processes": processes,
+            "shards": len(ranges),
+            "status": "failed" if failures else "done",
+            "failures": failures,
+        })
+        print(f"OK ({time.time() - barrier_t:.1f}s)")
+
+        if failures:
+            # Collection incomplète : ni index de service ni annonce de fin
+            print(f"\n❌ MIGRATION ÉCHOUÉE ({len(failures)} erreur(s)) :")
+            for failure in failures:
+                print(f"   - {failure}")
+            print("💡 Relancez le script (la collection est vidée au départ).")
+        else:
+            run_bootstrap(db)
+            print(f"\n🎉 MIGRATION TERMINÉE en {time.time() - start_time:.1f}s.")
+            ok = True
+    except Exception as e:
+        print(f"🚨 Erreur fin de migration : {e}")
+    finally:
+        client.close()
+    return ok
+
+if __name__ == "__main__":
+    # Usage : python3 migrate_parallel.py [nb_process] [uri]
+    ok = migrate_parallel(
+        sys.argv[2] if len(sys.argv) > 2 else MONGO_URI,
+        int(sys.argv[1]) if len(sys.argv) > 1 else PROCESSES,
+    )
+    sys.exit(0 if ok else 1)
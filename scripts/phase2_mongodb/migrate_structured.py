@@ -1,5 +1,10 @@
 import pymongo
-from pymongo import MongoClient, UpdateOne
+from pymongo import MongoClient, ReplaceOne
+from bisect import bisect_right
+import multiprocessing
+import os
+import queue
+import resource
 import time
 import sys
 
@@ -7,162 +12,359 @@ MONGO_DB_NAME = 'imdb_project'
 SOURCE_COLLECTION = 'movies'
 TARGET_COLLECTION = 'movies_complete'
 BATCH_SIZE = 1000 # Nombre de films à traiter par lot
+JOB = 'migrate_structured' # Nom du point de reprise (checkpoints.py)
+
+# Deux façons de joindre les collections plates (migrate_flat.py) :
+# - 'lookup'   : pipeline $lookup par lot, les jointures tournent dans MongoDB
+#                (sans index sur movie_id/person_id des collections plates,
+#                chaque lot peut parcourir ces collections en entier)
+# - 'hashjoin' : chaque collection plate est lue UNE fois dans des tables de
+#                hachage compactes (tuples), les documents sont assemblés ici
+MODES = ('lookup', 'hashjoin')
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from checkpoints import start_job, record_batch, finish_job
 
 def get_db():
     client = MongoClient('mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0')
     return client[MONGO_DB_NAME]
 
-def migrate_structured():
+def peak_rss_mb():
+    """Pic de mémoire résidente du process (ru_maxrss : Ko sous Linux, octets sous macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# --- MODE 'lookup' : JOINTURES CÔTÉ SERVEUR ---
+
+def lookup_pipeline(batch_ids):
+    # --- LE CŒUR DU REACTEUR : LE PIPELINE D'AGRÉGATION ---
+    pipeline = [
+        # A. Filtrer le lot actuel
+        { "$match": { "movie_id": { "$in": batch_ids } } },
+
+        # B. Joindre les Notes (Rating) -> Objet simple
+        { "$lookup": {
+            "from": "ratings",
+            "localField": "movie_id",
+            "foreignField": "movie_id",
+            "as": "r"
+        }},
+        { "$unwind": { "path": "$r", "preserveNullAndEmptyArrays": True } },
+
+        # C. Joindre les Genres -> Tableau de strings
+        { "$lookup": {
+            "from": "genres",
+            "localField": "movie_id",
+            "foreignField": "movie_id",
+            "as": "g"
+        }},
+        
+        # D. Joindre les Titres Alternatifs -> Tableau d'objets
+        { "$lookup": {
+            "from": "titles",
+            "localField": "movie_id",
+            "foreignField": "movie_id",
+            "as": "titles_raw"
+        }},
+
+        # E. Joindre le Casting/Staff (Principals) + Noms (Persons)
+        # C'est une jointure complexe (Lookup dans Lookup)
+        { "$lookup": {
+            "from": "principals",
+            "let": { "mid": "$movie_id" },
+            "pipeline": [
+                { "$match": { "$expr": { "$eq": ["$movie_id", "$$mid"] } } },
+                # Pour chaque membre du staff, on va chercher son nom
+                { "$lookup": {
+                    "from": "persons",
+                    "localField": "person_id",
+                    "foreignField": "person_id",
+                    "as": "p"
+                }},
+                { "$addFields": { 
+                    "name": { "$arrayElemAt": ["$p.primary_name", 0] } 
+                }},
+                { "$project": { "_id": 0, "p": 0, "movie_id": 0 } } # Nettoyage
+            ],
+            "as": "crew"
+        }},
+
+        # F. PROJECTION FINALE (Structure du document)
+        { "$project": {
+            "_id": "$movie_id", # L'ID du film devient la clé primaire Mongo
+            "title": "$primary_title",
+            "original_title": "$original_title",
+            "year": "$start_year",
+            "runtime": "$runtime_minutes",
+            "is_adult": "$is_adult",
+            
+            # Transformation des genres [{genre: "A"}, {genre: "B"}] -> ["A", "B"]
+            "genres": "$g.genre",
+            
+            # Objet Rating imbriqué
+            "rating": { 
+                "average": "$r.average_rating", 
+                "votes": "$r.num_votes" 
+            },
+            
+            # Nettoyage des titres
+            "titles": {
+                "$map": {
+                    "input": "$titles_raw",
+                    "as": "t",
+                    "in": { "title": "$$t.title", "region": "$$t.region", "lang": "$$t.language" }
+                }
+            },
+
+            # Séparation du Crew en 3 tableaux distincts
+            "directors": {
+                "$filter": { 
+                    "input": "$crew", 
+                    "as": "c", 
+                    "cond": { "$in": ["$$c.category", ["director"]] } 
+                }
+            },
+            "writers": {
+                "$filter": { 
+                    "input": "$crew", 
+                    "as": "c", 
+                    "cond": { "$in": ["$$c.category", ["writer"]] } 
+                }
+            },
+            "cast": {
+                "$filter": { 
+                    "input": "$crew", 
+                    "as": "c", 
+                    "cond": { "$in": ["$$c.category", ["actor", "actress"]] } 
+                }
+            }
+        }}
+    ]
+
+    return pipeline
+
+def build_lookup(db, batch_ids):
+    return list(db[SOURCE_COLLECTION].aggregate(lookup_pipeline(batch_ids)))
+
+# --- MODE 'hashjoin' : JOINTURES CÔTÉ CLIENT ---
+
+# Champ absent du document source (différent de null) : omis, comme dans $project
+_MISSING = object()
+
+# (champ source, champ du document final)
+MOVIE_FIELDS = (('primary_title', 'title'), ('original_title', 'original_title'),
+                ('start_year', 'year'), ('runtime_minutes', 'runtime'), ('is_adult', 'is_adult'))
+RATING_FIELDS = (('average_rating', 'average'), ('num_votes', 'votes'))
+TITLE_FIELDS = (('title', 'title'), ('region', 'region'), ('language', 'lang'))
+CREW_FIELDS = (('person_id', 'person_id'), ('ordering', 'ordering'), ('category', 'category'), ('job', 'job'))
+
+def _compact(doc, fields):
+    # Un tuple par ligne plutôt qu'un dict : plusieurs fois moins de mémoire
+    return tuple(sys.intern(v) if type(v) is str and len(v) < 32 else v
+                 for v in (doc.get(source, _MISSING) for source, _ in fields))
+
+def _expand(values, fields):
+    return {target: v for (_, target), v in zip(fields, values) if v is not _MISSING}
+
+def _scan(db, name, fields, query=None):
+    projection = {source: 1 for source in fields}
+    projection['_id'] = 0
+    return db[name].find(query or {}, projection, batch_size=10000)
+
+def load_hash_maps(db, movie_ids):
+    """
+    Lit chaque collection plate une seule fois et garde, par movie_id (ou
+    person_id), les lignes des films à migrer sous forme de tuples.
+    """
+    wanted = set(movie_ids)
+    maps = {'movies': {}, 'ratings': {}, 'genres': {}, 'titles': {}, 'crew': {}, 'names': {}}
+    steps = [
+        ('movies', [f for f, _ in MOVIE_FIELDS], MOVIE_FIELDS, False),
+        ('ratings', [f for f, _ in RATING_FIELDS], RATING_FIELDS, False),
+        ('titles', [f for f, _ in TITLE_FIELDS], TITLE_FIELDS, True),
+        ('principals', [f for f, _ in CREW_FIELDS], CREW_FIELDS, True),
+    ]
+    for name, fields, mapping, many in steps:
+        start_t = time.time()
+        target = maps['crew' if name == 'principals' else name]
+        for doc in _scan(db, name, fields + ['movie_id']):
+            movie_id = doc.get('movie_id')
+            if movie_id not in wanted:
+                continue
+            row = _compact(doc, mapping)
+            if many:
+                target.setdefault(movie_id, []).append(row)
+            else:
+                # $unwind d'un seul élément : on garde le premier
+                target.setdefault(movie_id, row)
+        print(f"   📥 {name:<10} {len(target)} films ({time.time() - start_t:.1f}s)")
+
+    start_t = time.time()
+    for doc in _scan(db, 'genres', ['movie_id', 'genre']):
+        if doc.get('movie_id') in wanted and 'genre' in doc:
+            maps['genres'].setdefault(doc['movie_id'], []).append(sys.intern(doc['genre']))
+    print(f"   📥 {'genres':<10} {len(maps['genres'])} films ({time.time() - start_t:.1f}s)")
+
+    # Noms : uniquement les personnes présentes dans le casting/staff retenu
+    start_t = time.time()
+    people = {row[0] for rows in maps['crew'].values() for row in rows}
+    for doc in _scan(db, 'persons', ['person_id', 'primary_name']):
+        if doc.get('person_id') in people:
+            maps['names'].setdefault(doc['person_id'], doc.get('primary_name', _MISSING))
+    print(f"   📥 {'persons':<10} {len(maps['names'])} personnes ({time.time() - start_t:.1f}s)")
+    return maps
+
+def build_hashjoin(maps, batch_ids):
+    """Mêmes documents que lookup_pipeline, assemblés depuis les tables de hachage."""
+    docs = []
+    for movie_id in batch_ids:
+        movie = maps['movies'].get(movie_id)
+        if movie is None:
+            continue
+        crew = []
+        for row in maps['crew'].get(movie_id, ()):
+            member = _expand(row, CREW_FIELDS)
+            name = maps['names'].get(row[0], _MISSING)
+            if name is not _MISSING:
+                member['name'] = name
+            crew.append(member)
+        rating = maps['ratings'].get(movie_id)
+
+        doc = {"_id": movie_id}
+        doc.update(_expand(movie, MOVIE_FIELDS))
+        doc["genres"] = list(maps['genres'].get(movie_id, ()))
+        doc["rating"] = _expand(rating, RATING_FIELDS) if rating else {}
+        doc["titles"] = [_expand(row, TITLE_FIELDS) for row in maps['titles'].get(movie_id, ())]
+        doc["directors"] = [c for c in crew if c.get('category') == 'director']
+        doc["writers"] = [c for c in crew if c.get('category') == 'writer']
+        doc["cast"] = [c for c in crew if c.get('category') in ('actor', 'actress')]
+        docs.append(doc)
+    return docs
+
+# --- MIGRATION ---
+
+def migrate_structured(restart=False, mode='lookup', target=TARGET_COLLECTION, build_indexes=True):
     db = get_db()
+    job = JOB if target == TARGET_COLLECTION else f"{JOB}:{target}"
     
-    print(f"🚀 Démarrage de la structuration des données...")
-    print(f"   Source: {SOURCE_COLLECTION} -> Cible: {TARGET_COLLECTION}")
+    print(f"🚀 Démarrage de la structuration des données (mode {mode})...")
+    print(f"   Source: {SOURCE_COLLECTION} -> Cible: {target}")
 
-    # 1. Nettoyage et Indexation préalable
-    if TARGET_COLLECTION in db.list_collection_names():
-        print("   ⚠️  Suppression de la collection cible existante...")
-        db[TARGET_COLLECTION].drop()
-    
-    # 2. Récupération des IDs de films
+    start_time = time.time()
+
+    # 1. Récupération des IDs de films, triés : les lots se suivent par movie_id
     cursor = db[SOURCE_COLLECTION].find({"start_year": {"$ne": None}}, {"movie_id": 1})
-    all_ids = [doc['movie_id'] for doc in cursor]
+    all_ids = sorted(doc['movie_id'] for doc in cursor)
     total_movies = len(all_ids)
     print(f"   📋 {total_movies} films à traiter.")
 
-    start_time = time.time()
-    processed = 0
+    # 2. Reprise au lot suivant le dernier écrit, ou nettoyage pour un départ à zéro
+    checkpoint = start_job(db, job, total_movies, restart)
+    processed = checkpoint['done']
+    if checkpoint['last_id'] is None:
+        if target in db.list_collection_names():
+            print("   ⚠️  Suppression de la collection cible existante...")
+            db[target].drop()
+    else:
+        all_ids = all_ids[bisect_right(all_ids, checkpoint['last_id']):]
+
+    if mode == 'hashjoin':
+        maps = load_hash_maps(db, all_ids)
+        build = lambda batch_ids: build_hashjoin(maps, batch_ids)
+    else:
+        build = lambda batch_ids: build_lookup(db, batch_ids)
 
     # 3. Traitement par lot (Batch)
-    for i in range(0, total_movies, BATCH_SIZE):
+    for i in range(0, len(all_ids), BATCH_SIZE):
+        batch_time = time.time()
         batch_ids = all_ids[i : i + BATCH_SIZE]
+        docs = build(batch_ids)
         
-        # --- LE CŒUR DU REACTEUR : LE PIPELINE D'AGRÉGATION ---
-        pipeline = [
-            # A. Filtrer le lot actuel
-            { "$match": { "movie_id": { "$in": batch_ids } } },
-
-            # B. Joindre les Notes (Rating) -> Objet simple
-            { "$lookup": {
-                "from": "ratings",
-                "localField": "movie_id",
-                "foreignField": "movie_id",
-                "as": "r"
-            }},
-            { "$unwind": { "path": "$r", "preserveNullAndEmptyArrays": True } },
-
-            # C. Joindre les Genres -> Tableau de strings
-            { "$lookup": {
-                "from": "genres",
-                "localField": "movie_id",
-                "foreignField": "movie_id",
-                "as": "g"
-            }},
-            
-            # D. Joindre les Titres Alternatifs -> Tableau d'objets
-            { "$lookup": {
-                "from": "titles",
-                "localField": "movie_id",
-                "foreignField": "movie_id",
-                "as": "titles_raw"
-            }},
-
-            # E. Joindre le Casting/Staff (Principals) + Noms (Persons)
-            # C'est une jointure complexe (Lookup dans Lookup)
-            { "$lookup": {
-                "from": "principals",
-                "let": { "mid": "$movie_id" },
-                "pipeline": [
-                    { "$match": { "$expr": { "$eq": ["$movie_id", "$$mid"] } } },
-                    # Pour chaque membre du staff, on va chercher son nom
-                    { "$lookup": {
-                        "from": "persons",
-                        "localField": "person_id",
-                        "foreignField": "person_id",
-                        "as": "p"
-                    }},
-                    { "$addFields": { 
-                        "name": { "$arrayElemAt": ["$p.primary_name", 0] } 
-                    }},
-                    { "$project": { "_id": 0, "p": 0, "movie_id": 0 } } # Nettoyage
-                ],
-                "as": "crew"
-            }},
-
-            # F. PROJECTION FINALE (Structure du document)
-            { "$project": {
-                "_id": "$movie_id", # L'ID du film devient la clé primaire Mongo
-                "title": "$primary_title",
-                "original_title": "$original_title",
-                "year": "$start_year",
-                "runtime": "$runtime_minutes",
-                "is_adult": "$is_adult",
-                
-                # Transformation des genres [{genre: "A"}, {genre: "B"}] -> ["A", "B"]
-                "genres": "$g.genre",
-                
-                # Objet Rating imbriqué
-                "rating": { 
-                    "average": "$r.average_rating", 
-                    "votes": "$r.num_votes" 
-                },
-                
-                # Nettoyage des titres
-                "titles": {
-                    "$map": {
-                        "input": "$titles_raw",
-                        "as": "t",
-                        "in": { "title": "$$t.title", "region": "$$t.region", "lang": "$$t.language" }
-                    }
-                },
-
-                # Séparation du Crew en 3 tableaux distincts
-                "directors": {
-                    "$filter": { 
-                        "input": "$crew", 
-                        "as": "c", 
-                        "cond": { "$in": ["$$c.category", ["director"]] } 
-                    }
-                },
-                "writers": {
-                    "$filter": { 
-                        "input": "$crew", 
-                        "as": "c", 
-                        "cond": { "$in": ["$$c.category", ["writer"]] } 
-                    }
-                },
-                "cast": {
-                    "$filter": { 
-                        "input": "$crew", 
-                        "as": "c", 
-                        "cond": { "$in": ["$$c.category", ["actor", "actress"]] } 
-                    }
-                }
-            }}
-        ]
-
-        # Exécution du pipeline
-        docs = list(db[SOURCE_COLLECTION].aggregate(pipeline))
-        
-        # Insertion dans la nouvelle collection
+        # Écriture dans la nouvelle collection : upserts par _id, un lot refait
+        # après une reprise ne crée pas de doublon
         if docs:
-            db[TARGET_COLLECTION].insert_many(docs)
+            db[target].bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False
+            )
+        record_batch(db, job, batch_ids[-1], len(docs), time.time() - batch_time)
         
         processed += len(docs)
         print(f"   ... {processed}/{total_movies} films migrés ({processed/total_movies:.1%})", end='\r')
 
     # 4. Indexation finale
-    print("\n🔨 Création des index sur 'movies_complete'...")
-    db[TARGET_COLLECTION].create_index("year")
-    db[TARGET_COLLECTION].create_index("genres")
-    db[TARGET_COLLECTION].create_index("rating.votes")
-    db[TARGET_COLLECTION].create_index("rating.average")
-    # Index multikey pour chercher dans les sous-documents
-    db[TARGET_COLLECTION].create_index("cast.person_id") 
-    db[TARGET_COLLECTION].create_index("cast.name")
+    if build_indexes:
+        print(f"\n🔨 Création des index sur '{target}'...")
+        db[target].create_index("year")
+        db[target].create_index("genres")
+        db[target].create_index("rating.votes")
+        db[target].create_index("rating.average")
+        # Index multikey pour chercher dans les sous-documents
+        db[target].create_index("cast.person_id") 
+        db[target].create_index("cast.name")
 
+    finish_job(db, job)
     duration = time.time() - start_time
-    print(f"\n🎉 SUCCÈS ! Collection '{TARGET_COLLECTION}' prête.")
+    print(f"\n🎉 SUCCÈS ! Collection '{target}' prête.")
     print(f"⏱️ Temps total : {duration:.2f}s")
+    print(f"🧠 Mémoire max du process : {peak_rss_mb():.0f} Mo")
+    return {'mode': mode, 'docs': processed, 'seconds': duration, 'rss_mb': peak_rss_mb()}
+
+# --- COMPARAISON DES DEUX MODES ---
+
+def _compare_run(mode, results):
+    # Process neuf par mode : le pic de mémoire mesuré est celui du mode seul
+    results.put(migrate_structured(restart=True, mode=mode,
+                                   target=f"{TARGET_COLLECTION}_{mode}", build_indexes=False))
+
+def compare_modes():
+    """Construit la collection avec chaque mode puis compare temps, mémoire et documents."""
+    results = multiprocessing.Queue()
+    summaries = {}
+    for mode in MODES:
+        process = multiprocessing.Process(target=_compare_run, args=(mode, results))
+        process.start()
+        while True:
+            try:
+                summaries[mode] = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    print(f"🚨 Le mode '{mode}' a échoué (code {process.exitcode}) : comparaison annulée.")
+                    return
+        process.join()
+        print()
+
+    db = get_db()
+    collections = [db[f"{TARGET_COLLECTION}_{mode}"] for mode in MODES]
+    # Parcours des deux collections triées par _id (index _id), en parallèle
+    cursors = [c.find().sort("_id", 1).batch_size(1000) for c in collections]
+    different = sum(1 for a, b in zip(*cursors) if a != b)
+
+    print("📊 Comparaison des modes :")
+    print(f"   {'mode':<10} {'documents':>10} {'temps':>10} {'mémoire max':>12}")
+    for mode, s in summaries.items():
+        print(f"   {mode:<10} {s['docs']:>10} {s['seconds']:>9.1f}s {s['rss_mb']:>9.0f} Mo")
+    lookup, hashjoin = summaries['lookup'], summaries['hashjoin']
+    if hashjoin['seconds']:
+        print(f"   -> hashjoin {lookup['seconds'] / hashjoin['seconds']:.1f}x plus rapide, "
+              f"{hashjoin['rss_mb'] - lookup['rss_mb']:+.0f} Mo côté client")
+    print(f"   Documents différents : {different}"
+          + (" ✅" if not different and lookup['docs'] == hashjoin['docs'] else " ❌"))
+    print("   (mémoire de mongod non comptée : le $lookup la consomme surtout côté serveur)")
+
+    for collection in collections:
+        collection.drop()
 
 if __name__ == "__main__":
-    migrate_structured()
\ No newline at end of file
+    # Usage : python3 migrate_structured.py [--restart] [--hashjoin | --compare]
+    #   --restart  : ignore le point de reprise
+    #   --hashjoin : jointures côté client (une lecture par collection plate)
+    #   --compare  : construit avec les deux modes, compare temps/mémoire/documents
+    try:
+        if '--compare' in sys.argv:
+            compare_modes()
+        else:
+            migrate_structured(restart='--restart' in sys.argv,
+                               mode='hashjoin' if '--hashjoin' in sys.argv else 'lookup')
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrompu : la migration reprendra au dernier lot écrit.")
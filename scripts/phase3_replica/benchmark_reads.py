@@ -0,0 +1,130 @@
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from pymongo import MongoClient, monitoring
+from pymongo.read_preferences import Primary, SecondaryPreferred, Nearest
+
+# Benchmark des lectures sur le Replica Set local (scripts/phase3_replica/setup_replica.sh)
+# Compare le débit des lectures de fiches (find_one par _id) et de films
+# similaires (genres + tri par note) selon la préférence de lecture :
+# tout sur le primaire, ou réparti sur les secondaires / les 3 nœuds.
+MONGO_URI = 'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+DB_NAME = 'cineexplorer'
+
+DURATION = 10        # secondes par mesure
+THREADS = [4, 16, 32]
+SAMPLE_SIZE = 5000   # _id tirés au hasard pour les lectures
+
+MODES = [
+    ("primary", Primary()),
+    ("secondaryPreferred", SecondaryPreferred(max_staleness=90)),
+    ("nearest", Nearest()),
+]
+
+class NodeCounter(monitoring.CommandListener):
+    """Compte les commandes de lecture servies par chaque nœud."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name == 'find':
+            node = f"{event.connection_id[0]}:{event.connection_id[1]}"
+            with self.lock:
+                self.counts[node] += 1
+
+    def failed(self, event):
+        pass
+
+def load_sample(db):
+    print(f"🎲 Tirage de {SAMPLE_SIZE} films...", end=' ', flush=True)
+    docs = list(db.movies.aggregate([
+        {"$sample": {"size": SAMPLE_SIZE}},
+        {"$project": {"genres": 1}},
+    ]))
+    print(f"{len(docs)} films.")
+    return [(d['_id'], d.get('genres') or []) for d in docs]
+
+def worker(collection, sample, stop, counts):
+    rng = random.Random()
+    ops = 0
+    while not stop.is_set():
+        movie_id, genres = rng.choice(sample)
+        # Même mélange que la page détail : la fiche, puis les similaires
+        collection.find_one({"_id": movie_id})
+        ops += 1
+        if genres:
+            list(collection.find(
+                {"genres": {"$in": genres}, "_id": {"$ne": movie_id}},
+                {"title": 1, "year": 1, "rating": 1, "poster": 1}
+            ).sort("rating.average", -1).limit(6))
+            ops += 1
+    counts.append(ops)
+
+def run_case(client, listener, read_pref, sample, threads):
+    collection = client[DB_NAME].get_collection('movies', read_preference=read_pref)
+    listener.counts.clear()
+    stop = threading.Event()
+    counts = []
+    pool = [threading.Thread(target=worker, args=(collection, sample, stop, counts)) for _ in range(threads)]
+
+    start = time.time()
+    for t in pool:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in pool:
+        t.join()
+    elapsed = time.time() - start
+
+    return sum(counts) / elapsed, dict(listener.counts)
+
+def run_benchmark(uri):
+    listener = NodeCounter()
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000, maxPoolSize=max(THREADS) * 2,
+                         event_listeners=[listener])
+    try:
+        client.admin.command('ping')
+        members = client.admin.command('replSetGetStatus')['members']
+        print("--- Replica Set ---")
+        for m in members:
+            print(f"   - {m['name']:<16} {m['stateStr']}")
+
+        sample = load_sample(client[DB_NAME])
+        if not sample:
+            print("❌ Collection movies vide : lancer d'abord la migration (phase 2).")
+            return
+
+        results = {}
+        for threads in THREADS:
+            print(f"\n--- {threads} threads, {DURATION}s par mesure ---")
+            for name, read_pref in MODES:
+                ops, nodes = run_case(client, listener, read_pref, sample, threads)
+                results[(threads, name)] = ops
+                total = sum(nodes.values()) or 1
+                spread = ", ".join(f"{n} {c * 100 / total:.0f}%" for n, c in sorted(nodes.items()))
+                gain = ops / results[(threads, 'primary')]
+                print(f"   - {name:<20} : {ops:8.0f} lectures/s (x{gain:.2f})  [{spread}]")
+
+        # Tableau résumé
+        print("\n\n--- TABLEAU POUR RAPPORT LATEX/MARKDOWN ---")
+        print("| Threads | " + " | ".join(name for name, _ in MODES) + " |")
+        print("|---" * (len(MODES) + 1) + "|")
+        for threads in THREADS:
+            row = " | ".join(f"{results[(threads, name)]:.0f}" for name, _ in MODES)
+            print(f"| {threads} | {row} |")
+
+    except Exception as e:
+        print(f"🚨 Erreur benchmark : {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    run_benchmark(sys.argv[1] if len(sys.argv) > 1 else MONGO_URI)